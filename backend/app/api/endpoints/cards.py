@@ -14,6 +14,7 @@ from loguru import logger
 
 from app.schemas.card import CardCopyOrMoveRequest
 from app.services.workflow_triggers import trigger_on_card_save
+from app.services.trigger_filters import card_view
 from fastapi import Response
 
 router = APIRouter()
@@ -180,11 +181,14 @@ def get_card(card_id: int, db: Session = Depends(get_session)):
 def update_card(card_id: int, card: CardUpdate, db: Session = Depends(get_session), response: Response = None):
     """Update a card."""
     service = CardService(db)
+    # State before the save, for triggers filtering on changed fields (update assigns new values, so no copy)
+    before = service.get_by_id(card_id)
+    previous = card_view(before, None) if before is not None else None
     db_card = service.update(card_id, card)
     if db_card is None:
         raise HTTPException(status_code=404, detail="Card not found")
     try:
-        run_ids = trigger_on_card_save(db, db_card)
+        run_ids = trigger_on_card_save(db, db_card, previous)
         if response is not None and run_ids:
             response.headers["X-Workflows-Started"] = ",".join(str(r) for r in run_ids)
     except Exception:
@@ -4,14 +4,15 @@ from sqlmodel import Session
 
 from app.db.session import get_session
 from app.services.context_service import assemble_context, ContextAssembleParams
-from app.schemas.context import AssembleContextRequest, AssembleContextResponse
+from app.services.context_cache import context_cache
+from app.schemas.context import AssembleContextRequest, AssembleContextResponse, ContextCacheStatsResponse
 
 router = APIRouter()
 
-@router.post("/assemble", response_model=AssembleContextResponse, summary="Assemble writing context (fact subgraph)")
+@router.post("/assemble", response_model=AssembleContextResponse, summary="Assemble writing context (facts, recent chapters, characters, foreshadowing, outline)")
 def assemble(req: AssembleContextRequest, session: Session = Depends(get_session)):
     """
-    Assemble the writing context, including the fact subgraph.
+    Assemble the writing context from all sources (see context_service.assemble_context).
 
     Args:
         req: The request containing parameters for context assembly.
@@ -27,6 +28,14 @@ def assemble(req: AssembleContextRequest, session: Session = Depends(get_session
         chapter_id=req.chapter_id,
         participants=req.participants,
         current_draft_tail=req.current_draft_tail,
+        recent_chapters_window=req.recent_chapters_window,
+        llm_config_id=req.llm_config_id,
+        token_budget=req.token_budget,
     )
     ctx = assemble_context(session, params)
     return AssembleContextResponse(**ctx.__dict__)
+
+
+@router.get("/cache-stats", response_model=ContextCacheStatsResponse, summary="Assembled context cache statistics")
+def cache_stats():
+    return ContextCacheStatsResponse(**context_cache.stats())
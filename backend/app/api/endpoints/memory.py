@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException
 from typing import Any, Optional, List, Dict
 from sqlmodel import Session, select
@@ -7,7 +9,7 @@ from loguru import logger
 
 from app.db.session import get_session
 from app.db.models import Card
-from app.services.memory_service import MemoryService
+from app.services.memory_service import MemoryService, merge_and_write_relations, merge_and_write_relations_async
 from app.services.card_service import CardService
 from app.schemas.entity import UpdateDynamicInfo
 from app.schemas.relation_extract import RelationExtraction
@@ -22,7 +24,14 @@ from app.schemas.memory import (
     ExtractOnlyRequest,
     UpdateDynamicInfoRequest,
     UpdateDynamicInfoResponse,
+    GraphCacheStatsResponse,
+    GraphIngestJobResponse,
+    GraphDeleteJobResponse,
+    AliasTable,
 )
+from app.services import graph_ingest_queue, graph_delete_jobs, alias_service
+from app.services.kg_provider import get_provider
+from app.services.kg_async import get_async_provider
 
 
 router = APIRouter()
@@ -32,24 +41,90 @@ router = APIRouter()
 @router.post("/query", response_model=QueryResponse, summary="Retrieve subgraph/snapshot")
 def query(req: QueryRequest, session: Session = Depends(get_session)):
     svc = MemoryService(session)
-    data = svc.graph.query_subgraph(project_id=req.project_id, participants=req.participants, radius=req.radius)
+    data = svc.query_subgraph(
+        project_id=req.project_id,
+        participants=req.participants,
+        radius=req.radius,
+        edge_type_whitelist=req.edge_type_whitelist,
+        top_k=req.top_k,
+        max_chapter_id=req.max_chapter_id,
+        order_by=req.order_by,
+    )
     return QueryResponse(**data)
 
 
+@router.get("/cache-stats", response_model=GraphCacheStatsResponse, summary="Subgraph query cache statistics")
+def cache_stats():
+    return GraphCacheStatsResponse(**get_provider().stats())
+
+
+def _write_relations(svc: MemoryService, session: Session, project_id: int, data: RelationExtraction, **kwargs) -> Dict[str, Any]:
+    """Queue prepared relations for the background ingest worker, or write them inline."""
+    rows = svc.prepare_relation_rows(project_id, data, **kwargs)
+    if not graph_ingest_queue.queue_enabled():
+        res = merge_and_write_relations(svc.graph, project_id, rows)
+        return {"written": res.get("written", 0)}
+    if not rows:
+        return {"written": 0}
+    try:
+        job = graph_ingest_queue.enqueue_relations(session, project_id, rows)
+    except graph_ingest_queue.IngestQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    # Nothing is written yet: the job reports the outcome
+    return {"written": 0, "queued": True, "job_id": job.id, "queued_rows": len(rows)}
+
+
+async def _write_relations_async(svc: MemoryService, session: Session, project_id: int, data: RelationExtraction, **kwargs) -> Dict[str, Any]:
+    """_write_relations for async endpoints: graph reads/writes are awaited, never blocking the event loop."""
+    graph = get_async_provider()
+    matcher = await alias_service.get_name_matcher_async(project_id, graph)
+    # Entity types are guessed from cards (a database query)
+    rows = await asyncio.to_thread(svc.prepare_relation_rows, project_id, data, matcher=matcher, **kwargs)
+    if not graph_ingest_queue.queue_enabled():
+        res = await merge_and_write_relations_async(graph, project_id, rows)
+        return {"written": res.get("written", 0)}
+    if not rows:
+        return {"written": 0}
+    try:
+        job = graph_ingest_queue.enqueue_relations(session, project_id, rows)
+    except graph_ingest_queue.IngestQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    # Nothing is written yet: the job reports the outcome
+    return {"written": 0, "queued": True, "job_id": job.id, "queued_rows": len(rows)}
+
+
+@router.get("/aliases", response_model=AliasTable, summary="Get entity aliases of a project")
+def get_aliases(project_id: int):
+    return AliasTable(project_id=project_id, aliases=alias_service.get_aliases(project_id))
+
+
+@router.post("/aliases", response_model=AliasTable, summary="Record entity aliases (merges alias nodes into canonical entities)")
+def set_aliases(req: AliasTable):
+    try:
+        alias_service.set_aliases(req.project_id, req.aliases)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Alias ingestion failed: {e}")
+    return AliasTable(project_id=req.project_id, aliases=alias_service.get_aliases(req.project_id))
+
+
 @router.post("/ingest-relations-llm", response_model=IngestRelationsLLMResponse, summary="Extract entity relations using LLM and ingest (strict)")
 async def ingest_relations_llm(req: IngestRelationsLLMRequest, session: Session = Depends(get_session)):
     svc = MemoryService(session)
     try:
         data = await svc.extract_relations_llm(req.text, req.participants, req.llm_config_id, req.timeout)
         # Pass typed participants to ingest method
-        res = svc.ingest_relations_from_llm(
-            req.project_id, 
-            data, 
-            volume_number=req.volume_number, 
+        res = await _write_relations_async(
+            svc,
+            session,
+            req.project_id,
+            data,
+            volume_number=req.volume_number,
             chapter_number=req.chapter_number,
-            participants_with_type=req.participants
+            participants_with_type=req.participants,
         )
-        return IngestRelationsLLMResponse(written=res.get("written", 0))
+        return IngestRelationsLLMResponse(**res)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"LLM relation extraction or ingestion failed: {e}")
 
@@ -91,12 +166,48 @@ async def extract_dynamic_info_only(req: ExtractOnlyRequest, session: Session =
 def ingest_relations_from_preview(req: IngestRelationsFromPreviewRequest, session: Session = Depends(get_session)):
     svc = MemoryService(session)
     try:
-        res = svc.ingest_relations_from_llm(req.project_id, req.data, volume_number=req.volume_number, chapter_number=req.chapter_number)
-        return IngestRelationsFromPreviewResponse(written=res.get("written", 0))
+        res = _write_relations(svc, session, req.project_id, req.data, volume_number=req.volume_number, chapter_number=req.chapter_number)
+        return IngestRelationsFromPreviewResponse(**res)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Relation ingestion failed: {e}")
 
 
+@router.get("/ingest-jobs/{job_id}", response_model=GraphIngestJobResponse, summary="Status of a queued relation ingestion")
+def get_ingest_job(job_id: int, session: Session = Depends(get_session)):
+    job = graph_ingest_queue.get_job(session, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return GraphIngestJobResponse(
+        id=job.id,
+        project_id=job.project_id,
+        status=job.status,
+        relations=len(job.rows_json or []),
+        attempts=job.attempts,
+        last_error=job.last_error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+    )
+
+
+@router.get("/graph-delete/{project_id}", response_model=GraphDeleteJobResponse, summary="Progress of a project's graph deletion")
+def get_graph_delete_job(project_id: int, session: Session = Depends(get_session)):
+    job = graph_delete_jobs.latest_delete_job(session, project_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Graph deletion job not found")
+    return GraphDeleteJobResponse(
+        id=job.id,
+        project_id=job.project_id,
+        status=job.status,
+        deleted_relationships=job.deleted_relationships,
+        deleted_nodes=job.deleted_nodes,
+        last_error=job.last_error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+    )
+
+
 @router.post("/update-dynamic-info", response_model=UpdateDynamicInfoResponse)
 def update_dynamic_info(req: UpdateDynamicInfoRequest, session: Session = Depends(get_session)):
     """
@@ -1,5 +1,6 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Header
 from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
 
@@ -18,6 +19,8 @@ from app.schemas.workflow import (
 )
 from app.services.workflow_engine import engine as wf_engine
 from app.services.nodes import get_node_types
+from app.services.trigger_filters import compile_filter
+from app.services.workflow_plans import canonicalize, plan_cache
 
 
 router = APIRouter()
@@ -61,6 +64,13 @@ def list_workflows(session: Session = Depends(get_session)):
     return session.exec(select(Workflow)).all()
 
 
+def _validate_filter(filter_json: Optional[dict]) -> None:
+    try:
+        compile_filter(filter_json)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter_json: {e}")
+
+
 @router.get("/workflow-triggers", response_model=List[WorkflowTriggerRead])
 def list_triggers(session: Session = Depends(get_session)):
     """Return all workflow triggers (independent resource path, avoids conflict with /workflows/{workflow_id})."""
@@ -70,6 +80,7 @@ def list_triggers(session: Session = Depends(get_session)):
 @router.post("/workflow-triggers", response_model=WorkflowTriggerRead)
 def create_trigger(payload: WorkflowTriggerCreate, session: Session = Depends(get_session)):
     """Create a new workflow trigger."""
+    _validate_filter(payload.filter_json)
     t = WorkflowTrigger(**payload.model_dump())
     session.add(t)
     session.commit()
@@ -82,6 +93,7 @@ def update_trigger(trigger_id: int, payload: WorkflowTriggerUpdate, session: Ses
     t = session.get(WorkflowTrigger, trigger_id)
     if not t:
         raise HTTPException(status_code=404, detail="Trigger not found")
+    _validate_filter(payload.filter_json)
     for k, v in payload.model_dump(exclude_unset=True).items():
         setattr(t, k, v)
     session.add(t)
@@ -125,11 +137,17 @@ def update_workflow(workflow_id: int, payload: WorkflowUpdate, session: Session
     wf = session.get(Workflow, workflow_id)
     if not wf:
         raise HTTPException(status_code=404, detail="Workflow not found")
-    for k, v in payload.model_dump(exclude_unset=True).items():
+    changes = payload.model_dump(exclude_unset=True)
+    if "definition_json" in changes and changes["definition_json"] != wf.definition_json and "version" not in changes:
+        # A new definition is a new version (compiled plans are cached per version)
+        changes["version"] = (wf.version or 1) + 1
+    for k, v in changes.items():
         setattr(wf, k, v)
+    wf.updated_at = datetime.utcnow()
     session.add(wf)
     session.commit()
     session.refresh(wf)
+    plan_cache.invalidate(workflow_id)
     return wf
 
 
@@ -141,6 +159,7 @@ def delete_workflow(workflow_id: int, session: Session = Depends(get_session)):
         raise HTTPException(status_code=404, detail="Workflow not found")
     session.delete(wf)
     session.commit()
+    plan_cache.invalidate(workflow_id)
     return {"ok": True}
 
 
@@ -178,7 +197,7 @@ def validate_workflow(workflow_id: int, session: Session = Depends(get_session))
     allowed_types = set(get_node_types())
 
     # 1) Normalization: Complete/Uniquify id; fold next node for ForEach missing body
-    canonical = wf_engine._canonicalize(raw_nodes)  # type: ignore[attr-defined]
+    canonical = canonicalize(raw_nodes)
 
     # Complete stable id for main line nodes and body nodes; also check for duplicate id
     used_ids = set()
@@ -262,10 +281,15 @@ def cancel_run(run_id: int):
 
 
 @router.get("/workflows/runs/{run_id}/events")
-async def stream_events(run_id: int):
-    """Stream events for a workflow run."""
+async def stream_events(run_id: int, last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID")):
+    """Stream events for a workflow run (a reconnecting client resumes after its Last-Event-ID)."""
+    try:
+        after = int(last_event_id) if last_event_id else None
+    except ValueError:
+        after = None
+
     async def event_publisher():
-        async for evt in wf_engine.subscribe_events(run_id):
+        async for evt in wf_engine.subscribe_events(run_id, after):
             yield evt
 
     return StreamingResponse(event_publisher(), media_type="text/event-stream")
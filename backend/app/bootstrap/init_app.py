@@ -1,4 +1,5 @@
 import os
+from datetime import datetime
 from sqlmodel import Session, select
 from app.db.models import Prompt, CardType, Card
 from app.db.models import Workflow, WorkflowTrigger
@@ -354,6 +355,7 @@ def _create_or_update_workflow(db: Session, name: str, description: str, dsl: di
             wf.is_built_in = True
             wf.is_active = True
             wf.version = 1
+            wf.updated_at = datetime.utcnow()
             db.add(wf)
             db.commit()
             updated_count += 1
@@ -550,6 +552,7 @@ def init_workflows(db: Session):
             wf5.is_built_in = True
             wf5.is_active = True
             wf5.version = 1
+            wf5.updated_at = datetime.utcnow()
             db.add(wf5)
             db.commit()
             total_updated += 1
@@ -323,7 +323,7 @@ class WorkflowRun(SQLModel, table=True):
         workflow_id: Workflow ID.
         workflow: Workflow object.
         definition_version: Definition version.
-        status: Status (queued/running/succeeded/failed/cancelled/partial).
+        status: Status (scheduled/queued/running/succeeded/failed/cancelled/partial).
         scope_json: Scope JSON.
         params_json: Params JSON.
         idempotency_key: Idempotency key.
@@ -348,3 +348,142 @@ class WorkflowRun(SQLModel, table=True):
     finished_at: Optional[datetime] = None
     summary_json: Optional[dict] = Field(default=None, sa_column=Column(JSON))
     error_json: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+
+
+class GraphIngestJob(SQLModel, table=True):
+    """
+    Model representing a queued knowledge graph ingestion batch.
+
+    Attributes:
+        id: Unique identifier.
+        project_id: Project ID.
+        status: Status (pending/running/done/failed).
+        rows_json: Prepared relation rows (see MemoryService.prepare_relation_rows).
+        attempts: Number of failed write attempts.
+        last_error: Last error message.
+        available_at: Earliest time the job may be (re)tried.
+        created_at: Creation timestamp.
+        finished_at: Finish timestamp.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project_id: int = Field(index=True)
+    # pending | running | done | failed
+    status: str = Field(default="pending", index=True)
+    rows_json: List[dict] = Field(default_factory=list, sa_column=Column(JSON))
+    attempts: int = Field(default=0)
+    last_error: Optional[str] = None
+    available_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    finished_at: Optional[datetime] = None
+
+
+class GraphDeleteJob(SQLModel, table=True):
+    """
+    Model representing a background deletion of a project's knowledge graph.
+
+    Attributes:
+        id: Unique identifier.
+        project_id: Project ID (the project row itself is already gone).
+        status: Status (pending/running/done); failed runs go back to pending with last_error.
+        deleted_relationships: Relationships deleted so far.
+        deleted_nodes: Nodes deleted so far.
+        last_error: Last error message.
+        created_at: Creation timestamp.
+        started_at: Start timestamp.
+        finished_at: Finish timestamp.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project_id: int = Field(index=True)
+    # pending | running | done
+    status: str = Field(default="pending", index=True)
+    deleted_relationships: int = Field(default=0)
+    deleted_nodes: int = Field(default=0)
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class ChapterSummary(SQLModel, table=True):
+    """
+    Model representing a derived summary of a chapter, or the roll-up of an outline card's children.
+
+    Attributes:
+        id: Unique identifier.
+        project_id: Project ID.
+        card_id: Summarized card ID (chapter, or stage/volume outline for roll-ups).
+        level: Level (chapter/rollup).
+        content_hash: Hash of the input the summary was made from (chapter text, or child summaries).
+        summary: Summary text.
+        method: How it was made (llm/extractive).
+        updated_at: Last update timestamp.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # Not a foreign key: summaries of deleted projects/cards are dropped by the summary worker
+    project_id: int = Field(index=True)
+    card_id: int = Field(index=True, unique=True)
+    # chapter | rollup
+    level: str = Field(default="chapter")
+    content_hash: str
+    summary: str = Field(default="")
+    # llm | extractive
+    method: str = Field(default="extractive")
+    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+
+
+class WorkflowJob(SQLModel, table=True):
+    """
+    Model representing the durable queue entry of a workflow run.
+
+    Attributes:
+        id: Unique identifier.
+        run_id: Workflow run ID.
+        workflow_id: Workflow ID.
+        concurrency_key: Runs sharing a key are limited to concurrency_limit at a time.
+        concurrency_limit: Maximum leased jobs with this key.
+        status: Status (pending/leased/done/failed).
+        attempts: Number of times the run was started.
+        lease_owner: Worker holding the lease.
+        lease_expires_at: Lease expiry; an expired lease marks an orphaned run.
+        heartbeat_at: Last heartbeat of the lease owner.
+        last_error: Last error message.
+        available_at: Earliest time the job may be claimed.
+        created_at: Creation timestamp.
+        finished_at: Finish timestamp.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # Not a foreign key: jobs of deleted workflows/runs are finished by the dispatcher
+    run_id: int = Field(index=True, unique=True)
+    workflow_id: int = Field(index=True)
+    concurrency_key: str = Field(index=True)
+    concurrency_limit: int = Field(default=1)
+    # pending | leased | done | failed
+    status: str = Field(default="pending", index=True)
+    attempts: int = Field(default=0)
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    available_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    finished_at: Optional[datetime] = None
+
+
+class WorkflowRunEvent(SQLModel, table=True):
+    """
+    Model representing a message of the workflow event broker (worker processes <-> API process).
+
+    Attributes:
+        id: Unique identifier (delivery order).
+        run_id: Workflow run ID.
+        kind: Kind (event: SSE frame from a worker; close: end of the run's stream; cancel: cancel request to the worker;
+            changed: card changes the run committed, for the API's caches).
+        data: SSE frame of an event, or the JSON change set of a changed message.
+        created_at: Creation timestamp.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    run_id: int = Field(index=True)
+    # event | close | cancel | changed
+    kind: str = Field(default="event", index=True)
+    data: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
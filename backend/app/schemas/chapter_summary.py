@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from pydantic import BaseModel, Field
+
+
+class ChapterSummaryOutput(BaseModel):
+    """
+    LLM output model for chapter summaries and roll-ups.
+
+    Attributes:
+        summary: Summary text.
+    """
+    summary: str = Field(..., description="Summary of the chapter (or of the consecutive chapters given), plain narrative prose")
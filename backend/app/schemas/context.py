@@ -14,17 +14,21 @@ class AssembleContextRequest(BaseModel):
         volume_number: Volume Number.
         chapter_number: Chapter Number.
         chapter_id: Chapter Card ID (Optional).
-        participants: List of participant entity names.
+        participants: List of participant entity names (detected from the draft or chapter when empty).
         current_draft_tail: Context template (draft tail).
-        recent_chapters_window: Recent window N (Reserved for future extension).
+        recent_chapters_window: Number of preceding chapters summarized (default 3).
+        llm_config_id: LLM config the context is for (tokenizer and context window).
+        token_budget: Token budget of the context block.
     """
     project_id: Optional[int] = Field(default=None, description="Project ID")
     volume_number: Optional[int] = Field(default=None, description="Volume Number")
     chapter_number: Optional[int] = Field(default=None, description="Chapter Number")
     chapter_id: Optional[int] = Field(default=None, description="Chapter Card ID (Optional)")
-    participants: Optional[List[str]] = Field(default=None, description="List of participant entity names")
+    participants: Optional[List[str]] = Field(default=None, description="List of participant entity names (detected from the draft or chapter when empty)")
     current_draft_tail: Optional[str] = Field(default=None, description="Context template (draft tail)")
-    recent_chapters_window: Optional[int] = Field(default=None, description="Recent window N (Reserved for future extension)")
+    recent_chapters_window: Optional[int] = Field(default=None, description="Number of preceding chapters summarized (default 3)")
+    llm_config_id: Optional[int] = Field(default=None, description="LLM config the context is for (tokenizer and context window)")
+    token_budget: Optional[int] = Field(default=None, description="Token budget of the context block (default CONTEXT_TOKEN_BUDGET)")
 
 
 class FactsStructured(BaseModel):
@@ -46,13 +50,50 @@ class AssembleContextResponse(BaseModel):
 
     Attributes:
         facts_subgraph: Fact subgraph text echo (Optional, echo only).
-        budget_stats: Context word count budget stats (may include nested parts dict).
+        budget_stats: Token budget and exact per-source token usage.
         facts_structured: Structured fact subgraph.
+        recent_chapters: Summaries of the preceding chapters.
+        character_states: Dynamic info of the participating characters.
+        open_foreshadows: Unresolved foreshadowing items.
+        outline_path: Outline cards leading to the current chapter.
+        related_passages: Passages of earlier chapters relevant to the current one.
+        story_so_far: Roll-up summaries of the earlier volumes and stages.
+        source_status: Per-source outcome (ok / empty / timeout / skipped / error).
+        participants: Participants the context was assembled for.
+        participants_detected: Whether participants were detected from text.
     """
-    # Only keep fact subgraph and budget info
     facts_subgraph: str = Field(default="", description="Fact subgraph text echo (Optional, echo only)")
-    budget_stats: Dict[str, Any] = Field(default_factory=dict, description="Context word count budget stats (may include nested parts dict)")
+    budget_stats: Dict[str, Any] = Field(default_factory=dict, description="Token budget and exact per-source token usage")
     facts_structured: Optional[FactsStructured] = Field(default=None, description="Structured fact subgraph")
+    recent_chapters: str = Field(default="", description="Summaries of the preceding chapters")
+    character_states: str = Field(default="", description="Dynamic info of the participating characters")
+    open_foreshadows: str = Field(default="", description="Unresolved foreshadowing items")
+    outline_path: str = Field(default="", description="Outline cards leading to the current chapter")
+    related_passages: str = Field(default="", description="Passages of earlier chapters relevant to the current one")
+    story_so_far: str = Field(default="", description="Roll-up summaries of the earlier volumes and stages")
+    source_status: Dict[str, str] = Field(default_factory=dict, description="Per-source outcome (ok / empty / timeout / skipped / error)")
+    participants: List[str] = Field(default_factory=list, description="Participants the context was assembled for")
+    participants_detected: bool = Field(default=False, description="Whether participants were detected from text")
+
+
+class ContextCacheStatsResponse(BaseModel):
+    """
+    Response model for assembled context cache statistics.
+
+    Attributes:
+        size: Number of cached contexts.
+        max_size: LRU capacity (0 = cache disabled).
+        hits: Assemblies served from cache.
+        misses: Assemblies computed from the sources.
+        hit_rate: hits / (hits + misses).
+        evictions: Entries dropped by LRU eviction.
+    """
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    hit_rate: float
+    evictions: int
 
 
 class ContextSettingsModel(BaseModel):
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Optional, List, Dict, Any
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Literal
 from pydantic import BaseModel, Field
 from app.schemas.relation_extract import RelationExtraction
 from app.schemas.entity import UpdateDynamicInfo
@@ -24,11 +25,19 @@ class QueryRequest(BaseModel):
     Attributes:
         project_id: Project ID.
         participants: Optional list of participant names.
-        radius: Radius for graph traversal.
+        radius: Radius for graph traversal (0 = relations among participants only).
+        edge_type_whitelist: Optional allowed relation kinds (English or Chinese).
+        max_chapter_id: Optional chapter ordinal (volume * 10000 + chapter) to query the graph as of.
+        top_k: Max number of relations returned.
+        order_by: Relevance ordering applied before top_k (recency | evidence).
     """
     project_id: int
     participants: Optional[List[str]] = None
     radius: int = 2
+    edge_type_whitelist: Optional[List[str]] = None
+    max_chapter_id: Optional[int] = None
+    top_k: int = 50
+    order_by: Literal['recency', 'evidence'] = 'recency'
 
 class QueryResponse(BaseModel):
     """
@@ -37,16 +46,100 @@ class QueryResponse(BaseModel):
     Attributes:
         nodes: List of nodes in the subgraph.
         edges: List of edges in the subgraph.
+        alias_table: Canonical entity name -> aliases, for entities in the subgraph.
         fact_summaries: List of fact summaries.
         relation_summaries: List of relation summaries.
     """
     nodes: List[Dict[str, Any]]
     edges: List[Dict[str, Any]]
+    alias_table: Dict[str, List[str]] = Field(default_factory=dict)
     # Only keep fields actually used
     fact_summaries: List[str]
     relation_summaries: List[Dict[str, Any]]
 
 
+class GraphCacheStatsResponse(BaseModel):
+    """
+    Response model for subgraph query cache statistics.
+
+    Attributes:
+        size: Number of cached subgraphs.
+        max_size: LRU capacity (0 = cache disabled).
+        hits: Queries served from cache.
+        misses: Queries forwarded to the graph provider.
+        hit_rate: hits / (hits + misses).
+        evictions: Entries dropped by LRU eviction.
+        invalidations: Project graph writes that invalidated cached entries.
+    """
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    hit_rate: float
+    evictions: int
+    invalidations: int
+
+
+class GraphIngestJobResponse(BaseModel):
+    """
+    Response model for a queued graph ingestion job.
+
+    Attributes:
+        id: Job ID.
+        project_id: Project ID.
+        status: Status (pending/running/done/failed).
+        relations: Number of queued relation rows.
+        attempts: Failed write attempts so far.
+        last_error: Last error message.
+        created_at: Creation timestamp.
+        finished_at: Finish timestamp.
+    """
+    id: int
+    project_id: int
+    status: str
+    relations: int
+    attempts: int
+    last_error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+class GraphDeleteJobResponse(BaseModel):
+    """
+    Response model for a background project graph deletion.
+
+    Attributes:
+        id: Job ID.
+        project_id: Project ID.
+        status: Status (pending/running/done).
+        deleted_relationships: Relationships deleted so far.
+        deleted_nodes: Nodes deleted so far.
+        last_error: Last error message (the job is retried on the next start).
+        created_at: Creation timestamp.
+        finished_at: Finish timestamp.
+    """
+    id: int
+    project_id: int
+    status: str
+    deleted_relationships: int
+    deleted_nodes: int
+    last_error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+class AliasTable(BaseModel):
+    """
+    Aliases of a project's entities.
+
+    Attributes:
+        project_id: Project ID.
+        aliases: Canonical entity name -> aliases (nicknames, titles, ...).
+    """
+    project_id: int
+    aliases: Dict[str, List[str]] = Field(default_factory=dict)
+
+
 class IngestRelationsLLMRequest(BaseModel):
     """
     Request model for ingesting relations using LLM.
@@ -73,9 +166,15 @@ class IngestRelationsLLMResponse(BaseModel):
     Response model for LLM relation ingestion.
 
     Attributes:
-        written: Number of relations written/updated.
+        written: Number of relations written/updated (0 when queued: nothing is written yet).
+        queued: Whether the relations were queued for background ingestion.
+        job_id: Ingest job ID when queued (GET /memory/ingest-jobs/{job_id} reports the outcome).
+        queued_rows: Relation rows accepted into the queue (0 when written inline).
     """
     written: int
+    queued: bool = False
+    job_id: Optional[int] = None
+    queued_rows: int = 0
 
 
 class ExtractRelationsRequest(BaseModel):
@@ -118,9 +217,15 @@ class IngestRelationsFromPreviewResponse(BaseModel):
     Response model for ingesting relations from preview.
 
     Attributes:
-        written: Number of relations written/updated.
+        written: Number of relations written/updated (0 when queued: nothing is written yet).
+        queued: Whether the relations were queued for background ingestion.
+        job_id: Ingest job ID when queued (GET /memory/ingest-jobs/{job_id} reports the outcome).
+        queued_rows: Relation rows accepted into the queue (0 when written inline).
     """
     written: int
+    queued: bool = False
+    job_id: Optional[int] = None
+    queued_rows: int = 0
 
 
 class ExtractDynamicInfoRequest(BaseModel):
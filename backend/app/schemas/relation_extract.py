@@ -17,6 +17,21 @@ RelationKind = Literal[
     'influence', 'counter', 'about', 'other'
 ]
 
+# Display name (Chinese) of each relation kind; graph edges store both kind (Chinese) and kind_en
+EN_TO_CN_KIND: Dict[str, str] = {
+    'ally': '同盟', 'team': '队友', 'fellow': '同门', 'enemy': '敌对', 'family': '亲属', 'mentor': '师徒',
+    'rival': '对手', 'partner': '伙伴', 'superior': '上级', 'subordinate': '下属', 'guide': '指导',
+    'member_of': '隶属', 'member': '成员', 'lead': '领导', 'found': '创立',
+    'control': '控制', 'locate_in': '位于',
+    'influence': '影响', 'counter': '克制', 'about': '关于', 'other': '其他',
+}
+
+# Normalize a relation kind (Chinese display name or English enum value) to its English value
+CN_TO_EN_KIND: Dict[str, str] = {
+    **{cn: en for en, cn in EN_TO_CN_KIND.items()},
+    **{en: en for en in EN_TO_CN_KIND},
+}
+
 
 class RecentEventSummary(BaseModel):
     """
@@ -131,7 +131,7 @@ class WorkflowTriggerBase(BaseModel):
         workflow_id: ID of the workflow to trigger.
         trigger_on: Trigger event (onsave | ongenfinish | manual).
         card_type_name: Optional card type name filter.
-        filter_json: Optional filter JSON.
+        filter_json: Optional filter on the card (content-path conditions, changed fields; see trigger_filters).
         is_active: Whether the trigger is active.
     """
     workflow_id: int
@@ -29,31 +29,7 @@ import re
 # Read max tool call retries from env, default 3
 MAX_TOOL_CALL_RETRIES = int(os.getenv('MAX_TOOL_CALL_RETRIES', '3'))
 
-_TOKEN_REGEX = re.compile(
-    r"""
-    ([A-Za-z]+)               # English word (consecutive letters count as 1)
-    |([0-9])                 # 1 digit counts as 1
-    |([\u4E00-\u9FFF])       # Single Chinese char counts as 1
-    |(\S)                     # Other non-whitespace symbol/punctuation counts as 1
-    """,
-    re.VERBOSE,
-)
-
-def _estimate_tokens(text: str) -> int:
-    """Estimate tokens by rule:
-    - 1 Chinese char = 1
-    - 1 English word = 1
-    - 1 digit = 1
-    - 1 symbol = 1
-    Whitespace ignored.
-    """
-    if not text:
-        return 0
-    try:
-        return sum(1 for _ in _TOKEN_REGEX.finditer(text))
-    except Exception:
-        # Fallback: Count non-whitespace chars
-        return sum(1 for ch in (text or "") if not ch.isspace())
+from app.services.token_counter import estimate_tokens as _estimate_tokens
 
 from app.services import llm_config_service as _llm_svc
 
@@ -941,7 +917,8 @@ async def generate_assistant_chat_streaming_react(
     """
     from app.services.assistant_tools.pydantic_ai_tools import (
         search_cards, create_card, modify_card_field, replace_field_text,
-        batch_create_cards, get_card_type_schema, get_card_content
+        batch_create_cards, get_card_type_schema, get_card_content, search_chapter_passages,
+        get_story_summaries
     )
     
     # 工具映射表（手动执行）
@@ -953,6 +930,8 @@ async def generate_assistant_chat_streaming_react(
         "batch_create_cards": batch_create_cards,
         "get_card_type_schema": get_card_type_schema,
         "get_card_content": get_card_content,
+        "search_chapter_passages": search_chapter_passages,
+        "get_story_summaries": get_story_summaries,
     }
     
     # 获取工具 schema
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.services.kg_provider import KnowledgeGraphProvider, get_provider
+from app.services.name_matcher import NameMatcher
+
+
+# project_id -> (graph generation, matcher)
+_matchers: Dict[int, Tuple[int, NameMatcher]] = {}
+_lock = threading.Lock()
+
+
+def _generation(graph: KnowledgeGraphProvider, project_id: int) -> int:
+    gen = getattr(graph, "generation", None)
+    return gen(project_id) if callable(gen) else -1
+
+
+def _cached_matcher(project_id: int, gen: int) -> Optional[NameMatcher]:
+    cached = _matchers.get(project_id)
+    if cached is not None and cached[0] == gen and gen >= 0:
+        return cached[1]
+    return None
+
+
+def _store_matcher(project_id: int, gen: int, table: Dict[str, str]) -> NameMatcher:
+    matcher = NameMatcher.from_aliases(table.values(), table)
+    with _lock:
+        _matchers[project_id] = (gen, matcher)
+    return matcher
+
+
+def get_name_matcher(project_id: int, graph: Optional[KnowledgeGraphProvider] = None) -> NameMatcher:
+    """
+    Compiled alias matcher of a project.
+
+    Rebuilt only when the project's graph generation changes (ingest_aliases bumps it), so
+    resolution is a dict lookup on the hot path.
+
+    Args:
+        project_id: Project ID.
+        graph: Provider to read aliases from (defaults to the active provider).
+
+    Returns:
+        NameMatcher mapping aliases and canonical names to canonical names.
+    """
+    graph = graph or get_provider()
+    gen = _generation(graph, project_id)
+    matcher = _cached_matcher(project_id, gen)
+    if matcher is not None:
+        return matcher
+    try:
+        table = graph.get_alias_table(project_id)
+    except Exception as e:
+        logger.warning(f"Failed to load alias table for project {project_id}: {e}")
+        table = {}
+    return _store_matcher(project_id, gen, table)
+
+
+async def get_name_matcher_async(project_id: int, graph: Any) -> NameMatcher:
+    """
+    get_name_matcher for callers on the event loop.
+
+    Args:
+        project_id: Project ID.
+        graph: Async provider (see kg_async.AsyncKGProvider).
+
+    Returns:
+        NameMatcher mapping aliases and canonical names to canonical names.
+    """
+    gen = _generation(graph, project_id)
+    matcher = _cached_matcher(project_id, gen)
+    if matcher is not None:
+        return matcher
+    try:
+        table = await graph.get_alias_table(project_id)
+    except Exception as e:
+        logger.warning(f"Failed to load alias table for project {project_id}: {e}")
+        table = {}
+    return _store_matcher(project_id, gen, table)
+
+
+def resolve_names(project_id: int, names: List[str], graph: Optional[KnowledgeGraphProvider] = None) -> List[str]:
+    """Map names (possibly aliases) to canonical names, de-duplicated in order."""
+    if not names:
+        return []
+    return get_name_matcher(project_id, graph).resolve_many(names)
+
+
+def get_aliases(project_id: int, graph: Optional[KnowledgeGraphProvider] = None) -> Dict[str, List[str]]:
+    """Canonical name -> aliases for a project."""
+    graph = graph or get_provider()
+    out: Dict[str, List[str]] = {}
+    for alias, canonical in graph.get_alias_table(project_id).items():
+        out.setdefault(canonical, []).append(alias)
+    return out
+
+
+def set_aliases(project_id: int, mapping: Dict[str, List[str]], graph: Optional[KnowledgeGraphProvider] = None) -> None:
+    """Record aliases and drop the project's compiled matcher."""
+    graph = graph or get_provider()
+    graph.ingest_aliases(project_id, mapping)
+    with _lock:
+        _matchers.pop(project_id, None)
@@ -381,7 +381,10 @@ def get_card_content(
         - parent_type: Parent Card Type (If parent exists).
         - content: Card Content.
         - created_at: Card Creation Time.
+        - summary: Stored summary / roll-up (Chapters and volume / stage outlines, if available).
     """
+    from app.services.chapter_summary_service import get_summaries
+
     logger.info(f" [PydanticAI.get_card_content] card_id={card_id}")
     
     card = ctx.deps.session.query(Card).filter(Card.id == card_id).first()
@@ -407,11 +410,141 @@ def get_card_content(
     if card.parent_id and card.parent:
         result["parent_title"] = card.parent.title
         result["parent_type"] = card.parent.card_type.name if card.parent.card_type else "Unknown"
+
+    stored = get_summaries(ctx.deps.session, [card.id]).get(card.id)
+    if stored is not None:
+        result["summary"] = stored.summary
     
     logger.info(f"✅ [PydanticAI.get_card_content] Returned card content (parent_id={card.parent_id})")
     return result
 
 
+def search_chapter_passages(
+    ctx: RunContext[AssistantDeps],
+    query: str,
+    limit: int = 5,
+    before_chapter_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Search the project's chapter text for passages relevant to a query (BM25 full-text retrieval)
+
+    Use case: Call when earlier scenes (a duel, a promise, a first meeting) need to be recalled exactly
+    
+    Args:
+        ctx: Pydantic AI RunContext containing AssistantDeps.
+        query: Query text (keywords, names or a description of the scene).
+        limit: Max number of passages (default 5).
+        before_chapter_id: Only search chapters before this chapter card (Optional).
+    
+    Returns:
+        A dictionary containing:
+        - success: True if successful, False otherwise.
+        - error: Error message (if failed).
+        - passages: List of passages (card_id, title, score, text), best first.
+        - count: Number of passages found.
+    """
+    from app.services.passage_index import search_passages
+    from app.services.kg_provider import chapter_key
+
+    logger.info(f" [PydanticAI.search_chapter_passages] query={query[:50]}, limit={limit}")
+
+    before_ordinal = None
+    if before_chapter_id:
+        chapter = ctx.deps.session.get(Card, before_chapter_id)
+        if not chapter:
+            return {
+                "success": False,
+                "error": f"Card #{before_chapter_id} not found"
+            }
+        content = chapter.content if isinstance(chapter.content, dict) else {}
+        before_ordinal = chapter_key(content.get("volume_number"), content.get("chapter_number"))
+
+    hits = search_passages(
+        ctx.deps.session,
+        ctx.deps.project_id,
+        query,
+        top_k=max(1, min(limit, 20)),
+        before_ordinal=before_ordinal,
+        exclude_cards=[before_chapter_id] if before_chapter_id else (),
+    )
+    result = {
+        "success": True,
+        "passages": [
+            {"card_id": h["card_id"], "title": h["title"], "score": h["score"], "text": h["text"]}
+            for h in hits
+        ],
+        "count": len(hits)
+    }
+
+    logger.info(f"✅ [PydanticAI.search_chapter_passages] Found {len(hits)} passages")
+    return result
+
+
+def get_story_summaries(
+    ctx: RunContext[AssistantDeps],
+    card_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Get precomputed summaries of the story (chapter summaries, stage and volume roll-ups)
+
+    Use case: Call to get an overview of what has happened without reading chapter text.
+    Without card_id, returns the roll-up of every volume; with the ID of a volume, stage or
+    chapter, returns its summary and the summaries of its direct children
+    
+    Args:
+        ctx: Pydantic AI RunContext containing AssistantDeps.
+        card_id: Volume / stage outline or chapter card ID (Optional).
+    
+    Returns:
+        A dictionary containing:
+        - success: True if successful, False otherwise.
+        - error: Error message (if failed).
+        - card: The requested card (id, title, summary), if card_id was given.
+        - summaries: List of summaries (card_id, title, type, summary) in story order.
+        - count: Number of summaries.
+    """
+    from sqlmodel import select
+    from app.services.chapter_summary_service import ROLLUP_TYPES, get_summaries
+
+    logger.info(f" [PydanticAI.get_story_summaries] card_id={card_id}")
+
+    session = ctx.deps.session
+    result: Dict[str, Any] = {"success": True}
+    if card_id:
+        card = session.get(Card, card_id)
+        if not card or card.project_id != ctx.deps.project_id:
+            return {
+                "success": False,
+                "error": f"Card {card_id} not found or not in current project"
+            }
+        children = session.exec(
+            select(Card).where(Card.parent_id == card_id).order_by(Card.display_order, Card.id)
+        ).all()
+        own = get_summaries(session, [card_id]).get(card_id)
+        result["card"] = {"id": card.id, "title": card.title, "summary": own.summary if own else None}
+    else:
+        children = session.exec(
+            select(Card).join(CardType).where(
+                Card.project_id == ctx.deps.project_id,
+                CardType.name == ROLLUP_TYPES[-1]
+            ).order_by(Card.display_order, Card.id)
+        ).all()
+    rows = get_summaries(session, [c.id for c in children])
+    result["summaries"] = [
+        {
+            "card_id": c.id,
+            "title": c.title,
+            "type": c.card_type.name if c.card_type else "Unknown",
+            "summary": rows[c.id].summary
+        }
+        for c in children if c.id in rows
+    ]
+    result["count"] = len(result["summaries"])
+
+    logger.info(f"✅ [PydanticAI.get_story_summaries] Returned {result['count']} summaries")
+    return result
+
+
 def replace_field_text(
     ctx: RunContext[AssistantDeps],
     card_id: int,
@@ -520,6 +653,8 @@ ASSISTANT_TOOLS = [
     batch_create_cards,
     get_card_type_schema,
     get_card_content,
+    search_chapter_passages,
+    get_story_summaries,
   
 ]
 
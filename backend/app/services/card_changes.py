@@ -0,0 +1,174 @@
+"""
+Card changes committed by workflow worker processes, replayed into the API process.
+
+The API keeps caches that learn of card changes from in-process commit listeners: the
+context cache revisions (also keying the participant matcher), the passage index's dirty
+cards and the chapter summary queue. With WORKFLOW_WORKER_MODE=external the runs commit in
+`python -m app.workers` processes, which those listeners never see. A worker process
+therefore records what it commits (track) and, when a run finishes, announces it through
+the event broker (publish_run_changes); the API process follows those messages
+(start_follower) and applies them through the same revision / dirty / queue paths its own
+commits use.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+
+from app.db.models import Card, ChapterSummary, ForeshadowItem
+
+_COMPONENTS = ((ForeshadowItem, "foreshadows"), (ChapterSummary, "summaries"))
+_PENDING_KEY = "card_changes.pending"
+
+_tracking = False
+_lock = threading.Lock()
+# (project_id, card_type_id, card_id, parent_id) of committed cards
+_cards: Set[Tuple[int, int, int, Optional[int]]] = set()
+# (project_id, component) of committed foreshadowing items / chapter summaries
+_components: Set[Tuple[int, str]] = set()
+
+
+# ---------------- worker side ----------------
+def track() -> None:
+    """Record committed changes from now on (worker processes)."""
+    global _tracking
+    _tracking = True
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_changes(session, flush_context) -> None:
+    if not _tracking:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Card):
+            if obj.project_id is not None and obj.card_type_id is not None and obj.id is not None:
+                pending.add(("card", (obj.project_id, obj.card_type_id, obj.id, obj.parent_id)))
+        else:
+            for model, component in _COMPONENTS:
+                if isinstance(obj, model) and obj.project_id is not None:
+                    pending.add(("component", (obj.project_id, component)))
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _record_changes(session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    with _lock:
+        for kind, key in pending:
+            (_cards if kind == "card" else _components).add(key)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _drop_pending(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def drain() -> Optional[Dict[str, Any]]:
+    """Changes recorded since the last drain (None when there are none)."""
+    global _cards, _components
+    with _lock:
+        if not _cards and not _components:
+            return None
+        cards, _cards = _cards, set()
+        components, _components = _components, set()
+    return {"cards": sorted(cards, key=lambda c: c[2]), "components": sorted(components)}
+
+
+def publish_run_changes(run_id: int) -> None:
+    """
+    Announce what was committed since the last announcement with a finished run.
+
+    Runs executing at once in a worker share the record, so a run may carry changes of
+    another one that is still executing; applying a change twice only costs a cache miss.
+    """
+    if not _tracking:
+        return
+    changes = drain()
+    if changes:
+        from app.services.workflow_events import broker
+
+        broker.changed(run_id, json.dumps(changes))
+
+
+# ---------------- API side ----------------
+def apply_changes(changes: Dict[str, Any]) -> None:
+    """Apply a change set of a worker process to this process's caches."""
+    from app.services import chapter_summary_service, context_cache, passage_index
+
+    cards = [tuple(c) for c in changes.get("cards") or []]
+    components = [tuple(c) for c in changes.get("components") or []]
+    context_cache.bump_revisions(
+        [("card", pid, tid) for pid, tid, _, _ in cards] + [(component, pid, None) for pid, component in components]
+    )
+    passage_index.mark_dirty((pid, cid) for pid, _, cid, _ in cards)
+    # A deleted chapter changes its stage's roll-up
+    chapter_summary_service.queue_changed_cards(
+        {cid for _, _, cid, _ in cards} | {parent for _, _, _, parent in cards if parent}
+    )
+
+
+class ChangeFollower:
+    """Follows the change messages of worker processes and applies them (API process)."""
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def running(self) -> bool:
+        """Whether the follower task is alive."""
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start following on the running event loop (idempotent)."""
+        if self.running():
+            return
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._main())
+
+    async def stop(self) -> None:
+        """Stop following."""
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _main(self) -> None:
+        from app.services.workflow_events import WORKFLOW_EVENT_POLL_MS, broker
+
+        # Earlier changes need no replay: this process's caches start empty
+        after_id = await asyncio.to_thread(broker.last_id)
+        interval = max(0.02, WORKFLOW_EVENT_POLL_MS / 1000.0)
+        while not self._stopping:
+            try:
+                for row in await asyncio.to_thread(broker.read_changes, after_id):
+                    after_id = row.id
+                    try:
+                        apply_changes(json.loads(row.data or "{}"))
+                    except Exception as e:  # noqa: BLE001
+                        logger.warning(f"[CardChanges] skipped changes of run_id={row.run_id}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"[CardChanges] read failed: {e}")
+            await asyncio.sleep(interval)
+
+
+follower = ChangeFollower()
+
+
+def start_follower() -> None:
+    """Start applying worker changes (call from the app's event loop)."""
+    follower.start()
+
+
+async def stop_follower() -> None:
+    """Stop applying worker changes."""
+    await follower.stop()
@@ -0,0 +1,376 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from app.db.models import Card, CardType, ChapterSummary
+from app.db.session import engine
+from app.schemas.chapter_summary import ChapterSummaryOutput
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# LLM config used to write summaries; 0 = extractive summaries only (no LLM calls)
+CHAPTER_SUMMARY_LLM_CONFIG_ID = _env_int("CHAPTER_SUMMARY_LLM_CONFIG_ID", 0)
+CHAPTER_SUMMARY_MAX_CHARS = _env_int("CHAPTER_SUMMARY_MAX_CHARS", 300)
+CHAPTER_ROLLUP_MAX_CHARS = _env_int("CHAPTER_ROLLUP_MAX_CHARS", 600)
+# Seconds a chapter must stay unchanged before it is summarized (autosave sends many edits)
+CHAPTER_SUMMARY_DELAY = _env_int("CHAPTER_SUMMARY_DELAY", 30)
+
+# Card type names (current English names and legacy Chinese one)
+CHAPTER_TYPES = ("Chapter", "章节正文")
+# Outline cards whose chapters (or child outlines) are rolled up: stage -> volume
+ROLLUP_TYPES = ("StageOutline", "VolumeOutline")
+_PROMPT_NAME = "ChapterSummary"
+_SENTENCE_RE = re.compile(r"[^。！？!?…\n]+[。！？!?…”』」]*")
+_POLL_SECONDS = 5.0
+
+
+def content_hash(text: str) -> str:
+    """Hash identifying the input a summary was made from."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def _sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_RE.findall(text or "") if s.strip()]
+
+
+def extractive_summary(text: str, max_chars: int) -> str:
+    """
+    Summary made of the chapter's opening and closing sentences (no LLM).
+
+    Two thirds of max_chars go to the opening, the rest to the ending, where chapters
+    usually leave their hooks.
+    """
+    sentences = _sentences(text)
+    if sum(len(s) for s in sentences) <= max_chars:
+        return "".join(sentences)
+    head: List[str] = []
+    used = 0
+    for s in sentences:
+        if used + len(s) > max_chars * 2 // 3:
+            break
+        head.append(s)
+        used += len(s)
+    tail: List[str] = []
+    for s in reversed(sentences[len(head):]):
+        if used + len(s) > max_chars:
+            break
+        tail.insert(0, s)
+        used += len(s)
+    if not head and not tail:
+        return sentences[0][:max_chars] if sentences else ""
+    return "".join(head) + ("……" if tail else "") + "".join(tail)
+
+
+def _extractive_rollup(parts: List[Tuple[str, str]], max_chars: int) -> str:
+    # Leading sentences of each child, so every chapter/stage keeps a share of the roll-up
+    share = max(30, max_chars // max(1, len(parts)))
+    lines: List[str] = []
+    used = 0
+    for title, summary in parts:
+        room = max(20, share - len(title) - 2)
+        sentences = _sentences(summary) or [summary]
+        lead = sentences[0][:room]
+        for sentence in sentences[1:]:
+            if len(lead) + len(sentence) > room:
+                break
+            lead += sentence
+        line = f"{title}: {lead}"
+        if used + len(line) > max_chars and lines:
+            break
+        lines.append(line)
+        used += len(line)
+    return "\n".join(lines)
+
+
+def _llm_summary(session: Session, text: str, max_chars: int, what: str) -> Optional[str]:
+    if not CHAPTER_SUMMARY_LLM_CONFIG_ID:
+        return None
+    from app.services import agent_service, prompt_service
+
+    try:
+        prompt = prompt_service.get_prompt_by_name(session, _PROMPT_NAME)
+        system_prompt = prompt.template if prompt else ""
+        system_prompt += f"\n\nPlease strictly output according to the following JSON Schema format:\n{ChapterSummaryOutput.model_json_schema()}"
+        user_prompt = f"Length: at most {max_chars} characters.\n\n{what}:\n{text}"
+        res = asyncio.run(agent_service.run_llm_agent(
+            session=session,
+            llm_config_id=CHAPTER_SUMMARY_LLM_CONFIG_ID,
+            user_prompt=user_prompt,
+            output_type=ChapterSummaryOutput,
+            system_prompt=system_prompt,
+            max_retries=1,
+        ))
+        summary = (res.summary or "").strip() if isinstance(res, ChapterSummaryOutput) else ""
+        return summary or None
+    except Exception as e:
+        logger.warning(f"[ChapterSummary] LLM summary failed, using extractive summary: {e}")
+        return None
+
+
+def _upsert(session: Session, card: Card, level: str, digest: str, summary: str, method: str) -> ChapterSummary:
+    row = session.exec(select(ChapterSummary).where(ChapterSummary.card_id == card.id)).first()
+    if row is None:
+        row = ChapterSummary(project_id=card.project_id, card_id=card.id, content_hash=digest)
+    row.level = level
+    row.content_hash = digest
+    row.summary = summary
+    row.method = method
+    row.updated_at = datetime.utcnow()
+    session.add(row)
+    session.commit()
+    return row
+
+
+def _drop(session: Session, card_id: int) -> bool:
+    row = session.exec(select(ChapterSummary).where(ChapterSummary.card_id == card_id)).first()
+    if row is None:
+        return False
+    session.delete(row)
+    session.commit()
+    return True
+
+
+def chapter_text(card: Card) -> str:
+    """Body text of a chapter card."""
+    content = card.content if isinstance(card.content, dict) else {}
+    return str(content.get("content") or "")
+
+
+def summarize_chapter(session: Session, card: Card) -> bool:
+    """
+    Summarize a chapter unless its stored summary was made from the same text.
+
+    Returns:
+        True if the stored summary changed.
+    """
+    text = chapter_text(card).strip()
+    if not text:
+        return _drop(session, card.id)
+    digest = content_hash(text)
+    row = session.exec(select(ChapterSummary).where(ChapterSummary.card_id == card.id)).first()
+    if row is not None and row.content_hash == digest:
+        return False
+    summary = _llm_summary(session, text, CHAPTER_SUMMARY_MAX_CHARS, "Chapter")
+    method = "llm" if summary else "extractive"
+    _upsert(session, card, "chapter", digest, summary or extractive_summary(text, CHAPTER_SUMMARY_MAX_CHARS), method)
+    return True
+
+
+def roll_up(session: Session, card: Card) -> bool:
+    """
+    Roll up the summaries of an outline card's children (chapters of a stage, stages of a volume).
+
+    Returns:
+        True if the stored roll-up changed.
+    """
+    children = session.exec(
+        select(Card).where(Card.parent_id == card.id).order_by(Card.display_order, Card.id)
+    ).all()
+    rows = get_summaries(session, [c.id for c in children])
+    parts = [(c, rows[c.id]) for c in children if c.id in rows and rows[c.id].summary]
+    if not parts:
+        return _drop(session, card.id)
+    digest = content_hash("\n".join(f"{c.id}:{row.content_hash}" for c, row in parts))
+    existing = session.exec(select(ChapterSummary).where(ChapterSummary.card_id == card.id)).first()
+    if existing is not None and existing.content_hash == digest:
+        return False
+    text = "\n".join(f"{c.title}: {row.summary}" for c, row in parts)
+    summary = _llm_summary(session, text, CHAPTER_ROLLUP_MAX_CHARS, "Summaries of consecutive parts")
+    method = "llm" if summary else "extractive"
+    if not summary:
+        summary = _extractive_rollup([(c.title, row.summary) for c, row in parts], CHAPTER_ROLLUP_MAX_CHARS)
+    _upsert(session, card, "rollup", digest, summary, method)
+    return True
+
+
+def get_summaries(session: Session, card_ids: Iterable[int]) -> Dict[int, ChapterSummary]:
+    """Stored summaries / roll-ups by card ID."""
+    ids = list(card_ids)
+    if not ids:
+        return {}
+    return {row.card_id: row for row in session.exec(select(ChapterSummary).where(ChapterSummary.card_id.in_(ids))).all()}
+
+
+def current_chapter_summaries(session: Session, cards: Iterable[Card]) -> Dict[int, str]:
+    """Summaries of chapters whose stored summary matches their current text."""
+    cards = list(cards)
+    rows = get_summaries(session, [c.id for c in cards])
+    out: Dict[int, str] = {}
+    for c in cards:
+        row = rows.get(c.id)
+        if row is not None and row.summary and row.content_hash == content_hash(chapter_text(c).strip()):
+            out[c.id] = row.summary
+    return out
+
+
+# ---- background worker ----
+class ChapterSummaryWorker:
+    """
+    Background thread keeping chapter summaries and their roll-ups current.
+
+    Committed card changes are queued (with their parent) and processed once the card
+    has been quiet for CHAPTER_SUMMARY_DELAY seconds. Chapters are summarized only when
+    their text hash differs from the stored one; a changed summary queues the parent
+    stage, whose changed roll-up queues its volume. On start, every chapter and outline
+    card is checked once, so edits made while the app was down are picked up.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # card_id -> monotonic time it becomes due
+        self._queue: "OrderedDict[int, float]" = OrderedDict()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the worker thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="chapter-summary-worker", daemon=True)
+        self._thread.start()
+
+    def running(self) -> bool:
+        """Whether the worker thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the worker thread after the current card."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def enqueue(self, card_ids: Iterable[int], delay: float = CHAPTER_SUMMARY_DELAY) -> None:
+        """Queue cards; a card queued again waits for the later due time."""
+        due = time.monotonic() + max(0.0, delay)
+        with self._lock:
+            for card_id in card_ids:
+                self._queue.pop(card_id, None)
+                self._queue[card_id] = due
+        self._wake.set()
+
+    def _next_due(self) -> Optional[int]:
+        now = time.monotonic()
+        with self._lock:
+            for card_id, due in self._queue.items():
+                if due <= now:
+                    del self._queue[card_id]
+                    return card_id
+        return None
+
+    def _scan(self) -> None:
+        with Session(engine) as session:
+            ids = session.exec(
+                select(Card.id).join(CardType).where(CardType.name.in_(CHAPTER_TYPES + ROLLUP_TYPES)).order_by(Card.id)
+            ).all()
+        # A roll-up checked before its chapters is queued again by any chapter summary that changes
+        self.enqueue(ids, delay=0)
+
+    def _loop(self) -> None:
+        try:
+            self._scan()
+        except Exception as e:
+            logger.error(f"[ChapterSummary] initial scan failed: {e}")
+        while not self._stop.is_set():
+            card_id = self._next_due()
+            if card_id is None:
+                self._wake.wait(_POLL_SECONDS)
+                self._wake.clear()
+                continue
+            try:
+                self.process(card_id)
+            except Exception as e:
+                logger.error(f"[ChapterSummary] card={card_id} failed: {e}")
+
+    def process(self, card_id: int) -> bool:
+        """
+        Bring one card's summary up to date.
+
+        Returns:
+            True if its summary changed (its parent is then queued).
+        """
+        with Session(engine) as session:
+            card = session.get(Card, card_id)
+            if card is None:
+                return _drop(session, card_id)
+            type_name = card.card_type.name if card.card_type else ""
+            if type_name in CHAPTER_TYPES:
+                changed = summarize_chapter(session, card)
+            elif type_name in ROLLUP_TYPES:
+                changed = roll_up(session, card)
+            else:
+                return False
+            if changed:
+                logger.info(f"[ChapterSummary] card={card_id} ({type_name}) summarized")
+                if card.parent_id:
+                    self.enqueue([card.parent_id], delay=0)
+            return changed
+
+
+_worker = ChapterSummaryWorker()
+_PENDING_KEY = "chapter_summary.pending"
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_changes(session, flush_context) -> None:
+    pending = session.info.setdefault(_PENDING_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Card) and obj.id is not None:
+            pending.add(obj.id)
+            if obj.parent_id:
+                # A deleted chapter changes its stage's roll-up
+                pending.add(obj.parent_id)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _queue_changes(session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        queue_changed_cards(pending)
+
+
+def queue_changed_cards(card_ids: Iterable[int]) -> None:
+    """
+    Queue committed cards (and their parents) for summarizing.
+
+    Only while the worker runs: processes without it (workflow worker processes, scripts)
+    would fill a queue nobody drains, and the worker scans every chapter when it starts.
+    """
+    if _worker.running():
+        _worker.enqueue(card_ids)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _drop_pending(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def start_worker() -> None:
+    """Start the background summary worker."""
+    _worker.start()
+
+
+def stop_worker() -> None:
+    """Stop the background summary worker."""
+    _worker.stop()
@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlmodel import Session
+
+from app.db.models import LLMConfig
+from app.services.token_counter import TokenCounter, get_token_counter, truncate_to_tokens
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Context budget when neither the request nor the LLM config sets one
+CONTEXT_TOKEN_BUDGET = _env_int("CONTEXT_TOKEN_BUDGET", 8000)
+# Tokens of the model's window kept free for the prompt template, draft and output
+CONTEXT_RESERVED_TOKENS = _env_int("CONTEXT_RESERVED_TOKENS", 4096)
+# Window assumed for models missing from MODEL_CONTEXT_WINDOWS
+DEFAULT_CONTEXT_WINDOW = _env_int("DEFAULT_CONTEXT_WINDOW", 32768)
+
+# Model name prefix -> context window (tokens); the longest matching prefix wins
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-4.1": 1_047_576,
+    "gpt-4o": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+    "gpt-5": 400_000,
+    "o1": 200_000,
+    "o3": 200_000,
+    "o4": 200_000,
+    "claude": 200_000,
+    "gemini": 1_048_576,
+    "deepseek": 65_536,
+    "qwen": 131_072,
+    "glm-4": 128_000,
+    "moonshot-v1-8k": 8_192,
+    "moonshot-v1-32k": 32_768,
+    "moonshot-v1-128k": 131_072,
+    "kimi": 131_072,
+}
+
+# Source priority (AssembledContext field -> weight); the outline steers the chapter most
+SOURCE_PRIORITY: Dict[str, float] = {
+    "outline_path": 1.0,
+    "story_so_far": 0.85,
+    "facts_subgraph": 0.9,
+    "character_states": 0.8,
+    "recent_chapters": 0.7,
+    "related_passages": 0.6,
+    "open_foreshadows": 0.5,
+}
+# Section headers, as rendered by AssembledContext.to_system_prompt_block
+SECTION_HEADERS: Dict[str, str] = {
+    "story_so_far": "[Story So Far]",
+    "outline_path": "[Outline Path]",
+    "recent_chapters": "[Recent Chapters]",
+    "character_states": "[Character States]",
+    "open_foreshadows": "[Open Foreshadowing]",
+    "related_passages": "[Related Passages]",
+    "facts_subgraph": "[Fact Subgraph]",
+}
+_FACTS_PREFIX = "Key Facts:"
+# Greedy rounds of allocate(); each re-fills what the exact count of the previous one left
+_FILL_ROUNDS = 3
+
+
+def context_window_for(model_name: Optional[str]) -> int:
+    """Context window of a model (longest prefix match in MODEL_CONTEXT_WINDOWS)."""
+    name = (model_name or "").strip().lower().split("/")[-1]
+    best = ""
+    for prefix in MODEL_CONTEXT_WINDOWS:
+        if name.startswith(prefix) and len(prefix) > len(best):
+            best = prefix
+    return MODEL_CONTEXT_WINDOWS[best] if best else DEFAULT_CONTEXT_WINDOW
+
+
+@dataclass
+class ContextBudget:
+    """
+    Token budget of one assembly.
+
+    Attributes:
+        budget_tokens: Tokens the context block may use.
+        context_window: Context window of the model.
+        model: Model name (None without an LLM config).
+        tokenizer: Name of the tokenizer behind count.
+        count: Token counter of the model.
+    """
+    budget_tokens: int
+    context_window: int
+    model: Optional[str]
+    tokenizer: str
+    count: TokenCounter
+
+
+def resolve_budget(session: Session, llm_config_id: Optional[int] = None, token_budget: Optional[int] = None) -> ContextBudget:
+    """
+    Token budget for an assembly.
+
+    The requested budget (else CONTEXT_TOKEN_BUDGET) is capped so the context plus
+    CONTEXT_RESERVED_TOKENS never exceeds the model's window.
+
+    Args:
+        session: Database session.
+        llm_config_id: LLM config the context is assembled for (selects tokenizer and window).
+        token_budget: Requested budget in tokens.
+
+    Returns:
+        ContextBudget.
+    """
+    model: Optional[str] = None
+    if llm_config_id:
+        cfg = session.get(LLMConfig, llm_config_id)
+        model = cfg.model_name if cfg else None
+    window = context_window_for(model)
+    wanted = token_budget if token_budget is not None else CONTEXT_TOKEN_BUDGET
+    budget = max(0, min(wanted, window - CONTEXT_RESERVED_TOKENS))
+    count, tokenizer = get_token_counter(model)
+    return ContextBudget(budget_tokens=budget, context_window=window, model=model, tokenizer=tokenizer, count=count)
+
+
+@dataclass
+class Snippet:
+    """
+    Candidate piece of one context section.
+
+    Attributes:
+        source: AssembledContext field the snippet belongs to.
+        order: Position within the section (output keeps this order).
+        text: Snippet text (one or more lines).
+        weight: Relevance within the section (recency, depth).
+        tokens: Token count of text.
+    """
+    source: str
+    order: int
+    text: str
+    weight: float = 1.0
+    tokens: int = 0
+
+    @property
+    def value(self) -> float:
+        # Diminishing returns on length: a long snippet is worth more, but not proportionally
+        return SOURCE_PRIORITY.get(self.source, 0.5) * self.weight * math.sqrt(max(1, self.tokens))
+
+    @property
+    def density(self) -> float:
+        return self.value / max(1, self.tokens)
+
+
+def _split_lines(text: str) -> List[str]:
+    return [ln for ln in (text or "").split("\n") if ln.strip()]
+
+
+def _split_blocks(text: str) -> List[str]:
+    """Split a '- name:' list whose items carry indented sub-lines."""
+    blocks: List[str] = []
+    for ln in _split_lines(text):
+        if ln.startswith(" ") and blocks:
+            blocks[-1] += "\n" + ln
+        else:
+            blocks.append(ln)
+    return blocks
+
+
+def split_snippets(fields: Dict[str, str]) -> Tuple[Dict[str, str], List[Snippet]]:
+    """
+    Split section texts into candidate snippets.
+
+    Args:
+        fields: AssembledContext field -> section text.
+
+    Returns:
+        (field -> fixed prefix line, snippets).
+    """
+    prefixes: Dict[str, str] = {}
+    snippets: List[Snippet] = []
+    for name, text in fields.items():
+        if not text or name not in SECTION_HEADERS:
+            continue
+        if name == "facts_subgraph" and text.startswith(_FACTS_PREFIX + "\n"):
+            prefixes[name] = _FACTS_PREFIX
+            text = text[len(_FACTS_PREFIX) + 1:]
+        parts = _split_blocks(text) if name == "character_states" else _split_lines(text)
+        n = len(parts)
+        for i, part in enumerate(parts):
+            if name == "facts_subgraph":
+                weight = 0.97 ** i  # most recent first
+            elif name == "recent_chapters":
+                weight = 0.5 + 0.5 * (i + 1) / n  # closest chapter last
+            elif name == "story_so_far":
+                weight = 0.6 + 0.4 * (i + 1) / n  # closest part last
+            elif name == "related_passages":
+                weight = 1.0 - 0.5 * i / n  # best match first
+            elif name == "outline_path":
+                weight = 0.6 + 0.4 * (i + 1) / n  # current chapter deepest
+            else:
+                weight = 1.0
+            snippets.append(Snippet(source=name, order=i, text=part, weight=weight))
+    return prefixes, snippets
+
+
+@dataclass
+class Allocation:
+    """
+    Outcome of allocate().
+
+    Attributes:
+        sections: Field -> rendered section text (only fields with selected snippets).
+        selected: Field -> orders of the selected snippets.
+        stats: budget_stats for AssembledContext.
+    """
+    sections: Dict[str, str]
+    selected: Dict[str, List[int]]
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+
+def _render_sections(prefixes: Dict[str, str], chosen: Dict[str, List[Snippet]]) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for name, items in chosen.items():
+        if not items:
+            continue
+        lines = [prefixes[name]] if prefixes.get(name) else []
+        lines.extend(s.text for s in sorted(items, key=lambda s: s.order))
+        out[name] = "\n".join(lines)
+    return out
+
+
+def allocate(
+    fields: Dict[str, str],
+    budget: ContextBudget,
+    render: Callable[[Dict[str, str]], str],
+) -> Allocation:
+    """
+    Choose snippets across sections so the rendered context fits the budget.
+
+    Greedy knapsack by value density: each snippet costs its tokens (plus its section's
+    header and prefix for the first snippet of a section). Leftover room goes to the
+    densest snippet that did not fit, truncated to the room left. The rendered block is
+    then counted exactly: if it overflows, the least dense snippets are dropped; if room
+    is left (estimates of joins run high), another fill round runs on the exact remainder.
+
+    Args:
+        fields: AssembledContext field -> section text from the sources.
+        budget: Token budget and counter.
+        render: Renders field -> section text as the final prompt block.
+
+    Returns:
+        Allocation with the chosen sections and budget_stats.
+    """
+    count = budget.count
+    limit = budget.budget_tokens
+    prefixes, snippets = split_snippets(fields)
+    for s in snippets:
+        s.tokens = count("\n" + s.text)
+    overhead = {
+        name: count(SECTION_HEADERS[name] + ("\n" + prefixes[name] if prefixes.get(name) else "")) + count("\n\n")
+        for name in {s.source for s in snippets}
+    }
+
+    chosen: Dict[str, List[Snippet]] = {}
+    truncated: List[Snippet] = []
+    pending = sorted(snippets, key=lambda s: s.density, reverse=True)
+    sections: Dict[str, str] = {}
+    total = 0
+    for _ in range(_FILL_ROUNDS):
+        used = total
+        added = 0
+        rest: List[Snippet] = []
+        for s in pending:
+            cost = s.tokens + (0 if chosen.get(s.source) else overhead[s.source])
+            if used + cost <= limit:
+                chosen.setdefault(s.source, []).append(s)
+                used += cost
+                added += 1
+            else:
+                rest.append(s)
+        # Fill the remainder with the head of the best snippet that did not fit
+        for s in rest:
+            room = limit - used - (0 if chosen.get(s.source) else overhead[s.source])
+            text = truncate_to_tokens(s.text, room - count("\n"), count) if room > 1 else ""
+            if text:
+                part = Snippet(source=s.source, order=s.order, text=text, weight=s.weight, tokens=count("\n" + text))
+                used += part.tokens + (0 if chosen.get(s.source) else overhead[s.source])
+                chosen.setdefault(s.source, []).append(part)
+                truncated.append(part)
+                rest.remove(s)
+                added += 1
+                break
+        pending = rest
+
+        # Exact check on the rendered block; drop the least dense snippet until it fits
+        sections = _render_sections(prefixes, chosen)
+        total = count(render(sections))
+        while total > limit:
+            pool = [s for items in chosen.values() for s in items]
+            if not pool:
+                break
+            worst = min(pool, key=lambda s: s.density)
+            chosen[worst.source].remove(worst)
+            sections = _render_sections(prefixes, chosen)
+            total = count(render(sections))
+        if not added or not pending or total >= limit:
+            break
+
+    per_source: Dict[str, Dict[str, Any]] = {}
+    for name in SECTION_HEADERS:
+        candidates = [s for s in snippets if s.source == name]
+        if not candidates:
+            continue
+        section = sections.get(name, "")
+        per_source[name] = {
+            "tokens": count(render({name: section})) if section else 0,
+            "candidates": len(candidates),
+            "candidate_tokens": sum(s.tokens for s in candidates),
+            "selected": len(chosen.get(name) or []),
+            "truncated": sum(1 for s in chosen.get(name) or [] if any(s is t for t in truncated)),
+        }
+    stats = {
+        "budget_tokens": limit,
+        "used_tokens": total,
+        "context_window": budget.context_window,
+        "model": budget.model,
+        "tokenizer": budget.tokenizer,
+        "sources": per_source,
+    }
+    selected = {name: sorted(s.order for s in items) for name, items in chosen.items() if items}
+    return Allocation(sections=sections, selected=selected, stats=stats)
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.models import Card, ChapterSummary, ForeshadowItem
+
+
+def _default_cache_size() -> int:
+    try:
+        return max(0, int(os.getenv("CONTEXT_CACHE_SIZE", "128")))
+    except ValueError:
+        return 128
+
+
+# ---- revisions ----
+# (project_id, card_type_id) -> revision, bumped when a card of that type commits
+_card_revisions: Dict[Tuple[int, int], int] = {}
+# (project_id, component) -> revision, bumped when a row of the component's table commits
+_component_revisions: Dict[Tuple[int, str], int] = {}
+# Per-project tables the assembled context reads, by revision vector component
+_COMPONENTS = ((ForeshadowItem, "foreshadows"), (ChapterSummary, "summaries"))
+_rev_lock = threading.Lock()
+_PENDING_KEY = "context_cache.pending"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context) -> None:
+    # new/dirty/deleted still hold the flushed objects here; bumps wait for the commit
+    pending = session.info.setdefault(_PENDING_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Card):
+            if obj.project_id is not None and obj.card_type_id is not None:
+                pending.add(("card", obj.project_id, obj.card_type_id))
+        else:
+            for model, component in _COMPONENTS:
+                if isinstance(obj, model) and obj.project_id is not None:
+                    pending.add((component, obj.project_id, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_revisions(session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        bump_revisions(pending)
+
+
+def bump_revisions(changes: Iterable[Tuple[str, int, Optional[int]]]) -> None:
+    """
+    Bump the revisions of committed changes (also those committed by worker processes).
+
+    Args:
+        changes: ("card", project_id, card_type_id) or (component, project_id, None) entries.
+    """
+    with _rev_lock:
+        for kind, project_id, type_id in changes:
+            if kind == "card":
+                _card_revisions[(project_id, type_id)] = _card_revisions.get((project_id, type_id), 0) + 1
+            else:
+                _component_revisions[(project_id, kind)] = _component_revisions.get((project_id, kind), 0) + 1
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def revision_snapshot(project_id: int, graph_generation: int) -> Dict[Hashable, int]:
+    """
+    Revision vector of a project: graph generation, foreshadowing, summaries and each card type.
+
+    Args:
+        project_id: Project ID.
+        graph_generation: Current graph generation of the project (see CachedKGProvider.generation).
+
+    Returns:
+        Component -> revision ("graph", "foreshadows", "summaries", card type ID).
+    """
+    with _rev_lock:
+        snap: Dict[Hashable, int] = {tid: rev for (pid, tid), rev in _card_revisions.items() if pid == project_id}
+        for _, component in _COMPONENTS:
+            snap[component] = _component_revisions.get((project_id, component), 0)
+    snap["graph"] = graph_generation
+    return snap
+
+
+# ---- cache ----
+class ContextCache:
+    """
+    LRU cache of assembled contexts.
+
+    Entries are keyed by the assembly inputs (project, chapter, participants, budget) and
+    remember the revisions of what they were read from: the graph generation, the
+    foreshadowing items, the chapter summaries and the card types the sources read. An entry is served only
+    while all of those are unchanged, so a commit to an unrelated card type leaves it valid
+    while any change to an input recomputes it.
+    """
+    def __init__(self, max_size: Optional[int] = None) -> None:
+        self.max_size = _default_cache_size() if max_size is None else max(0, int(max_size))
+        self._lock = threading.Lock()
+        # key -> (project_id, dependency revisions, value)
+        self._entries: "OrderedDict[Hashable, Tuple[int, Dict[Hashable, int], Any]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable, current: Dict[Hashable, int]) -> Optional[Any]:
+        """
+        Cached value of key if none of its dependencies changed.
+
+        Args:
+            key: Assembly key.
+            current: Current revision vector of the project (see revision_snapshot).
+
+        Returns:
+            Private copy of the value, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and all(current.get(dep, 0) == rev for dep, rev in entry[1].items()):
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return copy.deepcopy(entry[2])
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def put(self, key: Hashable, project_id: int, snapshot: Dict[Hashable, int], deps: Iterable[Hashable], value: Any) -> None:
+        """
+        Keep a value computed from the state in snapshot.
+
+        Args:
+            key: Assembly key.
+            project_id: Project ID.
+            snapshot: Revision vector taken before computing the value.
+            deps: Components the value depends on (card type IDs, "graph", "foreshadows", "summaries").
+            value: Value to cache.
+        """
+        if self.max_size <= 0:
+            return
+        revs = {dep: snapshot.get(dep, 0) for dep in deps}
+        with self._lock:
+            self._entries[key] = (project_id, revs, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, project_id: int) -> None:
+        """Drop all entries of a project."""
+        with self._lock:
+            for k in [k for k, e in self._entries.items() if e[0] == project_id]:
+                del self._entries[k]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Cache statistics.
+
+        Returns:
+            Dictionary with size, max_size, hits, misses, hit_rate, evictions.
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / total) if total else 0.0,
+                "evictions": self._evictions,
+            }
+
+    def clear(self) -> None:
+        """Drop all entries and reset counters (revisions are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = 0
+
+
+context_cache = ContextCache()
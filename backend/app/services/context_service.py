@@ -1,15 +1,25 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from loguru import logger
 from sqlmodel import Session, select
 
-from app.db.models import Card, CardType
-from app.services.memory_service import MemoryService
+from app.db.models import Card, CardType, ForeshadowItem
+from app.db.session import engine
 from app.schemas.context import FactsStructured
 from app.schemas.relation_extract import CN_TO_EN_KIND
-from app.services.kg_provider import get_provider
+from app.services.kg_provider import get_provider, chapter_key, ORDER_BY_RECENCY
+from app.services.alias_service import resolve_names
+from app.services.context_budget import SECTION_HEADERS, allocate, resolve_budget
+from app.services.context_cache import context_cache, revision_snapshot
+from app.services.participant_service import detect_participants
+from app.services.passage_index import search_passages
+from app.services.chapter_summary_service import ROLLUP_TYPES, current_chapter_summaries, get_summaries
 
 
 
@@ -22,10 +32,12 @@ class ContextAssembleParams:
         project_id: Project ID.
         volume_number: Volume number.
         chapter_number: Chapter number.
-        participants: List of participant names.
+        participants: List of participant names (detected from the draft or chapter when empty).
         current_draft_tail: Tail of the current draft.
         recent_chapters_window: Window size for recent chapters.
         chapter_id: Chapter ID.
+        llm_config_id: LLM config the context is for (tokenizer and context window).
+        token_budget: Token budget of the context block (default CONTEXT_TOKEN_BUDGET).
     """
     project_id: Optional[int]
     volume_number: Optional[int]
@@ -34,6 +46,8 @@ class ContextAssembleParams:
     current_draft_tail: Optional[str]
     recent_chapters_window: Optional[int] = None
     chapter_id: Optional[int] = None
+    llm_config_id: Optional[int] = None
+    token_budget: Optional[int] = None
 
 
 @dataclass
@@ -43,16 +57,46 @@ class AssembledContext:
 
     Attributes:
         facts_subgraph: Text representation of fact subgraph.
-        budget_stats: Statistics about context budget.
+        budget_stats: Token budget and per-source token usage (see context_budget.allocate).
         facts_structured: Structured fact subgraph.
+        recent_chapters: Summaries of the chapters preceding the current one.
+        character_states: Dynamic info of the participating characters.
+        open_foreshadows: Foreshadowing items not yet resolved.
+        outline_path: Outline cards from the volume down to the current chapter.
+        related_passages: Passages of earlier chapters relevant to the current one.
+        story_so_far: Roll-up summaries of the earlier volumes and stages.
+        source_status: Per-source outcome (ok / empty / timeout / skipped / error).
+        participants: Participants the context was assembled for (canonical names).
+        participants_detected: Whether participants were detected from text rather than given.
     """
     facts_subgraph: str
     budget_stats: Dict[str, Any]
     facts_structured: Optional[Dict[str, Any]] = None
+    recent_chapters: str = ""
+    character_states: str = ""
+    open_foreshadows: str = ""
+    outline_path: str = ""
+    related_passages: str = ""
+    story_so_far: str = ""
+    source_status: Dict[str, str] = field(default_factory=dict)
+    participants: List[str] = field(default_factory=list)
+    participants_detected: bool = False
 
     def to_system_prompt_block(self) -> str:
         """Convert to a system prompt block string."""
         parts: List[str] = []
+        if self.story_so_far:
+            parts.append(f"[Story So Far]\n{self.story_so_far}")
+        if self.outline_path:
+            parts.append(f"[Outline Path]\n{self.outline_path}")
+        if self.recent_chapters:
+            parts.append(f"[Recent Chapters]\n{self.recent_chapters}")
+        if self.character_states:
+            parts.append(f"[Character States]\n{self.character_states}")
+        if self.open_foreshadows:
+            parts.append(f"[Open Foreshadowing]\n{self.open_foreshadows}")
+        if self.related_passages:
+            parts.append(f"[Related Passages]\n{self.related_passages}")
         if self.facts_subgraph:
             parts.append(f"[Fact Subgraph]\n{self.facts_subgraph}")
         return "\n\n".join(parts)
@@ -70,11 +114,408 @@ def _compose_facts_subgraph_stub() -> str:
     return "Key Facts: None (Not yet collected)."
 
 
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Seconds each source may take before assembly moves on without it
+CONTEXT_SOURCE_TIMEOUT = _env_float("CONTEXT_SOURCE_TIMEOUT", 3.0)
+DEFAULT_RECENT_CHAPTERS = 3
+# Passages retrieved from earlier chapters (the budget allocator keeps what fits)
+DEFAULT_RELATED_PASSAGES = 8
+# Card type names (current English names and legacy Chinese ones)
+_CHAPTER_TYPES = ("Chapter", "章节正文")
+_CHAPTER_OUTLINE_TYPES = ("ChapterOutline", "章节大纲")
+_CHARACTER_TYPES = ("CharacterCard", "角色卡")
+_CONTEXT_CARD_TYPES = _CHAPTER_TYPES + _CHAPTER_OUTLINE_TYPES + _CHARACTER_TYPES + ROLLUP_TYPES
+# Statuses under which an assembly is complete enough to be reused
+_CACHEABLE_STATUS = ("ok", "empty")
+
+def _cards_of_types(session: Session, project_id: int, type_names: Tuple[str, ...]) -> List[Card]:
+    return list(session.exec(
+        select(Card).join(CardType).where(Card.project_id == project_id, CardType.name.in_(type_names))
+    ).all())
+
+
+def _card_type_ids(session: Session, type_names: Tuple[str, ...]) -> List[int]:
+    return list(session.exec(select(CardType.id).where(CardType.name.in_(type_names))).all())
+
+
+def _chapter_ordinal(card: Card) -> Optional[int]:
+    content = card.content if isinstance(card.content, dict) else {}
+    return chapter_key(content.get("volume_number"), content.get("chapter_number"))
+
+
+def _source_facts(params: ContextAssembleParams, participants: List[str]) -> Dict[str, Any]:
+    """Relations among participants known as of the current chapter, most recent first."""
+    provider = get_provider()
+    # Relax: edge type allows any (excluding HAS_ALIAS), compatible with old/new graphs
+    edge_whitelist = None
+    # Fetch more relations than a fact line's share of the budget; the allocator picks among them
+    est_top_k = max(20, min(500, (params.token_budget or 0) // 4))
+    # Only relations among participants, known as of the current chapter, most recent first
+    sub_struct = provider.query_subgraph(
+        project_id=params.project_id or -1,
+        participants=participants,
+        radius=0,
+        edge_type_whitelist=edge_whitelist,
+        top_k=est_top_k,
+        max_chapter_id=chapter_key(params.volume_number, params.chapter_number),
+        order_by=ORDER_BY_RECENCY,
+    )
+    facts_text = _compose_facts_subgraph_stub()
+    filtered_relation_items = [it for it in (sub_struct.get("relation_summaries") or []) if isinstance(it, dict)]
+    if filtered_relation_items:
+        lines: List[str] = ["Key Facts:"]
+        for it in filtered_relation_items:
+            a = str(it.get("a")); b = str(it.get("b")); kind_cn = str(it.get("kind") or "Other")
+            pred_en = CN_TO_EN_KIND.get(kind_cn, kind_cn)
+            lines.append(f"- {a} {pred_en} {b}")
+        facts_text = "\n".join(lines)
+    else:
+        raw = sub_struct
+        txt = "\n".join([f"- {f}" for f in (raw.get("fact_summaries") or [])])
+        if txt:
+            facts_text = "Key Facts:\n" + txt
+    try:
+        fs_model = FactsStructured(
+            fact_summaries=list(sub_struct.get("fact_summaries") or []),
+            relation_summaries=[
+                {
+                    "a": it.get("a"),
+                    "b": it.get("b"),
+                    "kind": CN_TO_EN_KIND.get(str(it.get("kind") or ""), "other"),
+                    "description": it.get("description"),
+                    "a_to_b_addressing": it.get("a_to_b_addressing"),
+                    "b_to_a_addressing": it.get("b_to_a_addressing"),
+                    "recent_dialogues": it.get("recent_dialogues") or [],
+                    "recent_event_summaries": it.get("recent_event_summaries") or [],
+                    "stance": it.get("stance"),
+                }
+                for it in filtered_relation_items
+            ],
+        )
+        facts_structured = fs_model.model_dump()
+    except Exception:
+        facts_structured = {
+            "fact_summaries": sub_struct.get("fact_summaries") or [],
+            "relation_summaries": filtered_relation_items,
+        }
+    return {"facts_subgraph": facts_text, "facts_structured": facts_structured}
+
+
+def _source_recent_chapters(params: ContextAssembleParams, participants: List[str]) -> Dict[str, Any]:
+    """Summaries of the chapters before the current one (sibling chapter cards when chapter_id is known).
+
+    Uses the stored chapter summary when it matches the chapter's text, else the chapter
+    outline's overview, else the end of the chapter.
+    """
+    current = chapter_key(params.volume_number, params.chapter_number)
+    window = params.recent_chapters_window or DEFAULT_RECENT_CHAPTERS
+    if not params.project_id or window <= 0:
+        return {}
+    with Session(engine) as session:
+        chapters = _cards_of_types(session, params.project_id, _CHAPTER_TYPES)
+        if params.chapter_id:
+            me = session.get(Card, params.chapter_id)
+            if me is not None:
+                chapters = [c for c in chapters if c.parent_id == me.parent_id]
+                current = current if current is not None else _chapter_ordinal(me)
+        chapters = [c for c in chapters if c.id != params.chapter_id and _chapter_ordinal(c) is not None]
+        if current is not None:
+            chapters = [c for c in chapters if _chapter_ordinal(c) < current]
+        chapters.sort(key=_chapter_ordinal)
+        chapters = chapters[-window:]
+        if not chapters:
+            return {}
+        # Chapter outlines carry the overview written for each chapter
+        overviews: Dict[int, str] = {}
+        for oc in _cards_of_types(session, params.project_id, _CHAPTER_OUTLINE_TYPES):
+            ck = _chapter_ordinal(oc)
+            overview = (oc.content or {}).get("overview") if isinstance(oc.content, dict) else None
+            if ck is not None and overview:
+                overviews[ck] = str(overview)
+        stored = current_chapter_summaries(session, chapters)
+        lines: List[str] = []
+        for c in chapters:
+            content = c.content if isinstance(c.content, dict) else {}
+            summary = stored.get(c.id) or overviews.get(_chapter_ordinal(c))
+            if not summary:
+                text = str(content.get("content") or "").strip()
+                summary = ("..." + text[-300:]) if len(text) > 300 else text
+            if summary:
+                lines.append(f"- {c.title}: {summary}")
+    return {"recent_chapters": "\n".join(lines)}
+
+
+def _source_character_states(params: ContextAssembleParams, participants: List[str]) -> Dict[str, Any]:
+    """Dynamic info of the participating characters."""
+    if not params.project_id or not participants:
+        return {}
+    wanted = set(participants)
+    lines: List[str] = []
+    with Session(engine) as session:
+        for card in _cards_of_types(session, params.project_id, _CHARACTER_TYPES):
+            if card.title not in wanted or not isinstance(card.content, dict):
+                continue
+            # Read dynamic_info as stored; partially filled cards would fail CharacterCard validation
+            dynamic_info = card.content.get("dynamic_info") or {}
+            items = [
+                (str(cat), str(it.get("info")))
+                for cat, lst in (dynamic_info.items() if isinstance(dynamic_info, dict) else [])
+                for it in (lst or [])
+                if isinstance(it, dict) and it.get("info")
+            ]
+            if not items:
+                continue
+            lines.append(f"- {card.title}:")
+            lines.extend(f"  • {cat}: {info}" for cat, info in items)
+    return {"character_states": "\n".join(lines)}
+
+
+def _source_foreshadows(params: ContextAssembleParams, participants: List[str]) -> Dict[str, Any]:
+    """Open foreshadowing items of the project."""
+    if not params.project_id:
+        return {}
+    with Session(engine) as session:
+        items = session.exec(
+            select(ForeshadowItem)
+            .where(ForeshadowItem.project_id == params.project_id, ForeshadowItem.status == "open")
+            .order_by(ForeshadowItem.created_at)
+        ).all()
+        lines = [f"- [{it.type}] {it.title}" + (f": {it.note}" if it.note else "") for it in items]
+    return {"open_foreshadows": "\n".join(lines)}
+
+
+def _source_outline_path(params: ContextAssembleParams, participants: List[str]) -> Dict[str, Any]:
+    """Outline cards from the root down to the current chapter (or its chapter outline)."""
+    if not params.project_id:
+        return {}
+    with Session(engine) as session:
+        card: Optional[Card] = session.get(Card, params.chapter_id) if params.chapter_id else None
+        current = chapter_key(params.volume_number, params.chapter_number)
+        if card is None and current is not None:
+            card = next((c for c in _cards_of_types(session, params.project_id, _CHAPTER_OUTLINE_TYPES) if _chapter_ordinal(c) == current), None)
+        path: List[Card] = []
+        seen = set()
+        while card is not None and card.id not in seen:
+            seen.add(card.id)
+            path.append(card)
+            card = session.get(Card, card.parent_id) if card.parent_id else None
+        lines: List[str] = []
+        type_ids = sorted({c.card_type_id for c in path})
+        for depth, c in enumerate(reversed(path)):
+            content = c.content if isinstance(c.content, dict) else {}
+            overview = content.get("overview") or content.get("main_target") or ""
+            line = "  " * depth + f"- {c.title}"
+            if overview:
+                line += f": {_truncate(str(overview), 400)}"
+            lines.append(line)
+    # Card types read along the path (cache dependencies, not part of the context)
+    return {"outline_path": "\n".join(lines), "outline_card_type_ids": type_ids}
+
+
+def _current_chapter_card(session: Session, params: ContextAssembleParams) -> Optional[Card]:
+    if params.chapter_id:
+        return session.get(Card, params.chapter_id)
+    current = chapter_key(params.volume_number, params.chapter_number)
+    if current is None:
+        return None
+    for type_names in (_CHAPTER_TYPES, _CHAPTER_OUTLINE_TYPES):
+        card = next((c for c in _cards_of_types(session, params.project_id, type_names) if _chapter_ordinal(c) == current), None)
+        if card is not None:
+            return card
+    return None
+
+
+def _source_story_so_far(params: ContextAssembleParams, participants: List[str]) -> Dict[str, Any]:
+    """Roll-ups of the volumes and stages before the current one (chapter -> stage -> volume)."""
+    if not params.project_id:
+        return {}
+    with Session(engine) as session:
+        node = _current_chapter_card(session, params)
+        rollup_type_ids = set(_card_type_ids(session, ROLLUP_TYPES))
+        earlier: List[Card] = []
+        seen = set()
+        while node is not None and node.parent_id and node.id not in seen:
+            seen.add(node.id)
+            parent = session.get(Card, node.parent_id)
+            if parent is None:
+                break
+            if node.card_type_id in rollup_type_ids:
+                # Earlier stages of this volume (or earlier volumes), in display order
+                siblings = session.exec(
+                    select(Card).where(Card.parent_id == node.parent_id, Card.card_type_id == node.card_type_id).order_by(Card.display_order, Card.id)
+                ).all()
+                before = []
+                for sib in siblings:
+                    if sib.id == node.id:
+                        break
+                    before.append(sib)
+                earlier = before + earlier
+            node = parent
+        # Volumes sit under the project root card or at the top level
+        if node is not None and node.card_type_id in rollup_type_ids and not node.parent_id:
+            volumes = session.exec(
+                select(Card).where(Card.project_id == params.project_id, Card.parent_id.is_(None), Card.card_type_id == node.card_type_id).order_by(Card.display_order, Card.id)
+            ).all()
+            before = []
+            for vol in volumes:
+                if vol.id == node.id:
+                    break
+                before.append(vol)
+            earlier = before + earlier
+        rows = get_summaries(session, [c.id for c in earlier])
+        lines = [f"- {c.title}: {' '.join(rows[c.id].summary.split())}" for c in earlier if c.id in rows and rows[c.id].summary]
+    return {"story_so_far": "\n".join(lines)}
+
+
+def _source_passages(params: ContextAssembleParams, participants: List[str]) -> Dict[str, Any]:
+    """Passages of earlier chapters most similar (BM25) to the draft, chapter or outline."""
+    if not params.project_id:
+        return {}
+    with Session(engine) as session:
+        query = _detection_text(session, params)
+        if participants:
+            query = f"{query}\n{' '.join(participants)}"
+        hits = search_passages(
+            session,
+            params.project_id,
+            query,
+            top_k=DEFAULT_RELATED_PASSAGES,
+            before_ordinal=chapter_key(params.volume_number, params.chapter_number),
+            exclude_cards=[params.chapter_id] if params.chapter_id else (),
+        )
+    lines = [f"- {h['title']}: {' '.join(str(h['text']).split())}" for h in hits]
+    return {"related_passages": "\n".join(lines)}
+
+
+# name -> loader(params, resolved participants) -> AssembledContext fields
+CONTEXT_SOURCES: Dict[str, Callable[[ContextAssembleParams, List[str]], Dict[str, Any]]] = {
+    "facts": _source_facts,
+    "recent_chapters": _source_recent_chapters,
+    "character_states": _source_character_states,
+    "foreshadows": _source_foreshadows,
+    "outline_path": _source_outline_path,
+    "passages": _source_passages,
+    "story_so_far": _source_story_so_far,
+}
+
+# Shared pool: sources of concurrent assemblies queue here instead of spawning threads per request.
+# Sized so the calls left running by timed-out sources (skipped while one runs, see
+# _gather_sources) cannot occupy every worker
+_source_pool = ThreadPoolExecutor(max_workers=2 * len(CONTEXT_SOURCES) + 2, thread_name_prefix="context-source")
+# source name -> call that timed out and is still running (threads cannot be cancelled)
+_stalled: Dict[str, Future] = {}
+_stalled_lock = threading.Lock()
+
+
+def _release_stalled(name: str, fut: Future) -> None:
+    with _stalled_lock:
+        if _stalled.get(name) is fut:
+            del _stalled[name]
+
+
+def _gather_sources(params: ContextAssembleParams, participants: List[str], timeout: float) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Run all sources concurrently; each gets `timeout` seconds from the start of assembly.
+
+    A source whose call timed out keeps its pool thread until it returns; while it does, the
+    source is skipped (status "skipped") instead of queueing more calls behind the stalled
+    backend.
+
+    Returns:
+        (merged fields of the sources that finished, per-source status).
+    """
+    fields: Dict[str, Any] = {}
+    status: Dict[str, str] = {}
+    futures: Dict[str, Future] = {}
+    with _stalled_lock:
+        stalled = set(_stalled)
+    for name, fn in CONTEXT_SOURCES.items():
+        if name in stalled:
+            status[name] = "skipped"
+            logger.warning(f"[Context] source {name} skipped: an earlier call is still running")
+        else:
+            futures[name] = _source_pool.submit(fn, params, participants)
+    deadline = time.monotonic() + timeout
+    for name, fut in futures.items():
+        try:
+            res = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            if not fut.cancel():
+                with _stalled_lock:
+                    _stalled.setdefault(name, fut)
+                fut.add_done_callback(lambda f, name=name: _release_stalled(name, f))
+            status[name] = "timeout"
+            logger.warning(f"[Context] source {name} timed out after {timeout}s")
+            continue
+        except Exception as e:
+            status[name] = "error"
+            logger.warning(f"[Context] source {name} failed: {e}")
+            continue
+        res = {k: v for k, v in (res or {}).items() if v}
+        status[name] = "ok" if res else "empty"
+        fields.update(res)
+    return fields, status
+
+
+def _detection_text(session: Session, params: ContextAssembleParams) -> str:
+    """Text to detect participants in: the draft tail, else the chapter body, else its outline."""
+    if params.current_draft_tail and params.current_draft_tail.strip():
+        return params.current_draft_tail
+    current = chapter_key(params.volume_number, params.chapter_number)
+    chapter: Optional[Card] = session.get(Card, params.chapter_id) if params.chapter_id else None
+    if chapter is None and current is not None:
+        chapter = next((c for c in _cards_of_types(session, params.project_id, _CHAPTER_TYPES) if _chapter_ordinal(c) == current), None)
+    content = chapter.content if chapter is not None and isinstance(chapter.content, dict) else {}
+    if str(content.get("content") or "").strip():
+        return str(content["content"])
+    current = current if current is not None else (_chapter_ordinal(chapter) if chapter is not None else None)
+    if current is None:
+        return ""
+    outline = next((c for c in _cards_of_types(session, params.project_id, _CHAPTER_OUTLINE_TYPES) if _chapter_ordinal(c) == current), None)
+    content = outline.content if outline is not None and isinstance(outline.content, dict) else {}
+    return "\n".join(str(v) for v in (content.get("title"), content.get("overview")) if v)
+
+
+def _render_sections(sections: Dict[str, str]) -> str:
+    fields = {name: sections.get(name, "") for name in SECTION_HEADERS}
+    return AssembledContext(budget_stats={}, **fields).to_system_prompt_block()
+
+
+def _select_relations(facts_structured: Optional[Dict[str, Any]], kept: List[int], total: int) -> Optional[Dict[str, Any]]:
+    """Keep the relation summaries whose fact lines made it into the budget."""
+    if not facts_structured:
+        return facts_structured
+    relations = list(facts_structured.get("relation_summaries") or [])
+    if len(relations) != total:
+        return facts_structured
+    keep = set(kept)
+    return {**facts_structured, "relation_summaries": [r for i, r in enumerate(relations) if i in keep]}
+
 
 def assemble_context(session: Session, params: ContextAssembleParams) -> AssembledContext:
     """
     Assemble context for AI generation.
 
+    Graph facts, recent chapter summaries, roll-ups of earlier stages and volumes, character
+    dynamic info, open foreshadowing, the outline path and related passages of earlier
+    chapters are gathered concurrently. A source that fails or exceeds
+    CONTEXT_SOURCE_TIMEOUT is left out (see source_status) instead of failing the assembly.
+    What the sources return is then fitted into the token budget of the target model
+    (see context_budget.allocate); budget_stats reports the exact usage per source.
+
+    When no participants are given they are detected from the draft tail (else the chapter
+    body or outline) with the project's entity matcher (see participant_service).
+
+    Results are memoized per (project, chapter, participants, budget) and reused until
+    the graph, the card types read, the summaries or the foreshadowing items of the project change
+    (see context_cache).
+
     Args:
         session: Database session.
         params: Context assembly parameters.
@@ -82,76 +523,52 @@ def assemble_context(session: Session, params: ContextAssembleParams) -> Assembl
     Returns:
         AssembledContext object.
     """
-    facts_quota = 5000
+    budget = resolve_budget(session, params.llm_config_id, params.token_budget)
+    # Revisions are read before any source so a write landing mid-assembly invalidates the result
+    project_id = params.project_id
+    graph_gen = getattr(get_provider(), "generation", None)
+    snapshot = revision_snapshot(project_id, graph_gen(project_id)) if project_id and callable(graph_gen) else None
 
-    eff_participants: List[str] = list(params.participants or [])
-    participant_set = set(eff_participants)
-
-    facts_text = _compose_facts_subgraph_stub()
-    facts_structured: Optional[Dict[str, Any]] = None
-    try:
-        provider = get_provider()
-        # Relax: edge type allows any (excluding HAS_ALIAS), compatible with old/new graphs
-        edge_whitelist = None
-        est_top_k = max(5, min(100, facts_quota // 100))
-        sub_struct = provider.query_subgraph(
-            project_id=params.project_id or -1,
-            participants=eff_participants,
-            radius=2,
-            edge_type_whitelist=edge_whitelist,
-            top_k=est_top_k,
-            max_chapter_id=None,
-        )
-        raw_relation_items = [it for it in (sub_struct.get("relation_summaries") or []) if isinstance(it, dict)]
-        filtered_relation_items = [
-            it for it in raw_relation_items
-            if (str(it.get("a")) in participant_set and str(it.get("b")) in participant_set)
-        ]
-        if filtered_relation_items:
-            lines: List[str] = ["Key Facts:"]
-            for it in filtered_relation_items:
-                a = str(it.get("a")); b = str(it.get("b")); kind_cn = str(it.get("kind") or "Other")
-                pred_en = CN_TO_EN_KIND.get(kind_cn, kind_cn)
-                lines.append(f"- {a} {pred_en} {b}")
-            facts_text = "\n".join(lines)
+    eff_participants: List[str] = [p for p in (params.participants or []) if p]
+    detected = False
+    if project_id:
+        if eff_participants:
+            # Aliases / titles map to canonical entity names
+            eff_participants = resolve_names(project_id, eff_participants)
         else:
-            raw = sub_struct
-            txt = "\n".join([f"- {f}" for f in (raw.get("fact_summaries") or [])])
-            if txt:
-                facts_text = "Key Facts:\n" + txt
-        try:
-            from app.schemas.context import FactsStructured as _FactsStructured
-            fs_model = _FactsStructured(
-                fact_summaries=list(sub_struct.get("fact_summaries") or []),
-                relation_summaries=[
-                    {
-                        "a": it.get("a"),
-                        "b": it.get("b"),
-                        "kind": it.get("kind"),
-                        "description": it.get("description"),
-                        "a_to_b_addressing": it.get("a_to_b_addressing"),
-                        "b_to_a_addressing": it.get("b_to_a_addressing"),
-                        "recent_dialogues": it.get("recent_dialogues") or [],
-                        "recent_event_summaries": it.get("recent_event_summaries") or [],
-                        "stance": it.get("stance"),
-                    }
-                    for it in filtered_relation_items
-                ],
-            )
-            facts_structured = fs_model.model_dump()
-        except Exception:
-            facts_structured = {
-                "fact_summaries": sub_struct.get("fact_summaries") or [],
-                "relation_summaries": filtered_relation_items,
-            }
-    except Exception:
-        pass
+            # Without participants the graph query returns nothing; take them from the text
+            eff_participants = detect_participants(session, project_id, _detection_text(session, params))
+            detected = True
 
-    facts = _truncate(facts_text, facts_quota)
+    key = (
+        project_id, params.volume_number, params.chapter_number, params.chapter_id,
+        tuple(sorted(eff_participants)), params.recent_chapters_window, budget.budget_tokens, budget.model,
+        hash(params.current_draft_tail or ""),
+    )
+    if snapshot is not None:
+        cached = context_cache.get(key, snapshot)
+        if cached is not None:
+            cached.participants_detected = detected
+            return cached
 
+    params = replace(params, token_budget=budget.budget_tokens)
+    fields, status = _gather_sources(params, eff_participants, CONTEXT_SOURCE_TIMEOUT)
+    facts_structured = fields.pop("facts_structured", None)
+    outline_type_ids = fields.pop("outline_card_type_ids", None) or []
+    fields["facts_subgraph"] = fields.get("facts_subgraph") or _compose_facts_subgraph_stub()
 
-    return AssembledContext(
-        facts_subgraph=facts,
-        budget_stats={},
-        facts_structured=facts_structured,
+    alloc = allocate(fields, budget, _render_sections)
+    fact_lines = alloc.stats["sources"].get("facts_subgraph", {}).get("candidates", 0)
+    ctx = AssembledContext(
+        facts_subgraph=alloc.sections.get("facts_subgraph", ""),
+        budget_stats=alloc.stats,
+        facts_structured=_select_relations(facts_structured, alloc.selected.get("facts_subgraph", []), fact_lines),
+        source_status=status,
+        participants=eff_participants,
+        participants_detected=detected,
+        **{name: text for name, text in alloc.sections.items() if name != "facts_subgraph"},
     )
+    if snapshot is not None and all(st in _CACHEABLE_STATUS for st in status.values()):
+        deps = {"graph", "foreshadows", "summaries", *outline_type_ids, *_card_type_ids(session, _CONTEXT_CARD_TYPES)}
+        context_cache.put(key, project_id, snapshot, deps, ctx)
+    return ctx
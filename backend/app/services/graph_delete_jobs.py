@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from loguru import logger
+from sqlmodel import Session, select
+
+from app.db.models import GraphDeleteJob
+from app.db.session import engine
+from app.services import graph_ingest_queue
+
+# Seconds a deletion waits for the project's running ingest jobs (a crashed writer leaves them running)
+_INGEST_WAIT_SECONDS = 60
+_INGEST_POLL_SECONDS = 0.2
+
+
+def schedule_project_graph_delete(session: Session, project_id: int) -> GraphDeleteJob:
+    """
+    Record a graph deletion job for a project and start it in the background.
+
+    Pending ingest jobs of the project are cancelled first so the worker does not
+    re-create parts of the graph being deleted; jobs already being written are waited
+    for by the deletion (see run_delete_job), and any claimed later are dropped by the
+    worker while this job is pending or running.
+
+    Args:
+        session: Database session (committed here).
+        project_id: Project ID.
+
+    Returns:
+        The committed GraphDeleteJob.
+    """
+    graph_ingest_queue.cancel_project_jobs(session, project_id, reason="project deleted")
+    job = GraphDeleteJob(project_id=project_id)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    _start(job.id)
+    return job
+
+
+def get_delete_job(session: Session, job_id: int) -> Optional[GraphDeleteJob]:
+    """Get a graph deletion job by ID."""
+    return session.get(GraphDeleteJob, job_id)
+
+
+def latest_delete_job(session: Session, project_id: int) -> Optional[GraphDeleteJob]:
+    """Most recent graph deletion job of a project."""
+    return session.exec(
+        select(GraphDeleteJob).where(GraphDeleteJob.project_id == project_id).order_by(GraphDeleteJob.id.desc()).limit(1)
+    ).first()
+
+
+def resume_pending_deletes() -> int:
+    """
+    Restart deletions that were pending or interrupted by a shutdown.
+
+    Returns:
+        Number of jobs restarted.
+    """
+    with Session(engine) as session:
+        ids = session.exec(
+            select(GraphDeleteJob.id).where(GraphDeleteJob.status.in_(["pending", "running"])).order_by(GraphDeleteJob.id)
+        ).all()
+    for job_id in ids:
+        _start(job_id)
+    if ids:
+        logger.info(f"[GraphDelete] resumed {len(ids)} deletion jobs")
+    return len(ids)
+
+
+def _start(job_id: int) -> None:
+    threading.Thread(target=run_delete_job, args=(job_id,), name=f"graph-delete-{job_id}", daemon=True).start()
+
+
+def _wait_for_ingest(session: Session, project_id: int) -> None:
+    """Wait until no ingest job of the project is being written (bounded by _INGEST_WAIT_SECONDS)."""
+    deadline = time.monotonic() + _INGEST_WAIT_SECONDS
+    while graph_ingest_queue.running_count(session, project_id):
+        if time.monotonic() >= deadline:
+            logger.warning(f"[GraphDelete] project={project_id} ingest jobs still running, deleting anyway")
+            return
+        time.sleep(_INGEST_POLL_SECONDS)
+
+
+def run_delete_job(job_id: int) -> None:
+    """
+    Delete a project's graph in bounded batches, recording progress on the job row.
+
+    Ingest jobs of the project that were already being written when the deletion was
+    scheduled finish first, so none of their writes land between or after the batches.
+
+    Args:
+        job_id: GraphDeleteJob ID.
+    """
+    from app.services.kg_provider import get_provider
+
+    with Session(engine) as session:
+        job = session.get(GraphDeleteJob, job_id)
+        if job is None or job.status == "done":
+            return
+        job.status = "running"
+        job.started_at = job.started_at or datetime.utcnow()
+        session.add(job)
+        session.commit()
+
+        def progress(relationships: int, nodes: int) -> None:
+            job.deleted_relationships = relationships
+            job.deleted_nodes = nodes
+            session.add(job)
+            session.commit()
+
+        try:
+            _wait_for_ingest(session, job.project_id)
+            get_provider().delete_project_graph(job.project_id, progress=progress)
+        except Exception as e:
+            # Graph DB unavailable: keep the job so it is retried on the next start
+            job.status = "pending"
+            job.last_error = str(e)[:2000]
+            session.add(job)
+            session.commit()
+            logger.warning(f"[GraphDelete] project={job.project_id} deletion failed: {e}")
+            return
+        job.status = "done"
+        job.last_error = None
+        job.finished_at = datetime.utcnow()
+        session.add(job)
+        session.commit()
+        logger.info(f"[GraphDelete] project={job.project_id} relationships={job.deleted_relationships} nodes={job.deleted_nodes}")
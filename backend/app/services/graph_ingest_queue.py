@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlmodel import Session, select, func
+
+from app.db.models import GraphDeleteJob, GraphIngestJob, Project
+from app.db.session import engine
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# queue: endpoints enqueue and return; inline: write inside the request (previous behaviour)
+GRAPH_INGEST_MODE = (os.getenv("GRAPH_INGEST_MODE") or "queue").strip().lower()
+# Back-pressure: pending jobs accepted before enqueue is refused
+GRAPH_INGEST_QUEUE_MAX = _env_int("GRAPH_INGEST_QUEUE_MAX", 500)
+# Jobs of one project folded into a single flush
+GRAPH_INGEST_COALESCE_MAX = _env_int("GRAPH_INGEST_COALESCE_MAX", 50)
+GRAPH_INGEST_MAX_ATTEMPTS = _env_int("GRAPH_INGEST_MAX_ATTEMPTS", 5)
+# Finished jobs are kept this long for status queries
+GRAPH_INGEST_RETENTION_HOURS = _env_int("GRAPH_INGEST_RETENTION_HOURS", 24)
+
+_POLL_SECONDS = 2.0
+_MAX_BACKOFF_SECONDS = 300
+
+
+class IngestQueueFullError(RuntimeError):
+    """Raised when the ingest queue is at capacity; callers should retry later."""
+    pass
+
+
+def queue_enabled() -> bool:
+    """Whether relation ingestion goes through the background queue."""
+    return GRAPH_INGEST_MODE != "inline"
+
+
+def pending_count(session: Session) -> int:
+    """Number of jobs waiting to be written."""
+    return int(session.exec(
+        select(func.count()).select_from(GraphIngestJob).where(GraphIngestJob.status.in_(["pending", "running"]))
+    ).one())
+
+
+def enqueue_relations(session: Session, project_id: int, rows: List[Dict[str, Any]]) -> GraphIngestJob:
+    """
+    Durably enqueue prepared relation rows for background ingestion.
+
+    Args:
+        session: Database session (committed here).
+        project_id: Project ID.
+        rows: Rows produced by MemoryService.prepare_relation_rows.
+
+    Returns:
+        The committed GraphIngestJob.
+
+    Raises:
+        IngestQueueFullError: If the queue is at capacity.
+    """
+    if pending_count(session) >= GRAPH_INGEST_QUEUE_MAX:
+        raise IngestQueueFullError(f"Graph ingest queue is full ({GRAPH_INGEST_QUEUE_MAX} pending jobs)")
+    job = GraphIngestJob(project_id=project_id, rows_json=rows)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    _worker.notify()
+    return job
+
+
+def cancel_project_jobs(session: Session, project_id: int, reason: str = "cancelled") -> int:
+    """
+    Mark a project's pending jobs as failed so they are never written.
+
+    Args:
+        session: Database session (committed here).
+        project_id: Project ID.
+        reason: Stored as the jobs' last_error.
+
+    Returns:
+        Number of cancelled jobs.
+    """
+    jobs = session.exec(
+        select(GraphIngestJob).where(GraphIngestJob.project_id == project_id, GraphIngestJob.status == "pending")
+    ).all()
+    now = datetime.utcnow()
+    for job in jobs:
+        job.status = "failed"
+        job.last_error = reason
+        job.finished_at = now
+        session.add(job)
+    session.commit()
+    return len(jobs)
+
+
+def running_count(session: Session, project_id: int) -> int:
+    """Number of a project's jobs being written right now."""
+    return int(session.exec(
+        select(func.count()).select_from(GraphIngestJob).where(GraphIngestJob.project_id == project_id, GraphIngestJob.status == "running")
+    ).one())
+
+
+def _project_deleted(session: Session, project_id: int) -> bool:
+    """Whether a project is gone or its graph is being deleted (its relations must not be written)."""
+    if session.get(Project, project_id) is None:
+        return True
+    return session.exec(
+        select(GraphDeleteJob.id).where(GraphDeleteJob.project_id == project_id, GraphDeleteJob.status.in_(["pending", "running"]))
+    ).first() is not None
+
+
+def get_job(session: Session, job_id: int) -> Optional[GraphIngestJob]:
+    """Get an ingest job by ID."""
+    return session.get(GraphIngestJob, job_id)
+
+
+class GraphIngestWorker:
+    """
+    Background thread draining GraphIngestJob rows.
+
+    Each round claims the oldest due job plus up to GRAPH_INGEST_COALESCE_MAX further
+    due jobs of the same project, coalesces their rows per (a, b, kind, chapter), merges them with
+    the stored evidence once, and writes them in chunked ingest transactions. Failures are
+    retried with exponential backoff; jobs left running by a crash are re-queued on start.
+    """
+    def __init__(self) -> None:
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_prune: Optional[datetime] = None
+
+    def start(self) -> None:
+        """Recover interrupted jobs and start the worker thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._recover()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="graph-ingest-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the worker thread after the current flush."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def notify(self) -> None:
+        """Wake the worker (new job available)."""
+        self._wake.set()
+
+    def _recover(self) -> None:
+        with Session(engine) as session:
+            jobs = session.exec(select(GraphIngestJob).where(GraphIngestJob.status == "running")).all()
+            for job in jobs:
+                job.status = "pending"
+                session.add(job)
+            session.commit()
+            if jobs:
+                logger.info(f"[GraphIngest] re-queued {len(jobs)} interrupted jobs")
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                worked = self.run_once()
+                self._prune()
+            except Exception as e:
+                logger.error(f"[GraphIngest] worker round failed: {e}")
+                worked = False
+            if not worked:
+                self._wake.wait(_POLL_SECONDS)
+                self._wake.clear()
+
+    def _claim(self, session: Session) -> List[GraphIngestJob]:
+        now = datetime.utcnow()
+        due = (GraphIngestJob.status == "pending") & (GraphIngestJob.available_at <= now)
+        head = session.exec(select(GraphIngestJob).where(due).order_by(GraphIngestJob.id).limit(1)).first()
+        if head is None:
+            return []
+        jobs = session.exec(
+            select(GraphIngestJob)
+            .where(due, GraphIngestJob.project_id == head.project_id)
+            .order_by(GraphIngestJob.id)
+            .limit(max(1, GRAPH_INGEST_COALESCE_MAX))
+        ).all()
+        for job in jobs:
+            job.status = "running"
+            session.add(job)
+        session.commit()
+        return list(jobs)
+
+    def run_once(self) -> bool:
+        """
+        Process one coalesced batch.
+
+        Returns:
+            True if any job was claimed.
+        """
+        from app.services.kg_provider import get_provider
+        from app.services.memory_service import merge_and_write_relations
+
+        with Session(engine) as session:
+            jobs = self._claim(session)
+            if not jobs:
+                return False
+            project_id = jobs[0].project_id
+            # Checked after the claim: a deletion scheduled later waits for these running jobs
+            if _project_deleted(session, project_id):
+                now = datetime.utcnow()
+                for job in jobs:
+                    job.status = "failed"
+                    job.last_error = "project deleted"
+                    job.finished_at = now
+                    session.add(job)
+                session.commit()
+                logger.info(f"[GraphIngest] project={project_id} deleted, dropped jobs={len(jobs)}")
+                return True
+            rows = [row for job in jobs for row in (job.rows_json or [])]
+            try:
+                res = merge_and_write_relations(get_provider(), project_id, rows)
+            except Exception as e:
+                self._fail(session, jobs, e)
+                return True
+            now = datetime.utcnow()
+            for job in jobs:
+                job.status = "done"
+                job.finished_at = now
+                job.last_error = None
+                session.add(job)
+            session.commit()
+            logger.info(f"[GraphIngest] project={project_id} jobs={len(jobs)} rows={len(rows)} written={res.get('written', 0)}")
+            return True
+
+    def _fail(self, session: Session, jobs: List[GraphIngestJob], error: Exception) -> None:
+        now = datetime.utcnow()
+        for job in jobs:
+            job.attempts += 1
+            job.last_error = str(error)[:2000]
+            if job.attempts >= GRAPH_INGEST_MAX_ATTEMPTS:
+                job.status = "failed"
+                job.finished_at = now
+            else:
+                job.status = "pending"
+                job.available_at = now + timedelta(seconds=min(_MAX_BACKOFF_SECONDS, 2 ** job.attempts))
+            session.add(job)
+        session.commit()
+        logger.warning(f"[GraphIngest] project={jobs[0].project_id} jobs={len(jobs)} write failed: {error}")
+
+    def _prune(self) -> None:
+        now = datetime.utcnow()
+        if self._last_prune and now - self._last_prune < timedelta(minutes=10):
+            return
+        self._last_prune = now
+        cutoff = now - timedelta(hours=GRAPH_INGEST_RETENTION_HOURS)
+        with Session(engine) as session:
+            old = session.exec(
+                select(GraphIngestJob).where(GraphIngestJob.status.in_(["done", "failed"]), GraphIngestJob.finished_at < cutoff)
+            ).all()
+            for job in old:
+                session.delete(job)
+            session.commit()
+
+
+_worker = GraphIngestWorker()
+
+
+def start_worker() -> None:
+    """Start the background ingest worker (no-op in inline mode)."""
+    if queue_enabled():
+        _worker.start()
+
+
+def stop_worker() -> None:
+    """Stop the background ingest worker."""
+    _worker.stop()
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.services.kg_cache import CachedKGProvider
+from app.services.kg_provider import (
+    ORDER_BY_RECENCY,
+    _NEO4J_ALIAS_TABLE,
+    _NEO4J_CREATE_VERSIONS,
+    _NEO4J_FETCH_VERSIONS,
+    _NEO4J_UPDATE_VERSIONS,
+    _empty_subgraph,
+    _neo4j_collect,
+    _neo4j_plan_writes,
+    _neo4j_subgraph_cypher,
+    _neo4j_subgraph_params,
+    get_provider,
+)
+
+
+class AsyncNeo4jKGProvider:
+    """
+    Neo4j provider on the driver's async API, for callers running on the event loop.
+
+    Shares its Cypher and write planning with Neo4jKGProvider, so both produce the same
+    graph; only the Bolt round trips are awaited instead of blocking.
+    """
+    def __init__(self) -> None:
+        from neo4j import AsyncGraphDatabase  # type: ignore
+        uri = os.getenv("NEO4J_URI") or os.getenv("GRAPH_DB_URI") or "bolt://127.0.0.1:7687"
+        user = os.getenv("NEO4J_USER") or os.getenv("GRAPH_DB_USER") or "neo4j"
+        password = os.getenv("NEO4J_PASSWORD") or os.getenv("GRAPH_DB_PASSWORD") or "neo4j"
+        self._driver = AsyncGraphDatabase.driver(uri, auth=(user, password))
+
+    async def close(self) -> None:
+        """Close the driver."""
+        try:
+            await self._driver.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _group(project_id: int) -> str:
+        return f"proj:{project_id}"
+
+    async def ingest_triples_with_attributes(self, project_id: int, triples: List[Tuple[str, str, str, Dict[str, Any]]]) -> None:
+        """
+        Ingest triples with attributes into the graph (see Neo4jKGProvider).
+
+        Args:
+            project_id: Project ID.
+            triples: List of tuples (source, predicate, object, attributes).
+        """
+        if not triples:
+            return
+        group = self._group(project_id)
+        pairs = list({(s, o): None for s, _, o, _ in triples})
+        async with self._driver.session() as sess:
+            tx = await sess.begin_transaction()
+            try:
+                res = await tx.run(_NEO4J_FETCH_VERSIONS, pairs=[list(pair) for pair in pairs], group=group)
+                records = [rec async for rec in res]
+                updates, creates = _neo4j_plan_writes(pairs, records, triples)
+                if updates:
+                    await (await tx.run(_NEO4J_UPDATE_VERSIONS, rows=updates)).consume()
+                if creates:
+                    await (await tx.run(_NEO4J_CREATE_VERSIONS, rows=creates, group=group)).consume()
+                await tx.commit()
+            finally:
+                await tx.close()
+
+    async def query_subgraph(
+        self,
+        project_id: int,
+        participants: Optional[List[str]] = None,
+        radius: int = 2,
+        edge_type_whitelist: Optional[List[str]] = None,
+        top_k: int = 50,
+        max_chapter_id: Optional[int] = None,
+        order_by: str = ORDER_BY_RECENCY,
+    ) -> Dict[str, Any]:
+        """Query subgraph for given participants (same semantics as Neo4jKGProvider.query_subgraph)."""
+        parts = [p for p in (participants or []) if isinstance(p, str) and p.strip()]
+        if not parts:
+            return _empty_subgraph()
+        params = _neo4j_subgraph_params(self._group(project_id), parts, edge_type_whitelist, top_k, max_chapter_id)
+        async with self._driver.session() as sess:
+            res = await sess.run(_neo4j_subgraph_cypher(radius, order_by), **params)
+            records = [rec async for rec in res]
+        return _neo4j_collect(records, top_k)
+
+    async def get_alias_table(self, project_id: int) -> Dict[str, str]:
+        """Alias -> canonical name for a project."""
+        table: Dict[str, str] = {}
+        async with self._driver.session() as sess:
+            res = await sess.run(_NEO4J_ALIAS_TABLE, group=self._group(project_id))
+            async for rec in res:
+                for al in rec["aliases"] or []:
+                    table[al] = rec["name"]
+        return table
+
+
+class AsyncKGProvider:
+    """
+    Awaitable facade over the active knowledge graph provider.
+
+    Reads go through the same subgraph cache as the sync provider and writes invalidate
+    it, so sync and async callers always see one consistent graph. Backends with a native
+    async driver (Neo4j) are awaited directly; the embedded SQLite provider, whose calls
+    are in-memory lookups plus local writes, runs in a worker thread.
+    """
+    def __init__(self, cached: CachedKGProvider, native: Optional[Any] = None) -> None:
+        self.cached = cached
+        self.native = native
+
+    def generation(self, project_id: int) -> int:
+        """Current graph generation of a project (see CachedKGProvider.generation)."""
+        return self.cached.generation(project_id)
+
+    async def query_subgraph(
+        self,
+        project_id: int,
+        participants: Optional[List[str]] = None,
+        radius: int = 2,
+        edge_type_whitelist: Optional[List[str]] = None,
+        top_k: int = 50,
+        max_chapter_id: Optional[int] = None,
+        order_by: str = ORDER_BY_RECENCY,
+    ) -> Dict[str, Any]:
+        """Cached query_subgraph; returns a private copy the caller may mutate."""
+        if self.native is None:
+            return await asyncio.to_thread(
+                self.cached.query_subgraph, project_id, participants, radius, edge_type_whitelist, top_k, max_chapter_id, order_by
+            )
+        key = self.cached.cache_key(project_id, participants, radius, edge_type_whitelist, top_k, max_chapter_id, order_by)
+        gen, cached = self.cached.lookup(key)
+        if cached is not None:
+            return cached
+        data = await self.native.query_subgraph(project_id, participants, radius, edge_type_whitelist, top_k, max_chapter_id, order_by)
+        self.cached.store(key, gen, data)
+        return data
+
+    async def ingest_triples_with_attributes(self, project_id: int, triples: List[Tuple[str, str, str, Dict[str, Any]]]) -> None:
+        """Ingest triples, then invalidate the project's cached subgraphs."""
+        if self.native is None:
+            await asyncio.to_thread(self.cached.ingest_triples_with_attributes, project_id, triples)
+            return
+        # Constraints/indexes are owned by the sync provider; make sure they exist before the first write
+        ensure = getattr(self.cached.inner, "_ensure_schema_once", None)
+        if ensure is not None:
+            await asyncio.to_thread(ensure)
+        try:
+            await self.native.ingest_triples_with_attributes(project_id, triples)
+        finally:
+            self.cached.invalidate(project_id)
+
+    async def get_alias_table(self, project_id: int) -> Dict[str, str]:
+        """Alias -> canonical name for a project."""
+        if self.native is None:
+            return await asyncio.to_thread(self.cached.get_alias_table, project_id)
+        return await self.native.get_alias_table(project_id)
+
+    async def ingest_aliases(self, project_id: int, mapping: Dict[str, List[str]]) -> None:
+        """Record aliases (rare, multi-statement rewiring: runs the sync provider in a thread)."""
+        await asyncio.to_thread(self.cached.ingest_aliases, project_id, mapping)
+
+
+_NATIVE_ASYNC_CLASSES = {
+    "neo4j": AsyncNeo4jKGProvider,
+}
+_async_providers: Dict[str, AsyncKGProvider] = {}
+_async_lock = threading.Lock()
+
+
+def get_async_provider() -> AsyncKGProvider:
+    """
+    Get the async facade of the active Knowledge Graph Provider (see get_provider).
+
+    Shares the sync provider's cache; a native async driver is used when the backend has
+    one and it can be created, otherwise calls run in a worker thread.
+    """
+    cached = get_provider()
+    name = (os.getenv("KNOWLEDGE_GRAPH_PROVIDER") or "neo4j").strip().lower()
+    provider = _async_providers.get(name)
+    if provider is None:
+        with _async_lock:
+            provider = _async_providers.get(name)
+            if provider is None:
+                native = None
+                cls = _NATIVE_ASYNC_CLASSES.get(name)
+                if cls is not None:
+                    try:
+                        native = cls()
+                    except Exception as e:
+                        logger.warning(f"Async {name} driver unavailable, using worker threads: {e}")
+                provider = AsyncKGProvider(cached, native)
+                _async_providers[name] = provider
+    return provider
+
+
+async def close_async_providers() -> None:
+    """Close native async drivers (application shutdown)."""
+    with _async_lock:
+        providers = list(_async_providers.values())
+        _async_providers.clear()
+    for provider in providers:
+        if provider.native is not None:
+            await provider.native.close()
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from app.services.kg_provider import KnowledgeGraphProvider, ORDER_BY_RECENCY
+
+
+def _default_cache_size() -> int:
+    try:
+        return max(0, int(os.getenv("KG_QUERY_CACHE_SIZE", "256")))
+    except ValueError:
+        return 256
+
+
+class CachedKGProvider:
+    """
+    LRU cache in front of a KnowledgeGraphProvider's query_subgraph.
+
+    Entries are keyed by (project, sorted participants, top_k, filters, ordering) and tagged with the
+    project's graph generation. Every write (ingest_triples_with_attributes, ingest_aliases,
+    delete_project_graph) bumps the generation and drops the project's entries, so a cached
+    result never outlives the graph state it was read from.
+    """
+    def __init__(self, inner: KnowledgeGraphProvider, max_size: Optional[int] = None) -> None:
+        self.inner = inner
+        self.max_size = _default_cache_size() if max_size is None else max(0, int(max_size))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[Hashable, ...], Dict[str, Any]]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def __getattr__(self, name: str) -> Any:
+        # Provider specific helpers (close, ...) pass straight through
+        return getattr(self.inner, name)
+
+    # ---- generation ----
+    def generation(self, project_id: int) -> int:
+        """Current graph generation of a project (bumped on every write)."""
+        with self._lock:
+            return self._generations.get(project_id, 0)
+
+    def invalidate(self, project_id: int) -> None:
+        """Bump the project's generation and drop its cached entries."""
+        with self._lock:
+            self._generations[project_id] = self._generations.get(project_id, 0) + 1
+            stale = [k for k in self._entries if k[0] == project_id]
+            for k in stale:
+                del self._entries[k]
+            self._invalidations += 1
+
+    # ---- reads ----
+    @staticmethod
+    def cache_key(
+        project_id: int,
+        participants: Optional[List[str]],
+        radius: int,
+        edge_type_whitelist: Optional[List[str]],
+        top_k: int,
+        max_chapter_id: Optional[int],
+        order_by: str,
+    ) -> Tuple[Hashable, ...]:
+        parts = tuple(sorted({p for p in (participants or []) if isinstance(p, str) and p.strip()}))
+        kinds = tuple(sorted(set(edge_type_whitelist))) if edge_type_whitelist else None
+        return (project_id, parts, int(radius), kinds, int(top_k), max_chapter_id, order_by)
+
+    def query_subgraph(
+        self,
+        project_id: int,
+        participants: Optional[List[str]] = None,
+        radius: int = 2,
+        edge_type_whitelist: Optional[List[str]] = None,
+        top_k: int = 50,
+        max_chapter_id: Optional[int] = None,
+        order_by: str = ORDER_BY_RECENCY,
+    ) -> Dict[str, Any]:
+        """Cached query_subgraph; returns a private copy the caller may mutate."""
+        if self.max_size <= 0:
+            return self.inner.query_subgraph(project_id, participants, radius, edge_type_whitelist, top_k, max_chapter_id, order_by)
+
+        key = self.cache_key(project_id, participants, radius, edge_type_whitelist, top_k, max_chapter_id, order_by)
+        gen, cached = self.lookup(key)
+        if cached is not None:
+            return cached
+        data = self.inner.query_subgraph(project_id, participants, radius, edge_type_whitelist, top_k, max_chapter_id, order_by)
+        self.store(key, gen, data)
+        return data
+
+    def lookup(self, key: Tuple[Hashable, ...]) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """
+        Look up a cache key (see cache_key).
+
+        Returns:
+            (project generation at lookup time, private copy of the entry or None on a miss).
+        """
+        with self._lock:
+            gen = self._generations.get(key[0], 0)
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return gen, copy.deepcopy(cached)
+            self._misses += 1
+            return gen, None
+
+    def store(self, key: Tuple[Hashable, ...], gen: int, data: Dict[str, Any]) -> None:
+        """Keep a query result read at generation gen (dropped if a write landed meanwhile)."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            # A write landed while querying: the result may already be stale, do not keep it
+            if self._generations.get(key[0], 0) == gen:
+                self._entries[key] = copy.deepcopy(data)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+
+    # ---- writes ----
+    def ingest_triples_with_attributes(self, project_id: int, triples: List[Tuple[str, str, str, Dict[str, Any]]]) -> None:
+        """Ingest triples, then invalidate the project's cached subgraphs."""
+        try:
+            self.inner.ingest_triples_with_attributes(project_id, triples)
+        finally:
+            self.invalidate(project_id)
+
+    def ingest_aliases(self, project_id: int, mapping: Dict[str, List[str]]) -> None:
+        """Ingest aliases, then invalidate the project's cached subgraphs."""
+        try:
+            self.inner.ingest_aliases(project_id, mapping)
+        finally:
+            self.invalidate(project_id)
+
+    def delete_project_graph(self, project_id: int, **kwargs: Any) -> None:
+        """Delete the project's graph, then invalidate its cached subgraphs."""
+        try:
+            self.inner.delete_project_graph(project_id, **kwargs)
+        finally:
+            self.invalidate(project_id)
+
+    # ---- stats ----
+    def stats(self) -> Dict[str, Any]:
+        """
+        Cache statistics.
+
+        Returns:
+            Dictionary with size, max_size, hits, misses, hit_rate, evictions, invalidations.
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / total) if total else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+    def clear(self) -> None:
+        """Drop all entries and reset counters (generations are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = self._invalidations = 0
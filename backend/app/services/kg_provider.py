@@ -2,10 +2,16 @@ from __future__ import annotations
 
 import os
 import json
-from typing import Any, Dict, List, Optional, Tuple, Protocol
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Protocol
 
+from loguru import logger
 
 from app.schemas.relation_extract import EN_TO_CN_KIND
+from app.services.kg_schema import OPEN_CHAPTER_KEY
 
 
 class KnowledgeGraphUnavailableError(RuntimeError):
@@ -15,6 +21,7 @@ class KnowledgeGraphUnavailableError(RuntimeError):
 class KnowledgeGraphProvider(Protocol):
     """Protocol for Knowledge Graph Providers."""
     def ingest_aliases(self, project_id: int, mapping: Dict[str, List[str]]) -> None: ...
+    def get_alias_table(self, project_id: int) -> Dict[str, str]: ...
     def ingest_triples_with_attributes(self, project_id: int, triples: List[Tuple[str, str, str, Dict[str, Any]]]) -> None: ...
     def query_subgraph(
         self,
@@ -24,8 +31,490 @@ class KnowledgeGraphProvider(Protocol):
         edge_type_whitelist: Optional[List[str]] = None,
         top_k: int = 50,
         max_chapter_id: Optional[int] = None,
+        order_by: str = "recency",
     ) -> Dict[str, Any]: ...
-    def delete_project_graph(self, project_id: int) -> None: ...
+    def delete_project_graph(self, project_id: int, batch_size: int = 10_000, progress: Optional[Callable[[int, int], None]] = None) -> None: ...
+    def ensure_schema(self) -> int: ...
+
+
+def chapter_key(volume_number: Optional[int], chapter_number: Optional[int]) -> Optional[int]:
+    """
+    Ordinal of a chapter across volumes, used to time-stamp graph edges.
+
+    Args:
+        volume_number: Volume number (treated as 0 if missing).
+        chapter_number: Chapter number.
+
+    Returns:
+        volume * 10000 + chapter, or None if the chapter number is unknown.
+    """
+    if chapter_number is None:
+        return None
+    return int(volume_number or 0) * 10000 + int(chapter_number)
+
+
+# Rows removed per delete transaction (bounds transaction state on large projects)
+DELETE_BATCH_SIZE = 10_000
+# Callback receiving cumulative (relationships, nodes) deleted
+DeleteProgress = Callable[[int, int], None]
+
+ORDER_BY_RECENCY = "recency"
+ORDER_BY_EVIDENCE = "evidence"
+
+# Seconds before a failed lazy schema bootstrap (Neo4j) is attempted again
+KG_SCHEMA_RETRY_SECONDS = int(os.getenv("KG_SCHEMA_RETRY_SECONDS", "300") or 300)
+
+
+def _edge_rank(props: Dict[str, Any], order_by: str) -> Tuple[int, int]:
+    """Sort key (descending) of an edge for relevance ordering."""
+    recency = props.get("last_chapter_key")
+    recency = int(recency) if recency is not None else -1
+    evidence = int(props.get("evidence_count") or 0)
+    if order_by == ORDER_BY_EVIDENCE:
+        return (evidence, recency)
+    return (recency, evidence)
+
+
+def _edge_allowed(props: Dict[str, Any], kinds: Optional[set]) -> bool:
+    """Whether an edge passes the edge-type whitelist."""
+    if kinds is None:
+        return True
+    return props.get("kind_en") in kinds or props.get("kind") in kinds
+
+
+def _version_at(versions: List[Dict[str, Any]], at_chapter_key: Optional[int]) -> Optional[Dict[str, Any]]:
+    """
+    Version of an edge valid at a chapter (binary search over the pair's versions).
+
+    Args:
+        versions: Versions of one (a, b) pair sorted by valid_from; they tile
+            [first valid_from, OPEN_CHAPTER_KEY) without gaps.
+        at_chapter_key: Chapter ordinal (see chapter_key); None selects the current version.
+
+    Returns:
+        The version dict, or None if the edge did not exist yet at that chapter.
+    """
+    if not versions:
+        return None
+    if at_chapter_key is None:
+        return versions[-1]
+    i = bisect_right(versions, at_chapter_key, key=lambda v: v["valid_from"]) - 1
+    if i < 0 or versions[i]["valid_to"] <= at_chapter_key:
+        return None
+    return versions[i]
+
+
+def _apply_version(versions: List[Dict[str, Any]], props: Dict[str, Any]) -> None:
+    """
+    Fold one ingested edge into the chapter-ordered versions of its (a, b) pair, in place.
+
+    The edge opens a version at its chapter_key: an existing version starting there is
+    updated, a version spanning it is split at that chapter, and an edge older than every
+    version gets its own version ending where the history used to start. Later versions
+    keep their attributes but count the new evidence. Edges without a chapter update the
+    current version. Touched versions are flagged with "dirty" for the caller to persist.
+
+    Args:
+        versions: Versions ({"valid_from", "valid_to", "props"}) sorted by valid_from.
+        props: Edge properties built by _edge_props (consumed).
+    """
+    ck = props.get("chapter_key")
+    first_ck = props.get("first_chapter_key")
+    evidence = int(props.get("evidence") or 1)
+    if not versions:
+        start = ck if ck is not None else 0
+        versions.append({"valid_from": start, "valid_to": OPEN_CHAPTER_KEY, "props": _stamp_edge(None, props), "dirty": True})
+        return
+    if ck is None:
+        cur = versions[-1]
+        cur["props"] = _stamp_edge(cur["props"], props)
+        cur["dirty"] = True
+        return
+    i = bisect_right(versions, ck, key=lambda v: v["valid_from"]) - 1
+    if i < 0:
+        versions.insert(0, {"valid_from": ck, "valid_to": versions[0]["valid_from"], "props": _stamp_edge(None, props), "dirty": True})
+        later = 1
+    elif versions[i]["valid_from"] == ck:
+        versions[i]["props"] = _stamp_edge(versions[i]["props"], props)
+        versions[i]["dirty"] = True
+        later = i + 1
+    else:
+        cur = versions[i]
+        versions.insert(i + 1, {"valid_from": ck, "valid_to": cur["valid_to"], "props": _stamp_edge(cur["props"], props), "dirty": True})
+        cur["valid_to"] = ck
+        cur["dirty"] = True
+        later = i + 2
+    for v in versions[later:]:
+        vp = v["props"]
+        vp["evidence_count"] = int(vp.get("evidence_count") or 0) + evidence
+        if first_ck is not None and (vp.get("first_chapter_key") is None or first_ck < vp["first_chapter_key"]):
+            vp["first_chapter_key"] = first_ck
+        v["dirty"] = True
+
+
+def _merge_versions(target: List[Dict[str, Any]], incoming: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge the versions of a folded alias edge into the canonical edge's versions.
+
+    Versions starting at the same chapter keep the canonical attributes and merge the
+    evidence (evidence count, recent dialogues, first/last chapter stamps); the result is
+    re-tiled so each version ends where the next one starts, leaving one open version.
+    Merged versions are flagged "dirty".
+    """
+    by_start = {v["valid_from"]: v for v in target}
+    for v in incoming:
+        cur = by_start.get(v["valid_from"])
+        if cur is None:
+            by_start[v["valid_from"]] = v
+            continue
+        cp, vp = cur["props"], v["props"]
+        cp["evidence_count"] = int(cp.get("evidence_count") or 0) + int(vp.get("evidence_count") or 0)
+        cp["recent_dialogues"] = list(dict.fromkeys(list(cp.get("recent_dialogues") or []) + list(vp.get("recent_dialogues") or [])))
+        firsts = [k for k in (cp.get("first_chapter_key"), vp.get("first_chapter_key")) if k is not None]
+        lasts = [k for k in (cp.get("last_chapter_key"), vp.get("last_chapter_key")) if k is not None]
+        cp["first_chapter_key"] = min(firsts) if firsts else None
+        cp["last_chapter_key"] = max(lasts) if lasts else None
+        cur["dirty"] = True
+    merged = [by_start[k] for k in sorted(by_start)]
+    for v, nxt in zip(merged, merged[1:] + [None]):
+        valid_to = nxt["valid_from"] if nxt is not None else OPEN_CHAPTER_KEY
+        if v["valid_to"] != valid_to:
+            v["valid_to"] = valid_to
+            v["dirty"] = True
+    return merged
+
+
+def _stamp_edge(prev: Optional[Dict[str, Any]], props: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merge a freshly built edge with its stored version (chapter stamps and evidence count).
+
+    Mirrors the Neo4j ingest SET clause: attributes are replaced, first/last chapter keys
+    widen to include the new chapters, and evidence_count grows by the row's evidence.
+    """
+    ck = props.pop("chapter_key", None)
+    first_ck = props.pop("first_chapter_key", None)
+    evidence = props.pop("evidence", 1)
+    prev = prev or {}
+    first = prev.get("first_chapter_key")
+    last = prev.get("last_chapter_key")
+    if first_ck is not None:
+        first = first_ck if first is None or first_ck < first else first
+    if ck is not None:
+        last = ck if last is None or ck > last else last
+    props["first_chapter_key"] = first
+    props["last_chapter_key"] = last
+    props["evidence_count"] = int(prev.get("evidence_count") or 0) + int(evidence)
+    return props
+
+
+def _alias_rows(mapping: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    """Normalize a canonical -> aliases mapping (strip, dedupe, drop self-aliases)."""
+    rows: List[Dict[str, Any]] = []
+    for canonical, aliases in (mapping or {}).items():
+        canonical = (canonical or "").strip()
+        if not canonical:
+            continue
+        seen: List[str] = []
+        for al in aliases or []:
+            al = (al or "").strip() if isinstance(al, str) else ""
+            if al and al != canonical and al not in seen:
+                seen.append(al)
+        if seen:
+            rows.append({"canonical": canonical, "aliases": seen})
+    return rows
+
+
+def _empty_subgraph() -> Dict[str, Any]:
+    """Empty query_subgraph result."""
+    return {"nodes": [], "edges": [], "alias_table": {}, "fact_summaries": [], "relation_summaries": []}
+
+
+def _edge_props(s: str, p: str, o: str, attrs: Dict[str, Any]) -> Dict[str, Any]:
+    """Build stored RELATES_TO properties for one triple (shared by all providers)."""
+    # Write RELATES_TO only, specific type written to kind(kind_cn/kind_en)
+    stance = attrs.get("stance")
+    return {
+        "kind": EN_TO_CN_KIND.get(p, p),
+        "kind_en": p,
+        "fact": f"{s} {p} {o}",
+        "a_to_b_addressing": attrs.get("a_to_b_addressing"),
+        "b_to_a_addressing": attrs.get("b_to_a_addressing"),
+        "recent_dialogues": attrs.get("recent_dialogues") or [],
+        "recent_event_summaries_json": json.dumps(attrs.get("recent_event_summaries") or [], ensure_ascii=False),
+        "stance_json": json.dumps(getattr(stance, "model_dump", lambda: stance)(), ensure_ascii=False) if stance is not None else None,
+        "chapter_key": attrs.get("chapter_key"),
+        # Coalesced rows (see memory_service.coalesce_relation_rows) span several chapters / extractions
+        "first_chapter_key": attrs.get("first_chapter_key", attrs.get("chapter_key")),
+        "evidence": int(attrs.get("evidence") or 1),
+    }
+
+
+def _collect_subgraph(rows: Iterable[Tuple[str, str, Dict[str, Any]]], top_k: int, aliases: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+    """
+    Convert (a, b, props) edge rows into the query_subgraph output shape.
+
+    Args:
+        rows: Iterable of (source name, target name, RELATES_TO properties).
+        top_k: Max number of fact summaries / edges echoed.
+        aliases: Canonical name -> aliases of the entities in rows (becomes alias_table).
+
+    Returns:
+        Dictionary containing nodes, edges, alias_table, fact_summaries, relation_summaries.
+    """
+    fact_summaries: List[str] = []
+    rel_items: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    edges: List[Dict[str, Any]] = []
+    for a, b, props in rows:
+        props = props or {}
+        # Chinese relation type prioritized from properties
+        kind_cn = props.get("kind") or props.get("kind_cn") or None
+        if not kind_cn and props.get("kind_en"):
+            kind_cn = EN_TO_CN_KIND.get(props.get("kind_en"), props.get("kind_en"))
+        if not kind_cn:
+            kind_cn = "其他"
+        fact = props.get("fact") or f"{a} relates_to {b}"
+        key = (a, b, str(kind_cn))
+        if key not in rel_items:
+            rel_items[key] = { "a": a, "b": b, "kind": kind_cn }
+        # Attached attributes
+        try:
+            ev = json.loads(props.get("recent_event_summaries_json") or "[]")
+        except Exception: ev = []
+        try:
+            s = json.loads(props.get("stance_json") or "null")
+        except Exception: s = None
+        if props.get("a_to_b_addressing"): rel_items[key]["a_to_b_addressing"] = props.get("a_to_b_addressing")
+        if props.get("b_to_a_addressing"): rel_items[key]["b_to_a_addressing"] = props.get("b_to_a_addressing")
+        if props.get("recent_dialogues"): rel_items[key]["recent_dialogues"] = props.get("recent_dialogues")
+        if ev: rel_items[key]["recent_event_summaries"] = ev
+        if s is not None: rel_items[key]["stance"] = s
+        # Echo
+        if len(fact_summaries) < top_k:
+            fact_summaries.append(fact)
+        if len(edges) < top_k:
+            edges.append({"source": a, "target": b, "type": "relates_to", "fact": fact, "kind": kind_cn})
+
+    return {
+        "nodes": [],
+        "edges": edges,
+        "alias_table": {k: list(v) for k, v in (aliases or {}).items() if v},
+        "fact_summaries": fact_summaries,
+        "relation_summaries": list(rel_items.values()),
+    }
+
+
+# ---- Neo4j statements shared by the sync and async providers ----
+_NEO4J_FETCH_VERSIONS = (
+    "UNWIND $pairs AS p "
+    "MATCH (a:Entity {name: p[0], group_id: $group})-[r:RELATES_TO]->(b:Entity {name: p[1], group_id: $group}) "
+    "RETURN p[0] AS s, p[1] AS o, elementId(r) AS id, r {.*} AS props"
+)
+_NEO4J_UPDATE_VERSIONS = (
+    "UNWIND $rows AS row "
+    "MATCH ()-[r:RELATES_TO]->() WHERE elementId(r) = row.id "
+    "SET r = row.props"
+)
+# Write RELATES_TO only, one relationship per version of the pair
+_NEO4J_CREATE_VERSIONS = (
+    "UNWIND $rows AS row "
+    "MERGE (a:Entity {name: row.s, group_id: $group}) "
+    "MERGE (b:Entity {name: row.o, group_id: $group}) "
+    "CREATE (a)-[r:RELATES_TO]->(b) "
+    "SET r = row.props"
+)
+# Every RELATES_TO edge touching one of the alias nodes (self-loops once)
+_NEO4J_FETCH_ALIAS_EDGES = (
+    "MATCH (al:Entity {group_id: $group})-[r:RELATES_TO]-() WHERE al.name IN $aliases "
+    "WITH DISTINCT r "
+    "RETURN startNode(r).name AS s, endNode(r).name AS o, elementId(r) AS id, r {.*} AS props"
+)
+_NEO4J_DELETE_EDGES = "UNWIND $ids AS id MATCH ()-[r:RELATES_TO]->() WHERE elementId(r) = id DELETE r"
+_NEO4J_ALIAS_TABLE = "MATCH (e:Entity {group_id:$group}) WHERE e.aliases IS NOT NULL RETURN e.name AS name, e.aliases AS aliases"
+
+
+def _neo4j_plan_writes(
+    pairs: List[Tuple[str, str]],
+    records: Iterable[Any],
+    triples: List[Tuple[str, str, str, Dict[str, Any]]],
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Plan version updates/creations for a batch from the pairs' stored RELATES_TO versions.
+
+    Args:
+        pairs: Distinct (source, target) pairs of the batch.
+        records: Rows of _NEO4J_FETCH_VERSIONS (s, o, id, props).
+        triples: Batch of (source, predicate, object, attributes).
+
+    Returns:
+        (updates, creates): parameters for _NEO4J_UPDATE_VERSIONS and _NEO4J_CREATE_VERSIONS.
+    """
+    versions = _neo4j_versions(pairs, records)
+    for s, p, o, attrs in triples:
+        _apply_version(versions[(s, o)], _edge_props(s, p, o, attrs))
+    return _neo4j_version_writes(versions)
+
+
+def _neo4j_versions(pairs: Iterable[Tuple[str, str]], records: Iterable[Any]) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+    """Versions of each pair (sorted by valid_from) from RELATES_TO records (s, o, id, props)."""
+    versions: Dict[Tuple[str, str], List[Dict[str, Any]]] = {pair: [] for pair in pairs}
+    for rec in records:
+        props = dict(rec["props"] or {})
+        valid_from = props.pop("valid_from", None)
+        valid_to = props.pop("valid_to", None)
+        versions.setdefault((rec["s"], rec["o"]), []).append({
+            "id": rec["id"],
+            "valid_from": valid_from if valid_from is not None else int(props.get("first_chapter_key") or 0),
+            "valid_to": valid_to if valid_to is not None else OPEN_CHAPTER_KEY,
+            "props": props,
+            # Edges written before schema v2 get their interval on this write
+            "dirty": valid_from is None or valid_to is None,
+        })
+    for vs in versions.values():
+        vs.sort(key=lambda v: v["valid_from"])
+    return versions
+
+
+def _neo4j_version_writes(versions: Dict[Tuple[str, str], List[Dict[str, Any]]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(updates, creates) for _NEO4J_UPDATE_VERSIONS / _NEO4J_CREATE_VERSIONS of the dirty versions."""
+    updates: List[Dict[str, Any]] = []
+    creates: List[Dict[str, Any]] = []
+    for (s, o), vs in versions.items():
+        for v in vs:
+            if not v.get("dirty"):
+                continue
+            props = {**v["props"], "valid_from": v["valid_from"], "valid_to": v["valid_to"]}
+            if v.get("id"):
+                updates.append({"id": v["id"], "props": props})
+            else:
+                creates.append({"s": s, "o": o, "props": props})
+    return updates, creates
+
+
+def _neo4j_plan_fold(
+    canonical_of: Dict[str, str],
+    alias_records: Iterable[Any],
+    fetch_targets: Callable[[List[Tuple[str, str]]], Iterable[Any]],
+) -> Tuple[List[str], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Plan folding the RELATES_TO versions of alias nodes into their canonical entities.
+
+    Each alias edge is renamed onto the canonical node(s) and merged into the versions
+    stored for the renamed pair with _merge_versions (same result as the SQLite provider);
+    edges that would become self-loops are dropped.
+
+    Args:
+        canonical_of: Alias name -> canonical name.
+        alias_records: Rows of _NEO4J_FETCH_ALIAS_EDGES (s, o, id, props).
+        fetch_targets: Returns _NEO4J_FETCH_VERSIONS rows for the renamed pairs.
+
+    Returns:
+        (ids of the alias edges to delete, updates, creates).
+    """
+    alias_records = list(alias_records)
+    deletes = [rec["id"] for rec in alias_records]
+    incoming: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for (s, o), vs in _neo4j_versions((), alias_records).items():
+        na, nb = canonical_of.get(s, s), canonical_of.get(o, o)
+        if na == nb:
+            continue
+        for v in vs:
+            v.pop("id", None)
+            v["dirty"] = True
+            v["props"]["fact"] = f"{na} {v['props'].get('kind_en') or 'relates_to'} {nb}"
+            incoming.setdefault((na, nb), []).append(v)
+    if not incoming:
+        return deletes, [], []
+    pairs = list(incoming)
+    versions = _neo4j_versions(pairs, fetch_targets(pairs))
+    for pair, vs in incoming.items():
+        vs.sort(key=lambda v: v["valid_from"])
+        versions[pair] = _merge_versions(versions[pair], vs)
+    updates, creates = _neo4j_version_writes(versions)
+    return deletes, updates, creates
+
+
+def _neo4j_subgraph_cypher(radius: int, order_by: str) -> str:
+    """Cypher of query_subgraph for a radius and ordering (parameters: see _neo4j_subgraph_params)."""
+    radius = max(0, int(radius))
+    # One version per pair: the one valid at max_chapter_id, or the open one
+    edge_filter = (
+        "($kinds IS NULL OR {r}.kind_en IN $kinds OR {r}.kind IN $kinds) AND "
+        # Edges not yet stamped by schema migration v2 count as open since their first chapter
+        "CASE WHEN $max_ck IS NULL THEN coalesce({r}.valid_to, $open) = $open "
+        "ELSE coalesce({r}.valid_from, {r}.first_chapter_key, 0) <= $max_ck "
+        "AND coalesce({r}.valid_to, $open) > $max_ck END"
+    )
+    if radius == 0:
+        # Edges among participants only
+        match = (
+            "MATCH (a:Entity {group_id:$group})-[r:RELATES_TO]->(b:Entity {group_id:$group}) "
+            "WHERE a.name IN $parts AND b.name IN $parts AND " + edge_filter.format(r="r") + " "
+        )
+    else:
+        # Core = nodes within radius-1 hops; every allowed edge touching the core is within radius hops
+        if radius == 1:
+            core = (
+                "MATCH (c:Entity {group_id:$group}) WHERE c.name IN $parts "
+            )
+        else:
+            core = (
+                "MATCH (p:Entity {group_id:$group}) WHERE p.name IN $parts "
+                f"OPTIONAL MATCH (p)-[rels:RELATES_TO*1..{radius - 1}]-(n:Entity {{group_id:$group}}) "
+                "WHERE all(x IN rels WHERE " + edge_filter.format(r="x") + ") "
+                "WITH collect(DISTINCT p) + collect(DISTINCT n) AS core "
+                "UNWIND core AS c "
+                "WITH DISTINCT c "
+            )
+        match = (
+            core
+            + "MATCH (c)-[r:RELATES_TO]-(:Entity {group_id:$group}) "
+            "WHERE " + edge_filter.format(r="r") + " "
+            "WITH DISTINCT r "
+            "MATCH (a)-[r]->(b) "
+        )
+    if order_by == ORDER_BY_EVIDENCE:
+        order = "ORDER BY evidence DESC, recency DESC "
+    else:
+        order = "ORDER BY recency DESC, evidence DESC "
+    # Query only RELATES_TO
+    rel_cypher = (
+        match
+        + "RETURN a.name AS a, 'RELATES_TO' AS t, b.name AS b, r {.*} as props, "
+        "a.aliases AS a_aliases, b.aliases AS b_aliases, "
+        "coalesce(r.last_chapter_key, -1) AS recency, coalesce(r.evidence_count, 0) AS evidence "
+        + order
+        + "LIMIT $limit"
+    )
+    return rel_cypher
+
+
+def _neo4j_subgraph_params(
+    group: str,
+    parts: List[str],
+    edge_type_whitelist: Optional[List[str]],
+    top_k: int,
+    max_chapter_id: Optional[int],
+) -> Dict[str, Any]:
+    """Parameters of the _neo4j_subgraph_cypher statement."""
+    return {
+        "group": group,
+        "parts": parts,
+        "kinds": list(edge_type_whitelist) if edge_type_whitelist else None,
+        "max_ck": max_chapter_id,
+        "open": OPEN_CHAPTER_KEY,
+        "limit": max(1, int(top_k)),
+    }
+
+
+def _neo4j_collect(records: Iterable[Any], top_k: int) -> Dict[str, Any]:
+    """Convert query_subgraph records into the output shape."""
+    rows = []
+    aliases: Dict[str, List[str]] = {}
+    for rec in records:
+        rows.append((rec["a"], rec["b"], rec["props"] or {}))
+        aliases[rec["a"]] = rec["a_aliases"] or []
+        aliases[rec["b"]] = rec["b_aliases"] or []
+    return _collect_subgraph(rows, top_k, aliases)
 
 
 class Neo4jKGProvider:
@@ -38,6 +527,9 @@ class Neo4jKGProvider:
         user = os.getenv("NEO4J_USER") or os.getenv("GRAPH_DB_USER") or "neo4j"
         password = os.getenv("NEO4J_PASSWORD") or os.getenv("GRAPH_DB_PASSWORD") or "neo4j"
         self._driver = GraphDatabase.driver(uri, auth=(user, password))
+        self._schema_version: Optional[int] = None
+        self._schema_failed_at: Optional[float] = None
+        self._schema_lock = threading.Lock()
 
     def close(self) -> None:
         """Close the driver."""
@@ -51,6 +543,33 @@ class Neo4jKGProvider:
         """Helper to generate group ID string."""
         return f"proj:{project_id}"
 
+    def ensure_schema(self) -> int:
+        """Create/verify graph constraints and indexes (see kg_schema); returns the schema version."""
+        from app.services.kg_schema import ensure_neo4j_schema
+        self._schema_version = ensure_neo4j_schema(self._driver)
+        return self._schema_version
+
+    def _ensure_schema_once(self) -> None:
+        """
+        Apply the schema before the first read/write if startup could not reach the database.
+
+        A failed attempt is retried only after KG_SCHEMA_RETRY_SECONDS, so an unreachable or
+        failing database does not rerun the migrations (and their index wait) on every call.
+        """
+        if self._schema_version is not None:
+            return
+        with self._schema_lock:
+            if self._schema_version is not None:
+                return
+            if self._schema_failed_at is not None and time.monotonic() - self._schema_failed_at < KG_SCHEMA_RETRY_SECONDS:
+                return
+            try:
+                self.ensure_schema()
+                self._schema_failed_at = None
+            except Exception as e:
+                self._schema_failed_at = time.monotonic()
+                logger.warning(f"[GraphSchema] neo4j schema bootstrap failed (retry in {KG_SCHEMA_RETRY_SECONDS}s): {e}")
+
     def ingest_triples_with_attributes(self, project_id: int, triples: List[Tuple[str, str, str, Dict[str, Any]]]) -> None:
         """
         Ingest triples with attributes into the graph.
@@ -62,42 +581,18 @@ class Neo4jKGProvider:
         group = self._group(project_id)
         if not triples:
             return
-        rows: List[Dict[str, Any]] = []
-        for s, p, o, attrs in triples:
-            # Write RELATES_TO only, specific type written to kind(kind_cn/kind_en)
-            kind_cn = EN_TO_CN_KIND.get(p, p)
-            payload: Dict[str, Any] = {
-                "s": s,
-                "o": o,
-                "kind_cn": kind_cn,
-                "kind_en": p,
-                "fact": f"{s} {p} {o}",
-                "a_to_b": attrs.get("a_to_b_addressing"),
-                "b_to_a": attrs.get("b_to_a_addressing"),
-                "recent_dialogues": attrs.get("recent_dialogues") or [],
-                "recent_event_summaries_json": json.dumps(attrs.get("recent_event_summaries") or [], ensure_ascii=False),
-                "stance_json": json.dumps(getattr(attrs.get("stance"), "model_dump", lambda: attrs.get("stance"))(), ensure_ascii=False) if attrs.get("stance") is not None else None,
-            }
-            rows.append(payload)
-
-        if not rows:
-            return
-        cypher = (
-            "UNWIND $rows AS row "
-            "MERGE (a:Entity {name: row.s, group_id: $group}) "
-            "MERGE (b:Entity {name: row.o, group_id: $group}) "
-            "MERGE (a)-[r:RELATES_TO]->(b) "
-            "SET r.kind = row.kind_cn, "
-            "r.kind_en = row.kind_en, "
-            "r.fact = row.fact, "
-            "r.a_to_b_addressing = row.a_to_b, "
-            "r.b_to_a_addressing = row.b_to_a, "
-            "r.recent_dialogues = row.recent_dialogues, "
-            "r.recent_event_summaries_json = row.recent_event_summaries_json, "
-            "r.stance_json = row.stance_json"
-        )
+        self._ensure_schema_once()
+        pairs = list({(s, o): None for s, _, o, _ in triples})
         with self._driver.session() as sess:
-            sess.run(cypher, rows=rows, group=group)
+            with sess.begin_transaction() as tx:
+                # Stored versions of every pair in the batch, then plan splits/updates in memory
+                res = tx.run(_NEO4J_FETCH_VERSIONS, pairs=[list(pair) for pair in pairs], group=group)
+                updates, creates = _neo4j_plan_writes(pairs, list(res), triples)
+                if updates:
+                    tx.run(_NEO4J_UPDATE_VERSIONS, rows=updates).consume()
+                if creates:
+                    tx.run(_NEO4J_CREATE_VERSIONS, rows=creates, group=group).consume()
+                tx.commit()
 
     def query_subgraph(
         self,
@@ -107,6 +602,7 @@ class Neo4jKGProvider:
         edge_type_whitelist: Optional[List[str]] = None,
         top_k: int = 50,
         max_chapter_id: Optional[int] = None,
+        order_by: str = ORDER_BY_RECENCY,
     ) -> Dict[str, Any]:
         """
         Query subgraph for given participants.
@@ -114,10 +610,12 @@ class Neo4jKGProvider:
         Args:
             project_id: Project ID.
             participants: List of participant names.
-            radius: Graph traversal radius (unused in current query logic but kept for interface).
-            edge_type_whitelist: List of allowed edge types (unused).
+            radius: Hops to expand from participants; 0 keeps only edges among participants.
+            edge_type_whitelist: Allowed relation kinds (English or Chinese); also limits traversal.
             top_k: Max number of results.
-            max_chapter_id: Max chapter ID to consider (unused).
+            max_chapter_id: Chapter ordinal (see chapter_key); returns each edge as it stood at
+                that chapter (edges first seen later are excluded). None returns the current state.
+            order_by: "recency" (last chapter seen) or "evidence" (times ingested), applied before top_k.
 
         Returns:
             Dictionary containing nodes, edges, fact_summaries, relation_summaries.
@@ -125,73 +623,447 @@ class Neo4jKGProvider:
         group = self._group(project_id)
         parts = [p for p in (participants or []) if isinstance(p, str) and p.strip()]
         if not parts:
-            return {"nodes": [], "edges": [], "alias_table": {}, "fact_summaries": [], "relation_summaries": []}
+            return _empty_subgraph()
 
-        # Query only RELATES_TO
-        rel_cypher = (
-            "MATCH (a:Entity {group_id:$group})-[r:RELATES_TO]->(b:Entity {group_id:$group}) "
-            "WHERE a.name IN $parts AND b.name IN $parts "
-            "RETURN a.name AS a, 'RELATES_TO' AS t, b.name AS b, r {.*} as props "
-            "LIMIT $limit"
-        )
-
-        fact_summaries: List[str] = []
-        rel_items: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
-        edges: List[Dict[str, Any]] = []
+        self._ensure_schema_once()
+        rel_cypher = _neo4j_subgraph_cypher(radius, order_by)
         with self._driver.session() as sess:
-            results = sess.run(rel_cypher, group=group, parts=parts, limit=max(1, int(top_k)))
-            for rec in results:
-                a = rec["a"]; b = rec["b"]; t = rec["t"]; props = rec["props"] or {}
-                # Chinese relation type prioritized from properties
-                kind_cn = props.get("kind") or props.get("kind_cn") or None
-                if not kind_cn and props.get("kind_en"):
-                    kind_cn = EN_TO_CN_KIND.get(props.get("kind_en"), props.get("kind_en"))
-                if not kind_cn:
-                    kind_cn = "其他"
-                fact = props.get("fact") or f"{a} relates_to {b}"
-                key = (a, b, str(kind_cn))
-                if key not in rel_items:
-                    rel_items[key] = { "a": a, "b": b, "kind": kind_cn }
-                # Attached attributes
-                try:
-                    ev = json.loads(props.get("recent_event_summaries_json") or "[]")
-                except Exception: ev = []
-                try:
-                    s = json.loads(props.get("stance_json") or "null")
-                except Exception: s = None
-                if props.get("a_to_b_addressing"): rel_items[key]["a_to_b_addressing"] = props.get("a_to_b_addressing")
-                if props.get("b_to_a_addressing"): rel_items[key]["b_to_a_addressing"] = props.get("b_to_a_addressing")
-                if props.get("recent_dialogues"): rel_items[key]["recent_dialogues"] = props.get("recent_dialogues")
-                if ev: rel_items[key]["recent_event_summaries"] = ev
-                if s is not None: rel_items[key]["stance"] = s
-                # Echo
-                if len(fact_summaries) < top_k:
-                    fact_summaries.append(fact)
-                if len(edges) < top_k:
-                    edges.append({"source": a, "target": b, "type": "relates_to", "fact": fact, "kind": kind_cn})
-
-        relation_summaries = list(rel_items.values())
-        return {
-            "nodes": [],
-            "edges": edges,
-            "alias_table": {},
-            "fact_summaries": fact_summaries,
-            "relation_summaries": relation_summaries,
-        }
-
-    def delete_project_graph(self, project_id: int) -> None:
-        """Delete all nodes and relationships under a project (group_id)."""
+            records = list(sess.run(rel_cypher, **_neo4j_subgraph_params(group, parts, edge_type_whitelist, top_k, max_chapter_id)))
+        return _neo4j_collect(records, top_k)
+
+    def delete_project_graph(self, project_id: int, batch_size: int = DELETE_BATCH_SIZE, progress: Optional[DeleteProgress] = None) -> None:
+        """
+        Delete all nodes and relationships under a project (group_id).
+
+        Runs in transactions of at most batch_size rows so large projects never build up
+        one huge transaction.
+
+        Args:
+            project_id: Project ID.
+            batch_size: Relationships / nodes deleted per transaction.
+            progress: Called after each batch with cumulative (relationships, nodes) deleted.
+        """
         group = self._group(project_id)
+        batch = max(1, int(batch_size))
+        rels = nodes = 0
         with self._driver.session() as sess:
             # Delete relationships then nodes
-            sess.run("MATCH (n:Entity {group_id:$group})-[r]-() DELETE r", group=group)
-            sess.run("MATCH (n:Entity {group_id:$group}) DELETE n", group=group)
+            while True:
+                rec = sess.run(
+                    "MATCH (:Entity {group_id:$group})-[r]-() WITH DISTINCT r LIMIT $batch DELETE r RETURN count(r) AS n",
+                    group=group,
+                    batch=batch,
+                ).single()
+                n = int(rec["n"]) if rec else 0
+                if not n:
+                    break
+                rels += n
+                if progress:
+                    progress(rels, nodes)
+            while True:
+                rec = sess.run(
+                    "MATCH (n:Entity {group_id:$group}) WITH n LIMIT $batch DETACH DELETE n RETURN count(n) AS n",
+                    group=group,
+                    batch=batch,
+                ).single()
+                n = int(rec["n"]) if rec else 0
+                if not n:
+                    break
+                nodes += n
+                if progress:
+                    progress(rels, nodes)
+
+    def ingest_aliases(self, project_id: int, mapping: Dict[str, List[str]]) -> None:
+        """
+        Record aliases on canonical entities and fold existing alias nodes into them.
+
+        Args:
+            project_id: Project ID.
+            mapping: Canonical name -> list of aliases (nicknames, titles, ...).
+        """
+        rows = _alias_rows(mapping)
+        if not rows:
+            return
+        group = self._group(project_id)
+        self._ensure_schema_once()
+        with self._driver.session() as sess:
+            sess.run(
+                "UNWIND $rows AS row "
+                "MERGE (c:Entity {name: row.canonical, group_id: $group}) "
+                "SET c.aliases = [x IN coalesce(c.aliases, []) WHERE NOT x IN row.aliases] + row.aliases",
+                rows=rows,
+                group=group,
+            ).consume()
+            # Nodes created under an alias before it was known: move their edges to the canonical
+            # node, merging chapter versions like the SQLite provider (see _neo4j_plan_fold)
+            canonical_of = {al: row["canonical"] for row in rows for al in row["aliases"]}
+            with sess.begin_transaction() as tx:
+                alias_records = list(tx.run(_NEO4J_FETCH_ALIAS_EDGES, aliases=list(canonical_of), group=group))
+                deletes, updates, creates = _neo4j_plan_fold(
+                    canonical_of,
+                    alias_records,
+                    lambda pairs: list(tx.run(_NEO4J_FETCH_VERSIONS, pairs=[list(pair) for pair in pairs], group=group)),
+                )
+                if deletes:
+                    tx.run(_NEO4J_DELETE_EDGES, ids=deletes).consume()
+                if updates:
+                    tx.run(_NEO4J_UPDATE_VERSIONS, rows=updates).consume()
+                if creates:
+                    tx.run(_NEO4J_CREATE_VERSIONS, rows=creates, group=group).consume()
+                tx.run(
+                    "MATCH (al:Entity {group_id: $group}) WHERE al.name IN $aliases DETACH DELETE al",
+                    aliases=list(canonical_of),
+                    group=group,
+                ).consume()
+                tx.commit()
+
+    def get_alias_table(self, project_id: int) -> Dict[str, str]:
+        """Alias -> canonical name for a project."""
+        group = self._group(project_id)
+        table: Dict[str, str] = {}
+        with self._driver.session() as sess:
+            res = sess.run(_NEO4J_ALIAS_TABLE, group=group)
+            for rec in res:
+                for al in rec["aliases"] or []:
+                    table[al] = rec["name"]
+        return table
+
+class SqliteKGProvider:
+    """
+    Embedded SQLite implementation of KnowledgeGraphProvider.
+
+    Edges live in a version table keyed by (project_id, a, b, valid_from): every pair keeps
+    its chapter-ordered versions, mirroring the RELATES_TO versions of the Neo4j provider.
+    Each project's adjacency is loaded once into memory and kept in sync on write, so
+    repeated queries never touch the database and as-of lookups are a binary search.
+    """
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._path = path or os.getenv("KG_SQLITE_PATH") or self._default_path()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+        # project_id -> {"edges": {(a, b): [version]}, "out": {a: {b}}, "in": {b: {a}}, "aliases": {alias: canonical}}
+        # version = {"valid_from", "valid_to", "props"}, sorted by valid_from
+        self._adjacency: Dict[int, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _default_path() -> str:
+        """Store the graph next to the main application database."""
+        from app.db.session import DB_FILE
+        return DB_FILE.with_name("knowledge_graph.db").as_posix()
+
+    def _init_schema(self) -> None:
+        """Create adjacency tables and indexes (versioned migrations, see kg_schema)."""
+        from app.services.kg_schema import ensure_sqlite_schema
+        with self._lock:
+            self._schema_version = ensure_sqlite_schema(self._conn)
+
+    def ensure_schema(self) -> int:
+        """Apply pending graph schema migrations; returns the schema version."""
+        self._init_schema()
+        return self._schema_version
+
+    def close(self) -> None:
+        """Close the database connection."""
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+
+    def _load(self, project_id: int) -> Dict[str, Any]:
+        """Get (loading on first use) the in-memory adjacency of a project."""
+        adj = self._adjacency.get(project_id)
+        if adj is not None:
+            return adj
+        adj = {"edges": {}, "out": {}, "in": {}, "aliases": {}}
+        cur = self._conn.execute(
+            "SELECT a, b, valid_from, valid_to, props FROM kg_edge_version WHERE project_id = ? ORDER BY a, b, valid_from",
+            (project_id,),
+        )
+        for a, b, valid_from, valid_to, props in cur:
+            versions = adj["edges"].get((a, b))
+            if versions is None:
+                versions = []
+                self._cache_edge(adj, a, b, versions)
+            versions.append({"valid_from": valid_from, "valid_to": valid_to, "props": json.loads(props)})
+        for alias, canonical in self._conn.execute("SELECT alias, canonical FROM kg_alias WHERE project_id = ?", (project_id,)):
+            adj["aliases"][alias] = canonical
+        self._adjacency[project_id] = adj
+        return adj
+
+    @staticmethod
+    def _cache_edge(adj: Dict[str, Any], a: str, b: str, versions: List[Dict[str, Any]]) -> None:
+        """Insert or replace the versions of an edge in the in-memory adjacency."""
+        adj["edges"][(a, b)] = versions
+        adj["out"].setdefault(a, set()).add(b)
+        adj["in"].setdefault(b, set()).add(a)
+
+    def ingest_triples_with_attributes(self, project_id: int, triples: List[Tuple[str, str, str, Dict[str, Any]]]) -> None:
+        """
+        Ingest triples with attributes into the graph.
+
+        Args:
+            project_id: Project ID.
+            triples: List of tuples (source, predicate, object, attributes).
+        """
+        if not triples:
+            return
+        with self._lock:
+            adj = self._load(project_id)
+            touched: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+            for s, p, o, attrs in triples:
+                versions = touched.get((s, o))
+                if versions is None:
+                    # Plan on copies so a failed write leaves the cache untouched
+                    versions = [dict(v, props=dict(v["props"])) for v in adj["edges"].get((s, o), [])]
+                    touched[(s, o)] = versions
+                _apply_version(versions, _edge_props(s, p, o, attrs))
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO kg_entity (project_id, name) VALUES (?, ?)",
+                    [(project_id, n) for s, o in touched for n in (s, o)],
+                )
+                self._upsert_versions(project_id, touched)
+            for (s, o), versions in touched.items():
+                for v in versions:
+                    v.pop("dirty", None)
+                self._cache_edge(adj, s, o, versions)
+
+    def _upsert_versions(self, project_id: int, edges: Dict[Tuple[str, str], List[Dict[str, Any]]]) -> None:
+        """Persist the dirty versions of edges (inside the caller's transaction)."""
+        self._conn.executemany(
+            "INSERT INTO kg_edge_version (project_id, a, b, valid_from, valid_to, props) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (project_id, a, b, valid_from) DO UPDATE SET valid_to = excluded.valid_to, props = excluded.props",
+            [
+                (project_id, a, b, v["valid_from"], v["valid_to"], json.dumps(v["props"], ensure_ascii=False))
+                for (a, b), versions in edges.items()
+                for v in versions
+                if v.get("dirty")
+            ],
+        )
+
+    def query_subgraph(
+        self,
+        project_id: int,
+        participants: Optional[List[str]] = None,
+        radius: int = 2,
+        edge_type_whitelist: Optional[List[str]] = None,
+        top_k: int = 50,
+        max_chapter_id: Optional[int] = None,
+        order_by: str = ORDER_BY_RECENCY,
+    ) -> Dict[str, Any]:
+        """
+        Query subgraph for given participants (same semantics as Neo4jKGProvider).
+
+        Args:
+            project_id: Project ID.
+            participants: List of participant names.
+            radius: Hops to expand from participants; 0 keeps only edges among participants.
+            edge_type_whitelist: Allowed relation kinds (English or Chinese); also limits traversal.
+            top_k: Max number of results.
+            max_chapter_id: Chapter ordinal (see chapter_key); returns each edge as it stood at
+                that chapter (edges first seen later are excluded). None returns the current state.
+            order_by: "recency" (last chapter seen) or "evidence" (times ingested), applied before top_k.
+
+        Returns:
+            Dictionary containing nodes, edges, fact_summaries, relation_summaries.
+        """
+        parts = {p for p in (participants or []) if isinstance(p, str) and p.strip()}
+        if not parts:
+            return _empty_subgraph()
+        radius = max(0, int(radius))
+        kinds = set(edge_type_whitelist) if edge_type_whitelist else None
+        with self._lock:
+            adj = self._load(project_id)
+            edges = adj["edges"]
+            # Props of each pair as of max_chapter_id, resolved lazily (None: no version then)
+            as_of: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+
+            def props_at(a: str, b: str) -> Optional[Dict[str, Any]]:
+                key = (a, b)
+                if key not in as_of:
+                    v = _version_at(edges[key], max_chapter_id)
+                    as_of[key] = v["props"] if v is not None else None
+                return as_of[key]
+
+            def allowed(a: str, b: str) -> bool:
+                props = props_at(a, b)
+                return props is not None and _edge_allowed(props, kinds)
+
+            found: Dict[Tuple[str, str], Dict[str, Any]] = {}
+            if radius == 0:
+                for a in parts:
+                    for b in adj["out"].get(a, ()):
+                        if b in parts and allowed(a, b):
+                            found[(a, b)] = props_at(a, b)
+            else:
+                # BFS over allowed edges (undirected); the core is everything within radius-1 hops
+                core = set(p for p in parts if p in adj["out"] or p in adj["in"])
+                frontier = set(core)
+                for _ in range(radius - 1):
+                    nxt = set()
+                    for n in frontier:
+                        nxt.update(b for b in adj["out"].get(n, ()) if b not in core and allowed(n, b))
+                        nxt.update(a for a in adj["in"].get(n, ()) if a not in core and allowed(a, n))
+                    if not nxt:
+                        break
+                    core |= nxt
+                    frontier = nxt
+                for n in core:
+                    for b in adj["out"].get(n, ()):
+                        if allowed(n, b):
+                            found[(n, b)] = props_at(n, b)
+                    for a in adj["in"].get(n, ()):
+                        if allowed(a, n):
+                            found[(a, n)] = props_at(a, n)
+
+            ranked = sorted(found.items(), key=lambda kv: _edge_rank(kv[1], order_by), reverse=True)
+            rows = [(a, b, props) for (a, b), props in ranked[:max(1, int(top_k))]]
+            names = {n for a, b, _ in rows for n in (a, b)}
+            aliases: Dict[str, List[str]] = {}
+            for alias, canonical in adj["aliases"].items():
+                if canonical in names:
+                    aliases.setdefault(canonical, []).append(alias)
+        return _collect_subgraph(rows, top_k, aliases)
+
+    def delete_project_graph(self, project_id: int, batch_size: int = DELETE_BATCH_SIZE, progress: Optional[DeleteProgress] = None) -> None:
+        """
+        Delete all nodes and relationships under a project, batch_size rows per transaction.
+
+        The lock is released between batches so queries of other projects keep running.
+
+        Args:
+            project_id: Project ID.
+            batch_size: Rows deleted per transaction.
+            progress: Called after each batch with cumulative (relationships, nodes) deleted.
+        """
+        batch = max(1, int(batch_size))
+        with self._lock:
+            self._adjacency.pop(project_id, None)
+        counts = {"kg_edge_version": 0, "kg_alias": 0, "kg_entity": 0}
+        for table in counts:
+            while True:
+                with self._lock:
+                    with self._conn:
+                        n = self._conn.execute(
+                            f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE project_id = ? LIMIT ?)",
+                            (project_id, batch),
+                        ).rowcount
+                    # Writes racing the delete would otherwise reload a half-deleted adjacency
+                    self._adjacency.pop(project_id, None)
+                if n <= 0:
+                    break
+                counts[table] += n
+                if progress and table != "kg_alias":
+                    progress(counts["kg_edge_version"], counts["kg_entity"])
 
     def ingest_aliases(self, project_id: int, mapping: Dict[str, List[str]]) -> None:
-        """Placeholder for ingesting aliases (not implemented)."""
-        pass
+        """
+        Record aliases of canonical entities and fold existing alias nodes into them.
+
+        Args:
+            project_id: Project ID.
+            mapping: Canonical name -> list of aliases (nicknames, titles, ...).
+        """
+        rows = _alias_rows(mapping)
+        if not rows:
+            return
+        with self._lock:
+            adj = self._load(project_id)
+            moved: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+            dropped: List[Tuple[str, str]] = []
+            for row in rows:
+                c = row["canonical"]
+                for al in row["aliases"]:
+                    adj["aliases"][al] = c
+                    # Nodes created under an alias before it was known: move their edges to the canonical node
+                    # A self-loop (al, al) is both an out- and an in-edge of al: fold it once
+                    pairs = list(dict.fromkeys(
+                        [(al, b) for b in adj["out"].get(al, ())] + [(a, al) for a in adj["in"].get(al, ())]
+                    ))
+                    for a, b in pairs:
+                        versions = adj["edges"].pop((a, b))
+                        adj["out"].get(a, set()).discard(b)
+                        adj["in"].get(b, set()).discard(a)
+                        dropped.append((a, b))
+                        moved.pop((a, b), None)
+                        na, nb = (c if a == al else a), (c if b == al else b)
+                        if na == nb:
+                            continue
+                        for v in versions:
+                            v["props"]["fact"] = f"{na} {v['props'].get('kind_en') or 'relates_to'} {nb}"
+                        existing = adj["edges"].get((na, nb))
+                        if existing is not None:
+                            versions = _merge_versions(existing, versions)
+                        self._cache_edge(adj, na, nb, versions)
+                        moved[(na, nb)] = versions
+                    adj["out"].pop(al, None)
+                    adj["in"].pop(al, None)
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO kg_alias (project_id, alias, canonical) VALUES (?, ?, ?) "
+                    "ON CONFLICT (project_id, alias) DO UPDATE SET canonical = excluded.canonical",
+                    [(project_id, al, row["canonical"]) for row in rows for al in row["aliases"]],
+                )
+                self._conn.executemany(
+                    "DELETE FROM kg_edge_version WHERE project_id = ? AND a = ? AND b = ?",
+                    [(project_id, a, b) for a, b in dropped],
+                )
+                self._conn.executemany(
+                    "DELETE FROM kg_entity WHERE project_id = ? AND name = ?",
+                    [(project_id, al) for row in rows for al in row["aliases"]],
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO kg_entity (project_id, name) VALUES (?, ?)",
+                    [(project_id, row["canonical"]) for row in rows],
+                )
+                self._conn.executemany(
+                    "DELETE FROM kg_edge_version WHERE project_id = ? AND a = ? AND b = ?",
+                    [(project_id, a, b) for a, b in moved],
+                )
+                for versions in moved.values():
+                    for v in versions:
+                        v["dirty"] = True
+                self._upsert_versions(project_id, moved)
+            for versions in moved.values():
+                for v in versions:
+                    v.pop("dirty", None)
+
+    def get_alias_table(self, project_id: int) -> Dict[str, str]:
+        """Alias -> canonical name for a project."""
+        with self._lock:
+            return dict(self._load(project_id)["aliases"])
+
+
+_PROVIDER_CLASSES = {
+    "neo4j": Neo4jKGProvider,
+    "sqlite": SqliteKGProvider,
+}
+_providers: Dict[str, KnowledgeGraphProvider] = {}
+_providers_lock = threading.Lock()
+
 
 def get_provider() -> KnowledgeGraphProvider:
-    """Get the active Knowledge Graph Provider instance."""
-    # Use Neo4j provider only
-    return Neo4jKGProvider()
+    """
+    Get the active Knowledge Graph Provider instance.
+
+    Selected by the KNOWLEDGE_GRAPH_PROVIDER environment variable (neo4j | sqlite, default neo4j).
+    Instances are shared per process so drivers/connections and in-memory caches are reused.
+    The returned provider is wrapped in a CachedKGProvider (see kg_cache) so repeated
+    query_subgraph calls are served from memory until the project's graph changes.
+    """
+    from app.services.kg_cache import CachedKGProvider
+    name = (os.getenv("KNOWLEDGE_GRAPH_PROVIDER") or "neo4j").strip().lower()
+    cls = _PROVIDER_CLASSES.get(name)
+    if cls is None:
+        raise KnowledgeGraphUnavailableError(f"Unknown KNOWLEDGE_GRAPH_PROVIDER: {name} (expected one of {sorted(_PROVIDER_CLASSES)})")
+    provider = _providers.get(name)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(name)
+            if provider is None:
+                provider = CachedKGProvider(cls())
+                _providers[name] = provider
+    return provider
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from loguru import logger
+
+
+# valid_to of the current (still open) version of a relation edge; versions are [valid_from, valid_to)
+OPEN_CHAPTER_KEY = 2 ** 62
+
+
+@dataclass(frozen=True)
+class GraphMigration:
+    """
+    One versioned graph schema step.
+
+    Attributes:
+        version: Schema version reached after applying this step.
+        description: Human readable summary.
+        statements: Statements executed in order (Cypher or SQL depending on the backend).
+    """
+    version: int
+    description: str
+    statements: Tuple[str, ...]
+
+
+# ---- Neo4j ----
+# Schema version is kept on a single marker node, outside any project group.
+NEO4J_SCHEMA_LABEL = "GraphSchema"
+NEO4J_SCHEMA_ID = "novelforge"
+
+NEO4J_MIGRATIONS: List[GraphMigration] = [
+    GraphMigration(
+        version=1,
+        description="Merge duplicate entities; Entity(group_id, name) uniqueness + group_id index",
+        statements=(
+            # Graphs written before the constraint may hold one name several times: fold the
+            # duplicates into the first node (edges, then aliases) so the constraint can be created
+            "MATCH (e:Entity) WHERE e.group_id IS NOT NULL AND e.name IS NOT NULL "
+            "WITH e.group_id AS g, e.name AS n, collect(e) AS nodes WHERE size(nodes) > 1 "
+            "WITH head(nodes) AS keep, tail(nodes) AS dups "
+            "UNWIND dups AS d "
+            "CALL { WITH keep, d "
+            "  MATCH (d)-[r:RELATES_TO]->(x) "
+            "  WITH keep, r, CASE WHEN x = d THEN keep ELSE x END AS tgt "
+            "  OPTIONAL MATCH (keep)-[e:RELATES_TO]->(tgt) "
+            "  WITH keep, r, tgt, head(collect(e)) AS e "
+            "  FOREACH (_ IN CASE WHEN e IS NULL THEN [1] ELSE [] END | "
+            "    CREATE (keep)-[c:RELATES_TO]->(tgt) SET c = properties(r)) "
+            "  FOREACH (_ IN CASE WHEN e IS NULL THEN [] ELSE [1] END | "
+            "    SET e.evidence_count = coalesce(e.evidence_count, 0) + coalesce(r.evidence_count, 0)) "
+            "  DELETE r } "
+            "CALL { WITH keep, d "
+            "  MATCH (x)-[r:RELATES_TO]->(d) WHERE x <> d "
+            "  OPTIONAL MATCH (x)-[e:RELATES_TO]->(keep) "
+            "  WITH keep, r, x, head(collect(e)) AS e "
+            "  FOREACH (_ IN CASE WHEN e IS NULL THEN [1] ELSE [] END | "
+            "    CREATE (x)-[c:RELATES_TO]->(keep) SET c = properties(r)) "
+            "  FOREACH (_ IN CASE WHEN e IS NULL THEN [] ELSE [1] END | "
+            "    SET e.evidence_count = coalesce(e.evidence_count, 0) + coalesce(r.evidence_count, 0)) "
+            "  DELETE r } "
+            "SET keep.aliases = coalesce(keep.aliases, []) + "
+            "[a IN coalesce(d.aliases, []) WHERE NOT a IN coalesce(keep.aliases, [])] "
+            "DETACH DELETE d",
+            # Backs MERGE (a:Entity {name, group_id}) with an index seek instead of a label scan
+            "CREATE CONSTRAINT entity_group_name_unique IF NOT EXISTS "
+            "FOR (e:Entity) REQUIRE (e.group_id, e.name) IS UNIQUE",
+            # Project wide scans (delete_project_graph, participant lookup)
+            "CREATE INDEX entity_group_id IF NOT EXISTS FOR (e:Entity) ON (e.group_id)",
+        ),
+    ),
+    GraphMigration(
+        version=2,
+        description="Chapter validity intervals on RELATES_TO",
+        statements=(
+            "CREATE INDEX relates_to_validity IF NOT EXISTS FOR ()-[r:RELATES_TO]-() ON (r.valid_from, r.valid_to)",
+            # Existing edges become a single open version starting at the chapter they were first seen
+            "MATCH ()-[r:RELATES_TO]->() WHERE r.valid_to IS NULL "
+            f"SET r.valid_from = coalesce(r.first_chapter_key, 0), r.valid_to = {OPEN_CHAPTER_KEY}",
+        ),
+    ),
+]
+
+# Names that must be ONLINE once the schema is at the latest version
+NEO4J_REQUIRED_SCHEMA = {
+    "constraints": ["entity_group_name_unique"],
+    "indexes": ["entity_group_id", "relates_to_validity"],
+}
+
+
+def _neo4j_version(sess) -> int:
+    rec = sess.run(
+        f"MATCH (v:{NEO4J_SCHEMA_LABEL} {{id: $id}}) RETURN v.version AS version",
+        id=NEO4J_SCHEMA_ID,
+    ).single()
+    return int(rec["version"]) if rec and rec["version"] is not None else 0
+
+
+def verify_neo4j_schema(driver) -> Dict[str, Any]:
+    """
+    Check that the required constraints/indexes exist and are online.
+
+    Returns:
+        Dictionary with version, missing (list of names) and ok flag.
+    """
+    with driver.session() as sess:
+        version = _neo4j_version(sess)
+        constraints = {r["name"] for r in sess.run("SHOW CONSTRAINTS YIELD name RETURN name")}
+        indexes = {r["name"]: r["state"] for r in sess.run("SHOW INDEXES YIELD name, state RETURN name, state")}
+    missing = [n for n in NEO4J_REQUIRED_SCHEMA["constraints"] if n not in constraints]
+    missing += [n for n in NEO4J_REQUIRED_SCHEMA["indexes"] if indexes.get(n) != "ONLINE"]
+    return {"version": version, "missing": missing, "ok": not missing and version >= latest_version(NEO4J_MIGRATIONS)}
+
+
+def ensure_neo4j_schema(driver) -> int:
+    """
+    Apply pending Neo4j migrations and verify the result.
+
+    Args:
+        driver: neo4j.Driver instance.
+
+    Returns:
+        Schema version after migrating.
+    """
+    with driver.session() as sess:
+        current = _neo4j_version(sess)
+        for m in NEO4J_MIGRATIONS:
+            if m.version <= current:
+                continue
+            for stmt in m.statements:
+                sess.run(stmt).consume()
+            sess.run(
+                f"MERGE (v:{NEO4J_SCHEMA_LABEL} {{id: $id}}) SET v.version = $version",
+                id=NEO4J_SCHEMA_ID,
+                version=m.version,
+            ).consume()
+            current = m.version
+            logger.info(f"[GraphSchema] neo4j migrated to v{m.version}: {m.description}")
+        # Index builds are asynchronous; wait so the first ingest already benefits
+        sess.run("CALL db.awaitIndexes(300)").consume()
+
+    status = verify_neo4j_schema(driver)
+    if status["missing"]:
+        logger.warning(f"[GraphSchema] neo4j schema v{current} is missing: {status['missing']}")
+    return current
+
+
+# ---- SQLite ----
+# Versioned with PRAGMA user_version on the graph database file.
+SQLITE_MIGRATIONS: List[GraphMigration] = [
+    GraphMigration(
+        version=1,
+        description="Entity/edge adjacency tables",
+        statements=(
+            "CREATE TABLE IF NOT EXISTS kg_entity ("
+            "project_id INTEGER NOT NULL, name TEXT NOT NULL, "
+            "PRIMARY KEY (project_id, name))",
+            "CREATE TABLE IF NOT EXISTS kg_edge ("
+            "project_id INTEGER NOT NULL, a TEXT NOT NULL, b TEXT NOT NULL, props TEXT NOT NULL, "
+            "PRIMARY KEY (project_id, a, b))",
+            # (project_id, a) is served by the primary key; reverse lookups need their own index
+            "CREATE INDEX IF NOT EXISTS ix_kg_edge_project_b ON kg_edge (project_id, b)",
+        ),
+    ),
+    GraphMigration(
+        version=2,
+        description="Entity alias table",
+        statements=(
+            "CREATE TABLE IF NOT EXISTS kg_alias ("
+            "project_id INTEGER NOT NULL, alias TEXT NOT NULL, canonical TEXT NOT NULL, "
+            "PRIMARY KEY (project_id, alias))",
+        ),
+    ),
+    GraphMigration(
+        version=3,
+        description="Chapter-versioned edges (kg_edge -> kg_edge_version)",
+        statements=(
+            "CREATE TABLE IF NOT EXISTS kg_edge_version ("
+            "project_id INTEGER NOT NULL, a TEXT NOT NULL, b TEXT NOT NULL, "
+            "valid_from INTEGER NOT NULL, valid_to INTEGER NOT NULL, props TEXT NOT NULL, "
+            "PRIMARY KEY (project_id, a, b, valid_from))",
+            "CREATE INDEX IF NOT EXISTS ix_kg_edge_version_project_b ON kg_edge_version (project_id, b)",
+            # Existing edges become a single open version starting at the chapter they were first seen
+            "INSERT OR IGNORE INTO kg_edge_version (project_id, a, b, valid_from, valid_to, props) "
+            "SELECT project_id, a, b, coalesce(json_extract(props, '$.first_chapter_key'), 0), "
+            f"{OPEN_CHAPTER_KEY}, props FROM kg_edge",
+            "DROP TABLE IF EXISTS kg_edge",
+        ),
+    ),
+]
+
+
+def ensure_sqlite_schema(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending SQLite graph migrations.
+
+    Args:
+        conn: Connection to the graph database.
+
+    Returns:
+        Schema version after migrating.
+    """
+    current = int(conn.execute("PRAGMA user_version").fetchone()[0])
+    for m in SQLITE_MIGRATIONS:
+        if m.version <= current:
+            continue
+        with conn:
+            for stmt in m.statements:
+                conn.execute(stmt)
+            conn.execute(f"PRAGMA user_version = {int(m.version)}")
+        current = m.version
+        logger.info(f"[GraphSchema] sqlite migrated to v{m.version}: {m.description}")
+    return current
+
+
+def latest_version(migrations: List[GraphMigration]) -> int:
+    """Highest version defined by a migration list."""
+    return max((m.version for m in migrations), default=0)
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from sqlmodel import Session
 
 from loguru import logger
 
-from app.schemas.relation_extract import RelationExtraction, CN_TO_EN_KIND
+from app.schemas.relation_extract import RelationExtraction, CN_TO_EN_KIND, EN_TO_CN_KIND
 from app.schemas.entity import Entity
 from app.services import agent_service
 from pydantic import BaseModel
@@ -21,7 +22,10 @@ from app.schemas.memory import ParticipantTyped
 from app.services import prompt_service
 
 # Use switchable Knowledge Graph Provider
-from app.services.kg_provider import get_provider, KnowledgeGraphUnavailableError
+from app.services.alias_service import get_name_matcher, get_name_matcher_async, resolve_names
+from app.services.kg_async import AsyncKGProvider, get_async_provider
+from app.services.name_matcher import NameMatcher
+from app.services.kg_provider import get_provider, KnowledgeGraphProvider, KnowledgeGraphUnavailableError, chapter_key, ORDER_BY_RECENCY
 
 # Subject-Object type constraints (Suggestion table)
 _ALLOWED_PAIRS: Dict[str, List[Tuple[str, str]]] = {
@@ -67,25 +71,26 @@ _ALLOWED_PAIRS: Dict[str, List[Tuple[str, str]]] = {
 #     # 'Concept Card': 'concept',
 # }
 
-def _guess_entity_type(session: Session, project_id: int, name: str) -> Optional[str]:
-    """Guess entity type by checking card content in the project."""
+def _guess_entity_types(session: Session, project_id: int, names: Iterable[str]) -> Dict[str, str]:
+    """Guess entity types of names from the project's cards titled like them (one query)."""
+    names = list({n for n in names if n})
+    if not names:
+        return {}
+    types: Dict[str, str] = {}
     try:
-        # Find card with title == name in project, read its type name
-        st = select(Card).where(Card.project_id == project_id, Card.title == name)
-        card = session.exec(st).first()
-        if not card:
-            return None
-        ct = card.card_type
-        if not ct:
-            return None
-        
-        # Correction: card.content is already dict, use model_validate instead of model_validate_json
-        entity=Entity.model_validate(card.content)
-        return str(entity.entity_type)
-        # return _CARDTYPE_TO_ENTITYTYPE.get(ct.name or '', None)
+        # Find cards with title in names, read their entity type (the first card of a title wins)
+        st = select(Card).where(Card.project_id == project_id, Card.title.in_(names)).order_by(Card.id)
+        for card in session.exec(st).all():
+            if card.title in types or not card.card_type:
+                continue
+            try:
+                # card.content is already dict, use model_validate instead of model_validate_json
+                types[card.title] = str(Entity.model_validate(card.content).entity_type)
+            except Exception as e:
+                logger.error(f"Error guessing entity type of {card.title!r}: {e}")
     except Exception as e:
-        logger.error(f"Error guessing entity type: {e}")
-        return None
+        logger.error(f"Error guessing entity types: {e}")
+    return types
 
 
 # Dynamic info limit per category (Adjust as needed)
@@ -100,6 +105,247 @@ DYNAMIC_INFO_LIMITS: Dict[str, int] = {
     "心理想法/目标快照": 3,
 }
 
+DIALOGUES_QUEUE_SIZE = 2
+EVENTS_QUEUE_SIZE = 2
+# Relations per ingest_triples_with_attributes call (one UNWIND transaction)
+INGEST_CHUNK_SIZE = 500
+
+
+def _merge_queue(existing: List[Any], incoming: List[Any], key_fn=lambda x: x, max_size: int = 3) -> List[Any]:
+    """Append incoming to existing without duplicates, keeping the newest max_size items."""
+    seen = set()
+    merged: List[Any] = []
+    # Old then new, keep "new at tail", then trim to keep tail (latest)
+    for it in (existing or []) + (incoming or []):
+        k = key_fn(it)
+        if k in seen:
+            continue
+        seen.add(k)
+        merged.append(it)
+    if len(merged) <= max_size:
+        return merged
+    return merged[-max_size:]
+
+
+def _summary_key(item: Dict[str, Any]) -> str:
+    return item.get("summary") or ""
+
+
+def coalesce_relation_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Fold rows targeting the same (a, b, kind) edge at the same chapter into one, in arrival order.
+
+    Rows of different chapters stay separate so each opens its own edge version. Later attributes win, evidence queues are merged as queues, chapter stamps keep the
+    earliest/latest chapter and the evidence count records how many rows were folded.
+
+    Args:
+        rows: Rows produced by MemoryService.prepare_relation_rows (possibly from several batches).
+
+    Returns:
+        Coalesced rows.
+    """
+    acc: Dict[Tuple[str, str, str, Optional[int]], Dict[str, Any]] = {}
+    for row in rows:
+        attrs = dict(row.get("attributes") or {})
+        ck = attrs.get("chapter_key")
+        key = (row["a"], row["b"], row["kind"], ck)
+        first_ck = attrs.get("first_chapter_key", ck)
+        evidence = int(attrs.get("evidence") or 1)
+        cur = acc.get(key)
+        if cur is None:
+            attrs["evidence"] = evidence
+            if first_ck is not None:
+                attrs["first_chapter_key"] = first_ck
+            acc[key] = {
+                "a": row["a"],
+                "b": row["b"],
+                "kind": row["kind"],
+                "attributes": attrs,
+                "dialogues": list(row.get("dialogues") or []),
+                "summaries": list(row.get("summaries") or []),
+            }
+            continue
+        prev = cur["attributes"]
+        merged = {**prev, **attrs}
+        cks = [x for x in (prev.get("chapter_key"), ck) if x is not None]
+        firsts = [x for x in (prev.get("first_chapter_key"), first_ck) if x is not None]
+        if cks:
+            merged["chapter_key"] = max(cks)
+        if firsts:
+            merged["first_chapter_key"] = min(firsts)
+        merged["evidence"] = int(prev.get("evidence") or 1) + evidence
+        cur["attributes"] = merged
+        cur["dialogues"] = _merge_queue(cur["dialogues"], row.get("dialogues") or [], max_size=DIALOGUES_QUEUE_SIZE)
+        cur["summaries"] = _merge_queue(cur["summaries"], row.get("summaries") or [], key_fn=_summary_key, max_size=EVENTS_QUEUE_SIZE)
+    return list(acc.values())
+
+
+def _normalize_relation_rows(matcher: NameMatcher, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Resolve aliases, drop self-relations, coalesce and order rows oldest chapter first."""
+    # Rows may have been queued before an alias was recorded
+    resolved: List[Dict[str, Any]] = []
+    for row in rows:
+        a, b = matcher.resolve(row["a"]), matcher.resolve(row["b"])
+        if a and b and a != b:
+            resolved.append({**row, "a": a, "b": b})
+    rows = coalesce_relation_rows(resolved)
+    # Oldest chapter first (unchaptered rows update the current version, so they go last)
+    rows.sort(key=lambda r: ((r.get("attributes") or {}).get("chapter_key") is None, (r.get("attributes") or {}).get("chapter_key") or 0))
+    return rows
+
+
+def _prefetch_groups(rows: List[Dict[str, Any]]) -> Dict[Optional[int], List[str]]:
+    """Participants to prefetch per chapter of the batch (one query each)."""
+    by_chapter: Dict[Optional[int], set] = {}
+    for row in rows:
+        by_chapter.setdefault((row.get("attributes") or {}).get("chapter_key"), set()).update((row["a"], row["b"]))
+    return {ck: list(parts) for ck, parts in by_chapter.items()}
+
+
+def _index_relation_summaries(sub: Dict[str, Any]) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+    """Existing evidence queues of a prefetched subgraph: (a, b, kind_en) -> {recent_dialogues, recent_event_summaries}."""
+    index: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    for item in (sub.get("relation_summaries") or []):
+        try:
+            a0 = item.get("a"); b0 = item.get("b"); kind_cn = item.get("kind")
+            kind_en = CN_TO_EN_KIND.get(kind_cn or '', '')
+            if not (a0 and b0 and kind_en):
+                continue
+            index[(a0, b0, kind_en)] = {
+                "recent_dialogues": item.get("recent_dialogues") or [],
+                "recent_event_summaries": item.get("recent_event_summaries") or [],
+            }
+        except Exception:
+            continue
+    return index
+
+
+def _build_relation_triples(
+    rows: List[Dict[str, Any]],
+    existing_index: Dict[Optional[int], Dict[Tuple[str, str, str], Dict[str, Any]]],
+) -> Tuple[List[Tuple[str, str, str, Dict[str, Any]]], Dict[Tuple[str, str, str], Dict[str, Any]]]:
+    """
+    Merge normalized rows with the prefetched evidence queues.
+
+    Args:
+        rows: Rows from _normalize_relation_rows.
+        existing_index: chapter_key -> evidence index (see _index_relation_summaries).
+
+    Returns:
+        (triples for ingest_triples_with_attributes, merged evidence per (a, b, kind)).
+    """
+    # Write relation triples; also minimize persistence of addressing/event summary/stance (as searchable evidence)
+    # tuples: (subject, relation, object, attributes_dict)
+    triples_with_attrs: List[Tuple[str, str, str, Dict[str, Any]]] = []
+    # Merge dialogue/event summary queues by policy, and serialize to dict
+    merged_evidence_map: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    # Queues written earlier in this batch (older chapters) carry over to later versions
+    written: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    for row in rows:
+        key = (row["a"], row["b"], row["kind"])
+        attributes = dict(row.get("attributes") or {})
+
+        # Read existing and merge as queue
+        prev = existing_index.get(attributes.get("chapter_key"), {}).get(key, {})
+        if key in written:
+            prev = {
+                "recent_dialogues": _merge_queue(list(prev.get("recent_dialogues") or []), written[key]["recent_dialogues"], max_size=DIALOGUES_QUEUE_SIZE),
+                "recent_event_summaries": _merge_queue(list(prev.get("recent_event_summaries") or []), written[key]["recent_event_summaries"], key_fn=_summary_key, max_size=EVENTS_QUEUE_SIZE),
+            }
+        merged_dialogues = _merge_queue(list(prev.get("recent_dialogues") or []), row.get("dialogues") or [], max_size=DIALOGUES_QUEUE_SIZE)
+        merged_summaries = _merge_queue(list(prev.get("recent_event_summaries") or []), row.get("summaries") or [], key_fn=_summary_key, max_size=EVENTS_QUEUE_SIZE)
+
+        if merged_dialogues:
+            attributes["recent_dialogues"] = merged_dialogues
+        if merged_summaries:
+            attributes["recent_event_summaries"] = merged_summaries
+
+        triples_with_attrs.append((row["a"], row["kind"], row["b"], attributes))
+        written[key] = {"recent_dialogues": merged_dialogues, "recent_event_summaries": merged_summaries}
+
+        # Return value (Summary only)
+        merged_evidence_map[key] = {
+            "recent_dialogues": attributes.get("recent_dialogues", []),
+            "recent_event_summaries": [s.get('summary') for s in attributes.get("recent_event_summaries", [])]
+        }
+    return triples_with_attrs, merged_evidence_map
+
+
+def merge_and_write_relations(graph: KnowledgeGraphProvider, project_id: int, rows: List[Dict[str, Any]], chunk_size: int = INGEST_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Merge prepared rows with the evidence already stored in the graph and write them.
+
+    The stored subgraph is prefetched once per chapter in the batch (as of that chapter, so
+    evidence queues continue the edge version being split); writes are split into chunks
+    of chunk_size relations, each one ingest transaction.
+
+    Args:
+        graph: Knowledge graph provider.
+        project_id: Project ID.
+        rows: Rows produced by MemoryService.prepare_relation_rows.
+        chunk_size: Relations per ingest call.
+
+    Returns:
+        Dictionary with number of written relations and merged evidence.
+    """
+    rows = _normalize_relation_rows(get_name_matcher(project_id, graph), rows)
+
+    # Prefetch: query subgraph once per chapter of the batch and filter in memory, avoiding per-row roundtrips
+    existing_index: Dict[Optional[int], Dict[Tuple[str, str, str], Dict[str, Any]]] = {}
+    for ck, parts in _prefetch_groups(rows).items():
+        try:
+            sub = graph.query_subgraph(project_id=project_id, participants=parts, radius=0, top_k=max(200, 2 * len(rows)), max_chapter_id=ck)
+        except Exception:
+            sub = {}
+        existing_index[ck] = _index_relation_summaries(sub)
+
+    triples_with_attrs, merged_evidence_map = _build_relation_triples(rows, existing_index)
+    size = max(1, int(chunk_size))
+    for i in range(0, len(triples_with_attrs), size):
+        try:
+            graph.ingest_triples_with_attributes(project_id, triples_with_attrs[i:i + size])
+        except Exception as e:
+            raise ValueError(f"Knowledge graph write failed: {e}")
+
+    return {"written": len(triples_with_attrs), "merged_evidence": merged_evidence_map}
+
+
+async def merge_and_write_relations_async(graph: AsyncKGProvider, project_id: int, rows: List[Dict[str, Any]], chunk_size: int = INGEST_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Async variant of merge_and_write_relations for callers on the event loop.
+
+    Per-chapter prefetches run concurrently; graph round trips are awaited instead of
+    blocking the loop.
+
+    Args:
+        graph: Async knowledge graph provider (see kg_async.get_async_provider).
+        project_id: Project ID.
+        rows: Rows produced by MemoryService.prepare_relation_rows.
+        chunk_size: Relations per ingest call.
+
+    Returns:
+        Dictionary with number of written relations and merged evidence.
+    """
+    rows = _normalize_relation_rows(await get_name_matcher_async(project_id, graph), rows)
+
+    groups = _prefetch_groups(rows)
+    subs = await asyncio.gather(
+        *(graph.query_subgraph(project_id=project_id, participants=parts, radius=0, top_k=max(200, 2 * len(rows)), max_chapter_id=ck) for ck, parts in groups.items()),
+        return_exceptions=True,
+    )
+    existing_index = {ck: _index_relation_summaries(sub if isinstance(sub, dict) else {}) for ck, sub in zip(groups, subs)}
+
+    triples_with_attrs, merged_evidence_map = _build_relation_triples(rows, existing_index)
+    size = max(1, int(chunk_size))
+    for i in range(0, len(triples_with_attrs), size):
+        try:
+            await graph.ingest_triples_with_attributes(project_id, triples_with_attrs[i:i + size])
+        except Exception as e:
+            raise ValueError(f"Knowledge graph write failed: {e}")
+
+    return {"written": len(triples_with_attrs), "merged_evidence": merged_evidence_map}
+
+
 class MemoryService:
     def __init__(self, session: Session):
         self.session = session
@@ -250,6 +496,7 @@ class MemoryService:
         edge_type_whitelist: Optional[List[str]] = None,
         top_k: int = 50,
         max_chapter_id: Optional[int] = None,
+        order_by: str = ORDER_BY_RECENCY,
     ) -> Dict[str, Any]:
         """
         Query the knowledge graph for a subgraph.
@@ -257,26 +504,31 @@ class MemoryService:
         Args:
             project_id: Project ID.
             participants: List of participants.
-            radius: Radius.
+            radius: Hops to expand (0 = edges among participants only).
             edge_type_whitelist: Allowed edge types.
             top_k: Max results.
-            max_chapter_id: Max chapter ID.
+            max_chapter_id: Chapter ordinal to query the graph as of (see chapter_key).
+            order_by: Relevance ordering before top_k ("recency" or "evidence").
 
         Returns:
             Subgraph dictionary.
         """
         return self.graph.query_subgraph(
             project_id=project_id,
-            participants=participants,
+            participants=resolve_names(project_id, participants or [], self.graph),
             radius=radius,
             edge_type_whitelist=edge_type_whitelist,
             top_k=top_k,
             max_chapter_id=max_chapter_id,
+            order_by=order_by,
         )
 
-    def ingest_relations_from_llm(self, project_id: int, data: RelationExtraction, *, volume_number: Optional[int] = None, chapter_number: Optional[int] = None, participants_with_type: Optional[List[ParticipantTyped]] = None) -> Dict[str, Any]:
+    def prepare_relation_rows(self, project_id: int, data: RelationExtraction, *, volume_number: Optional[int] = None, chapter_number: Optional[int] = None, participants_with_type: Optional[List[ParticipantTyped]] = None, matcher: Optional[NameMatcher] = None) -> List[Dict[str, Any]]:
         """
-        Ingest extracted relations into the knowledge graph.
+        Validate and normalize extracted relations into ingest rows (no graph access).
+
+        Rows are JSON serializable so they can be queued (see graph_ingest_queue) and later
+        written by merge_and_write_relations.
 
         Args:
             project_id: Project ID.
@@ -284,108 +536,66 @@ class MemoryService:
             volume_number: Volume number.
             chapter_number: Chapter number.
             participants_with_type: List of typed participants.
+            matcher: Alias matcher of the project (loaded from the graph if omitted).
 
         Returns:
-            Dictionary with number of written relations and merged evidence.
+            List of rows {a, b, kind, attributes, dialogues, summaries}.
         """
-        # Write relation triples; also minimize persistence of addressing/event summary/stance (as searchable evidence)
-        # tuples: (subject, relation, object, attributes_dict)
-        triples_with_attrs: List[tuple[str, str, str, Dict[str, Any]]] = []
-
-        DIALOGUES_QUEUE_SIZE = 2
-        EVENTS_QUEUE_SIZE = 2
+        rows: List[Dict[str, Any]] = []
 
         # Create participant type map for quick lookup
         participant_type_map = {p.name: p.type for p in participants_with_type} if participants_with_type else {}
 
-        def _merge_queue(existing: List[Any], incoming: List[Any], key_fn=lambda x: x, max_size: int = 3) -> List[Any]:
-            seen = set()
-            merged: List[Any] = []
-            # Old then new, keep "new at tail", then trim to keep tail (latest)
-            for it in (existing or []) + (incoming or []):
-                k = key_fn(it)
-                if k in seen:
-                    continue
-                seen.add(k)
-                merged.append(it)
-            if len(merged) <= max_size:
-                return merged
-            return merged[-max_size:]
-
-        # Merge dialogue/event summary queues (size=3) by policy, and serialize to dict
-        merged_evidence_map: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
-
-        # Prefetch: Collect all (a, b, kind_cn) in this batch, query subgraph once and filter in memory, avoiding multiple roundtrips
-        pairs: List[Tuple[str, str, str]] = []  # (a, b, kind_en)
-        for r in (data.relations or []):
-            pred = CN_TO_EN_KIND.get(r.kind or '', '')
-            if pred:
-                pairs.append((r.a, r.b, pred))
-
-        # Build existing data index: key=(a,b,kind_en) -> {recent_dialogues, recent_event_summaries}
-        existing_index: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
-        try:
-            # Participant union (deduplicate)
-            all_parts = list({p for t in pairs for p in (t[0], t[1])})
-            if all_parts:
-                sub = self.graph.query_subgraph(project_id=project_id, participants=all_parts, top_k=200)
-                from app.schemas.relation_extract import EN_TO_CN_KIND
-                for item in (sub.get("relation_summaries") or []):
-                    try:
-                        a0 = item.get("a"); b0 = item.get("b"); kind_cn = item.get("kind")
-                        kind_en = CN_TO_EN_KIND.get(kind_cn or '', '')
-                        if not (a0 and b0 and kind_en):
-                            continue
-                        key = (a0, b0, kind_en)
-                        existing_index[key] = {
-                            "recent_dialogues": item.get("recent_dialogues") or [],
-                            "recent_event_summaries": item.get("recent_event_summaries") or [],
-                        }
-                    except Exception:
-                        continue
-        except Exception:
-            existing_index = {}
-
-        def _coerce_kind_by_types(kind_cn: str, type_a: Optional[str], type_b: Optional[str]) -> str:
+        def _coerce_kind_by_types(kind_en: str, type_a: Optional[str], type_b: Optional[str]) -> str:
             if not type_a or not type_b:
-                return kind_cn
-            allowed = _ALLOWED_PAIRS.get(kind_cn)
+                return kind_en
+            allowed = _ALLOWED_PAIRS.get(EN_TO_CN_KIND.get(kind_en, kind_en))
             if not allowed:
-                return kind_cn
+                return kind_en
             if (type_a, type_b) in allowed:
-                return kind_cn
+                return kind_en
             # Illegal: downgrade to "About"
-            return '关于'
-
+            return 'about'
+
+        ck = chapter_key(volume_number, chapter_number)
+        # Nicknames / titles resolve to the canonical entity so they do not become separate nodes
+        matcher = matcher or get_name_matcher(project_id, self.graph)
+        for name, typ in list(participant_type_map.items()):
+            participant_type_map.setdefault(matcher.resolve(name), typ)
+        relations = []
         for r in (data.relations or []):
             pred = CN_TO_EN_KIND.get(r.kind or '', '')
             if not pred:
                 continue
-            
-            # Use passed type info, fallback to guess if missing
-            type_a = participant_type_map.get(r.a) or _guess_entity_type(self.session, project_id, r.a)
-            type_b = participant_type_map.get(r.b) or _guess_entity_type(self.session, project_id, r.b)
-
-            # Constraint: Coerce relation kind (Chinese) based on entity types
-            kind_cn_fixed = _coerce_kind_by_types(r.kind, type_a, type_b)
-            pred = CN_TO_EN_KIND.get(kind_cn_fixed, pred)
-            
-            # Prepare attribute dict
-            attributes = r.model_dump(exclude={"a", "b", "kind"}, exclude_none=True)
+            r = r.model_copy(update={"a": matcher.resolve(r.a), "b": matcher.resolve(r.b)})
+            if not r.a or not r.b or r.a == r.b:
+                continue
+            relations.append((pred, r))
+        # Use passed type info, fallback to guess (from cards) if missing
+        guessed = _guess_entity_types(
+            self.session, project_id,
+            (n for _, r in relations for n in (r.a, r.b) if not participant_type_map.get(n)),
+        )
+        for pred, r in relations:
+            type_a = participant_type_map.get(r.a) or guessed.get(r.a)
+            type_b = participant_type_map.get(r.b) or guessed.get(r.b)
+
+            # Constraint: Coerce relation kind based on entity types
+            pred = _coerce_kind_by_types(pred, type_a, type_b)
+
+            # Prepare attribute dict (evidence queues are merged at write time)
+            attributes = r.model_dump(exclude={"a", "b", "kind", "recent_dialogues", "recent_event_summaries"}, exclude_none=True)
 
             # Backend forced filtering: If A or B is not character, remove addressing and dialogues
-            if type_a != 'character' or type_b != 'character':
+            is_character_pair = type_a == 'character' and type_b == 'character'
+            if not is_character_pair:
                 attributes.pop('a_to_b_addressing', None)
                 attributes.pop('b_to_a_addressing', None)
-                attributes.pop('recent_dialogues', None)
 
             # Dialogues (Filter length)
-            new_dialogues = [d.strip() for d in (attributes.get("recent_dialogues") or []) if isinstance(d, str) and len(d.strip()) >= 20]
-            if new_dialogues:
-                attributes["recent_dialogues"] = new_dialogues
-            elif "recent_dialogues" in attributes:
-                attributes.pop("recent_dialogues")
-
+            new_dialogues: List[str] = []
+            if is_character_pair:
+                new_dialogues = [d.strip() for d in (r.recent_dialogues or []) if isinstance(d, str) and len(d.strip()) >= 20]
 
             # Event summaries (Complete volume/chapter)
             new_summaries: List[Dict[str, Any]] = []
@@ -401,41 +611,70 @@ class MemoryService:
                 except Exception:
                     continue
 
-            # Read existing and merge as queue
-            key = (r.a, r.b, pred)
-            prev = existing_index.get(key, {})
-            old_dialogues: List[str] = list(prev.get("recent_dialogues") or [])
-            old_summaries: List[Dict[str, Any]] = list(prev.get("recent_event_summaries") or [])
-
-            merged_dialogues = _merge_queue(old_dialogues, new_dialogues, key_fn=lambda x: x, max_size=DIALOGUES_QUEUE_SIZE)
-            merged_summaries = _merge_queue(old_summaries, new_summaries, key_fn=lambda x: (x.get("summary") or ""), max_size=EVENTS_QUEUE_SIZE)
-
-            if merged_dialogues:
-                attributes["recent_dialogues"] = merged_dialogues
-            if merged_summaries:
-                attributes["recent_event_summaries"] = merged_summaries
-
-            # Clean empty fields
-            if not attributes.get("recent_dialogues") and "recent_dialogues" in attributes:
-                attributes.pop("recent_dialogues", None)
-            if not attributes.get("recent_event_summaries") and "recent_event_summaries" in attributes:
-                attributes.pop("recent_event_summaries", None)
-            
-            triples_with_attrs.append((r.a, pred, r.b, attributes))
-            
-            # Return value (Summary only)
-            merged_evidence_map[key] = {
-                "recent_dialogues": attributes.get("recent_dialogues", []),
-                "recent_event_summaries": [s.get('summary') for s in attributes.get("recent_event_summaries", [])]
-            }
+            # Time-stamp the edge with the chapter it was extracted from
+            if ck is not None:
+                attributes["chapter_key"] = ck
 
-        if triples_with_attrs:
-            try:
-                self.graph.ingest_triples_with_attributes(project_id, triples_with_attrs)
-            except Exception as e:
-                raise ValueError(f"Knowledge graph write failed: {e}")
-        
-        return {"written": len(triples_with_attrs), "merged_evidence": merged_evidence_map} 
+            rows.append({
+                "a": r.a,
+                "b": r.b,
+                "kind": pred,
+                "attributes": attributes,
+                "dialogues": new_dialogues,
+                "summaries": new_summaries,
+            })
+        return rows
+
+    def ingest_relations_from_llm(self, project_id: int, data: RelationExtraction, *, volume_number: Optional[int] = None, chapter_number: Optional[int] = None, participants_with_type: Optional[List[ParticipantTyped]] = None) -> Dict[str, Any]:
+        """
+        Ingest extracted relations into the knowledge graph (synchronously).
+
+        Args:
+            project_id: Project ID.
+            data: RelationExtraction object.
+            volume_number: Volume number.
+            chapter_number: Chapter number.
+            participants_with_type: List of typed participants.
+
+        Returns:
+            Dictionary with number of written relations and merged evidence.
+        """
+        rows = self.prepare_relation_rows(
+            project_id,
+            data,
+            volume_number=volume_number,
+            chapter_number=chapter_number,
+            participants_with_type=participants_with_type,
+        )
+        return merge_and_write_relations(self.graph, project_id, rows)
+
+    async def ingest_relations_from_llm_async(self, project_id: int, data: RelationExtraction, *, volume_number: Optional[int] = None, chapter_number: Optional[int] = None, participants_with_type: Optional[List[ParticipantTyped]] = None) -> Dict[str, Any]:
+        """
+        Ingest extracted relations without blocking the event loop (see ingest_relations_from_llm).
+
+        Args:
+            project_id: Project ID.
+            data: RelationExtraction object.
+            volume_number: Volume number.
+            chapter_number: Chapter number.
+            participants_with_type: List of typed participants.
+
+        Returns:
+            Dictionary with number of written relations and merged evidence.
+        """
+        graph = get_async_provider()
+        matcher = await get_name_matcher_async(project_id, graph)
+        # Entity types are guessed from cards (a database query)
+        rows = await asyncio.to_thread(
+            self.prepare_relation_rows,
+            project_id,
+            data,
+            volume_number=volume_number,
+            chapter_number=chapter_number,
+            participants_with_type=participants_with_type,
+            matcher=matcher,
+        )
+        return await merge_and_write_relations_async(graph, project_id, rows)
 
     def update_dynamic_character_info(self, project_id: int, data: UpdateDynamicInfo, queue_size: int = 3) -> Dict[str, Any]:
         """
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+
+class NameMatcher:
+    """
+    Compiled matcher mapping surface forms (names, aliases, titles) to canonical entity names.
+
+    Exact resolution is a dict lookup. Scanning text for mentions uses an Aho-Corasick
+    automaton, so the cost is linear in the text length regardless of how many names
+    the cast has.
+    """
+    def __init__(self, surface_to_canonical: Dict[str, str]) -> None:
+        self._lookup: Dict[str, str] = {}
+        for surface, canonical in surface_to_canonical.items():
+            surface = (surface or "").strip()
+            if surface and canonical:
+                self._lookup[surface] = canonical
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Lengths of the patterns ending at each state (own + inherited via suffix links)
+        self._out: List[Tuple[int, ...]] = [()]
+        self._build()
+        # Characters that can start a name: from the root state the scan jumps to the next one
+        self._first = re.compile("[" + "".join(re.escape(ch) for ch in self._goto[0]) + "]") if self._goto[0] else None
+
+    def __len__(self) -> int:
+        return len(self._lookup)
+
+    @classmethod
+    def from_aliases(cls, names: Iterable[str], alias_table: Dict[str, str]) -> "NameMatcher":
+        """
+        Build from canonical names plus an alias -> canonical table.
+
+        Args:
+            names: Canonical names (each maps to itself).
+            alias_table: Alias to canonical name.
+        """
+        mapping: Dict[str, str] = {}
+        for alias, canonical in (alias_table or {}).items():
+            mapping[alias] = canonical
+        # Canonical names always resolve to themselves, even if also listed as someone's alias
+        for n in names or []:
+            mapping[n] = n
+        for canonical in set(mapping.values()):
+            mapping.setdefault(canonical, canonical)
+        return cls(mapping)
+
+    def _build(self) -> None:
+        goto, fail, out = self._goto, self._fail, self._out
+        for surface in self._lookup:
+            state = 0
+            for ch in surface:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto.append({})
+                    fail.append(0)
+                    out.append(())
+                    goto[state][ch] = nxt
+                state = nxt
+            out[state] = (len(surface),)
+
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if goto[f].get(ch, 0) != nxt else 0
+                if out[fail[nxt]]:
+                    out[nxt] = out[nxt] + out[fail[nxt]]
+
+    def resolve(self, name: str) -> str:
+        """Canonical name for a surface form (the input itself if unknown)."""
+        key = (name or "").strip()
+        return self._lookup.get(key, key)
+
+    def resolve_many(self, names: Iterable[str]) -> List[str]:
+        """Resolve names, de-duplicating while keeping first-seen order."""
+        seen = set()
+        out: List[str] = []
+        for n in names or []:
+            c = self.resolve(n)
+            if c and c not in seen:
+                seen.add(c)
+                out.append(c)
+        return out
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Find non-overlapping mentions in text (leftmost, then longest).
+
+        Args:
+            text: Text to scan.
+
+        Returns:
+            List of (start, end, canonical name).
+        """
+        if not text or not self._lookup:
+            return []
+        goto, fail, out = self._goto, self._fail, self._out
+        first = self._first.search
+        candidates: List[Tuple[int, int]] = []
+        state = 0
+        i, n = 0, len(text)
+        while i < n:
+            if not state:
+                m = first(text, i)
+                if m is None:
+                    break
+                i = m.start()
+            ch = text[i]
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            i += 1
+            for length in out[state]:
+                candidates.append((i - length, i))
+        # Pick leftmost-longest without overlaps
+        candidates.sort(key=lambda se: (se[0], -(se[1] - se[0])))
+        result: List[Tuple[int, int, str]] = []
+        last_end = 0
+        for start, end in candidates:
+            if start < last_end:
+                continue
+            result.append((start, end, self._lookup[text[start:end]]))
+            last_end = end
+        return result
+
+    def mentions(self, text: str) -> Dict[str, int]:
+        """Count mentions per canonical name in text."""
+        counts: Dict[str, int] = {}
+        for _, _, canonical in self.find_all(text):
+            counts[canonical] = counts.get(canonical, 0) + 1
+        return counts
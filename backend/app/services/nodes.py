@@ -1,11 +1,18 @@
 from __future__ import annotations
 
-from typing import Any, Optional, List, Dict, Callable
+from typing import Any, Optional, List, Dict, Callable, Iterator, Set, Tuple
+import os
 import re
 import copy
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from contextlib import contextmanager
+from functools import lru_cache
+from sqlalchemy import inspect as sa_inspect
 from sqlmodel import Session, select
 
 from app.db.models import Card, CardType
+from app.services.workflow_uow import UNIT_OF_WORK_KEY
 from loguru import logger
 
 
@@ -13,25 +20,48 @@ from loguru import logger
 # 使用装饰器自动注册工作流节点，避免手动维护映射表
 
 _NODE_REGISTRY: Dict[str, Callable] = {}
+# node_type -> access(state, params) -> (reads, writes); see get_node_access
+_NODE_ACCESS: Dict[str, Callable[[dict, dict], Tuple[Set[str], Set[str]]]] = {}
 
+# Resource key matching every other key (nodes without an access declaration)
+ALL_RESOURCES = "*"
+# State keys that may hold a Card bound to the session of the node that loaded it
+_CARD_STATE_KEYS = ("card", "last_child")
 
-def register_node(node_type: str):
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Upper bound of a loop node's "concurrency" param (iterations running at the same time)
+WORKFLOW_LOOP_MAX_CONCURRENCY = _env_int("WORKFLOW_LOOP_MAX_CONCURRENCY", 8)
+
+
+def register_node(node_type: str, access: Optional[Callable[[dict, dict], Tuple[Set[str], Set[str]]]] = None):
     """
     Decorator: Automatically register workflow nodes.
     
     Usage:
-        @register_node("Card.Read")
+        @register_node("Card.Read", access=_access_card_read)
         def node_card_read(session, state, params):
             ...
 
     Args:
         node_type: The string identifier for the node type.
+        access: Optional callable (state, params) -> (reads, writes) naming the resources
+            ("card:<id>", "children:<parent>") the node reads and writes, so the scheduler
+            can run non-conflicting nodes side by side. Nodes without one run exclusively.
 
     Returns:
         The decorated function.
     """
     def decorator(func: Callable):
         _NODE_REGISTRY[node_type] = func
+        if access is not None:
+            _NODE_ACCESS[node_type] = access
         logger.debug(f"[节点注册] {node_type} -> {func.__name__}")
         return func
     return decorator
@@ -47,6 +77,94 @@ def get_node_types() -> List[str]:
     return list(_NODE_REGISTRY.keys())
 
 
+def get_node_access(node_type: str, state: dict, params: dict) -> Tuple[Set[str], Set[str]]:
+    """
+    Resources a node reads and writes given its input state and params.
+
+    Returns:
+        (reads, writes); ({ALL_RESOURCES}, {ALL_RESOURCES}) when the node declares nothing
+        or its targets cannot be resolved.
+    """
+    access = _NODE_ACCESS.get(node_type)
+    if access is not None:
+        try:
+            return access(state, params)
+        except Exception as e:  # noqa: BLE001
+            logger.debug(f"[Node] access of {node_type} unresolved, running exclusively: {e}")
+    return {ALL_RESOURCES}, {ALL_RESOURCES}
+
+
+class ResourceLocks:
+    """
+    Write locks on node resources for loop iterations running concurrently.
+
+    A body node holds the resources it writes (see get_node_access) while it runs, so
+    iterations upserting children of one parent, or merging into one card, take turns on
+    that node only. ALL_RESOURCES excludes every other holder. All keys of a node are
+    taken at once, so holders never deadlock. One instance per run (state[RESOURCE_LOCKS_KEY]),
+    so a node running exclusively only holds up iterations of its own run.
+    """
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._held: Set[str] = set()
+
+    def _free(self, keys: Set[str]) -> bool:
+        if not self._held:
+            return True
+        if ALL_RESOURCES in keys or ALL_RESOURCES in self._held:
+            return False
+        return keys.isdisjoint(self._held)
+
+    @contextmanager
+    def hold(self, keys: Set[str]) -> Iterator[None]:
+        """Hold the given resource keys for the duration of the block."""
+        keys = set(keys)
+        if not keys:
+            yield
+            return
+        with self._cond:
+            while not self._free(keys):
+                self._cond.wait()
+            self._held |= keys
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._held -= keys
+                self._cond.notify_all()
+
+
+# State key holding the run's ResourceLocks (shared by every loop iteration of the run)
+RESOURCE_LOCKS_KEY = "resource_locks"
+_iteration = threading.local()
+
+
+def in_concurrent_iteration() -> bool:
+    """Whether the calling thread runs an iteration of a concurrent loop (body nodes must hold the run's ResourceLocks)."""
+    return getattr(_iteration, "concurrent", False)
+
+
+def _attach(session: Session, card: Card, uow: Any = None) -> Card:
+    """The same card loaded in session (cards in state outlive the session of the node that read them)."""
+    identity = sa_inspect(card).identity
+    if not identity:
+        # New card (pending in the unit of work, or inserted by it)
+        return card
+    loaded = session.get(Card, identity[0]) or card
+    return uow.overlay(loaded) if uow is not None else loaded
+
+
+def attach_state_cards(session: Session, state: dict) -> None:
+    """Rebind the cards held in state to session."""
+    uow = state.get(UNIT_OF_WORK_KEY)
+    for key in _CARD_STATE_KEYS:
+        if isinstance(state.get(key), Card):
+            state[key] = _attach(session, state[key], uow)
+    current = state.get("current")
+    if isinstance(current, dict) and isinstance(current.get("card"), Card):
+        state["current"] = {**current, "card": _attach(session, current["card"], uow)}
+
+
 # ======================================================
 
 
@@ -161,6 +279,41 @@ def _get_card_by_id(session: Session, card_id: int) -> Optional[Card]:
         return None
 
 
+def _load_card(session: Session, state: dict, card_id: Any) -> Optional[Card]:
+    """Card by id as the run sees it (pending writes of the run's unit of work included)."""
+    uow = state.get(UNIT_OF_WORK_KEY)
+    if uow is None:
+        return _get_card_by_id(session, card_id)
+    try:
+        return uow.load(session, int(card_id))
+    except Exception:
+        return None
+
+
+def _save_card(session: Session, state: dict, card: Card, **changes: Any) -> Card:
+    """Apply field changes to a card: recorded in the run's unit of work, else committed right away."""
+    uow = state.get(UNIT_OF_WORK_KEY)
+    if uow is not None:
+        return uow.update(card, changes)
+    for key, value in changes.items():
+        setattr(card, key, value)
+    session.add(card)
+    session.commit()
+    session.refresh(card)
+    return card
+
+
+def _insert_card(session: Session, state: dict, card: Card) -> Card:
+    """Create a card: recorded in the run's unit of work, else committed right away."""
+    uow = state.get(UNIT_OF_WORK_KEY)
+    if uow is not None:
+        return uow.insert(card)
+    session.add(card)
+    session.commit()
+    session.refresh(card)
+    return card
+
+
 def _get_by_path(obj: Any, path: str) -> Any:
     """Minimal JSONPath resolution."""
     if not path or not isinstance(path, str):
@@ -216,30 +369,89 @@ def _set_by_path(obj: Dict[str, Any], path: str, value: Any) -> bool:
 _TPL_PATTERN = re.compile(r"\{([^{}]+)\}")
 
 
-def _resolve_expr(expr: str, state: dict) -> Any:
-    """Resolve expression string against state."""
+def _walk(cur: Any, parts: Tuple[str, ...]) -> Any:
+    """Follow pre-split path parts like _get_by_path."""
+    for p in parts:
+        if isinstance(cur, dict):
+            cur = cur.get(p)
+        else:
+            try:
+                cur = getattr(cur, p)
+            except Exception:
+                return None
+    return cur
+
+
+@lru_cache(maxsize=4096)
+def _compile_expr(expr: str) -> Callable[[dict], Any]:
+    """Parse an expression once into a closure over state (see _resolve_expr)."""
     expr = expr.strip()
     # index（循环序号，从 1 开始）
     if expr == "index":
-        return (state.get("item") or {}).get("index")
-    # item.xxx
-    if expr.startswith("item."):
-        item = state.get("item") or {}
-        return _get_by_path({"item": item}, "$." + expr)
-    # current.xxx / current.card.xxx
-    if expr.startswith("current."):
-        cur = state.get("current") or {}
-        return _get_by_path({"current": cur}, "$." + expr)
-    # scope.xxx
-    if expr.startswith("scope."):
-        scope = state.get("scope") or {}
-        return _get_by_path({"scope": scope}, "$." + expr)
+        return lambda state: (state.get("item") or {}).get("index")
+    # item.xxx / current.xxx / current.card.xxx / scope.xxx
+    for root in ("item", "current", "scope"):
+        if expr.startswith(root + "."):
+            parts = tuple(expr[len(root) + 1:].split("."))
+            return lambda state, root=root, parts=parts: _walk(state.get(root) or {}, parts)
     # $.content.xxx 针对当前 card
     if expr.startswith("$."):
-        card = (state.get("current") or {}).get("card") or state.get("card")
-        base = {"content": getattr(card, "content", {})} if card else {}
-        return _get_by_path({"$": base}, expr)
-    return None
+        parts = tuple(expr[2:].split("."))
+
+        def card_path(state: dict) -> Any:
+            card = (state.get("current") or {}).get("card") or state.get("card")
+            base = {"content": getattr(card, "content", {})} if card else {}
+            return _walk(base, parts)
+        return card_path
+    return lambda state: None
+
+
+def _resolve_expr(expr: str, state: dict) -> Any:
+    """Resolve expression string against state."""
+    return _compile_expr(expr)(state)
+
+
+def _stringify(res: Any) -> str:
+    if isinstance(res, (dict, list)):
+        return str(res)
+    return "" if res is None else str(res)
+
+
+@lru_cache(maxsize=4096)
+def _compile_template(text: str) -> Callable[[dict], Any]:
+    """Parse a template string once into a closure over state (see _render_value)."""
+    # 单一表达式直接返回原类型
+    m = _TPL_PATTERN.fullmatch(text.strip())
+    if m:
+        return _compile_expr(m.group(1))
+    # 内嵌模板，最终还是字符串：split 交替得到 [literal, expr, literal, ...]
+    pieces = _TPL_PATTERN.split(text)
+    if len(pieces) == 1:
+        return lambda state: text
+    literals = pieces[0::2]
+    exprs = [_compile_expr(e) for e in pieces[1::2]]
+
+    def render(state: dict) -> str:
+        out = [literals[0]]
+        for fn, lit in zip(exprs, literals[1:]):
+            out.append(_stringify(fn(state)))
+            out.append(lit)
+        return "".join(out)
+    return render
+
+
+def precompile_templates(val: Any) -> None:
+    """Parse the templates in node params ahead of execution (workflow plans call this once per version)."""
+    if isinstance(val, dict):
+        if isinstance(val.get("$toNameList"), str):
+            _compile_expr(val["$toNameList"])
+        for v in val.values():
+            precompile_templates(v)
+    elif isinstance(val, list):
+        for v in val:
+            precompile_templates(v)
+    elif isinstance(val, str) and "{" in val:
+        _compile_template(val)
 
 
 def _to_name(x: Any) -> str:
@@ -294,19 +506,10 @@ def _render_value(val: Any, state: dict) -> Any:
     if isinstance(val, list):
         return [_render_value(v, state) for v in val]
     if isinstance(val, str):
-        # 单一表达式直接返回原类型
-        m = _TPL_PATTERN.fullmatch(val.strip())
-        if m:
-            resolved = _resolve_expr(m.group(1), state)
-            return resolved
-        # 内嵌模板，最终还是字符串
-        def repl(match: re.Match) -> str:
-            expr = match.group(1)
-            res = _resolve_expr(expr, state)
-            if isinstance(res, (dict, list)):
-                return str(res)
-            return "" if res is None else str(res)
-        return _TPL_PATTERN.sub(repl, val)
+        if "{" not in val:
+            return val
+        # Parsed once per distinct template (see _compile_template)
+        return _compile_template(val)(state)
     return val
 
 
@@ -333,7 +536,50 @@ def _get_from_state(path_expr: Any, state: dict) -> Any:
     return path_expr
 
 
-@register_node("Card.Read")
+def _target_card_key(state: dict, target: Any) -> str:
+    """Resource key of a '$self' / card_id target."""
+    if target in ("$self", None):
+        return f"card:{int((state.get('scope') or {})['card_id'])}"
+    return f"card:{int(target)}"
+
+
+def _state_card_key(state: dict) -> str:
+    """Resource key of the card in state['card']."""
+    card = state.get("card")
+    if not isinstance(card, Card):
+        raise ValueError("no current card")
+    return f"card:{int(card.id)}"
+
+
+def _access_card_read(state: dict, params: dict) -> Tuple[Set[str], Set[str]]:
+    return {_target_card_key(state, params.get("target", "$self"))}, set()
+
+
+def _access_card_modify_content(state: dict, params: dict) -> Tuple[Set[str], Set[str]]:
+    return set(), {_state_card_key(state)}
+
+
+def _access_card_upsert_child(state: dict, params: dict) -> Tuple[Set[str], Set[str]]:
+    # Children are matched by (parent, type, title): writers under one parent are serialized
+    parent = state.get("card")
+    parent_spec = params.get("parent") or ("$self" if isinstance(parent, Card) else "$projectRoot")
+    if parent_spec == "$self":
+        return set(), {f"children:{_state_card_key(state)[len('card:'):]}"}
+    if parent_spec in ("$root", "$projectRoot", "$project_root"):
+        project_id = parent.project_id if isinstance(parent, Card) else int((state.get("scope") or {})["project_id"])
+        return set(), {f"children:root:{int(project_id)}"}
+    return set(), {f"children:{int(parent_spec)}"}
+
+
+def _access_card_clear_fields(state: dict, params: dict) -> Tuple[Set[str], Set[str]]:
+    return set(), {_target_card_key(state, params.get("target", "$self"))}
+
+
+def _access_card_replace_field_text(state: dict, params: dict) -> Tuple[Set[str], Set[str]]:
+    return set(), {_target_card_key(state, params["card_id"])}
+
+
+@register_node("Card.Read", access=_access_card_read)
 def node_card_read(session: Session, state: dict, params: dict) -> dict:
     """
     Card.Read: Read anchor card or specified card_id, write to state['card'] and return {'card': Card}
@@ -349,10 +595,10 @@ def node_card_read(session: Session, state: dict, params: dict) -> dict:
         scope = state.get("scope") or {}
         card_id = scope.get("card_id")
         if card_id:
-            card = _get_card_by_id(session, card_id)
+            card = _load_card(session, state, card_id)
     else:
         try:
-            card = _get_card_by_id(session, int(target))
+            card = _load_card(session, state, int(target))
         except Exception:
             card = None
     
@@ -389,7 +635,7 @@ def node_card_read(session: Session, state: dict, params: dict) -> dict:
     }
 
 
-@register_node("Card.ModifyContent")
+@register_node("Card.ModifyContent", access=_access_card_modify_content)
 def node_card_modify_content(session: Session, state: dict, params: dict) -> dict:
     """
     Card.ModifyContent: Shallow merge params['contentMerge'](dict) into current card.content
@@ -431,10 +677,7 @@ def node_card_modify_content(session: Session, state: dict, params: dict) -> dic
         _set_by_path(base, content_path, value)
         
         # Save
-        card.content = base
-        session.add(card)
-        session.commit()
-        session.refresh(card)
+        card = _save_card(session, state, card, content=base)
         logger.info(f"[Node] Set content by path card_id={card.id} path={set_path} value={value}")
         # Mark affected cards
         try:
@@ -455,10 +698,7 @@ def node_card_modify_content(session: Session, state: dict, params: dict) -> dic
     # Use deep copy to avoid modifying original object
     base = copy.deepcopy(dict(card.content or {}))
     base.update(content_merge)
-    card.content = base
-    session.add(card)
-    session.commit()
-    session.refresh(card)
+    card = _save_card(session, state, card, content=base)
     # Mark affected cards
     try:
         touched2: set = state.setdefault("touched_card_ids", set())  # type: ignore[assignment]
@@ -471,7 +711,7 @@ def node_card_modify_content(session: Session, state: dict, params: dict) -> dic
     return {"card": card}
 
 
-@register_node("Card.UpsertChildByTitle")
+@register_node("Card.UpsertChildByTitle", access=_access_card_upsert_child)
 def node_card_upsert_child_by_title(session: Session, state: dict, params: dict) -> dict:
     """
     Card.UpsertChildByTitle: Create/Update child card by title under target parent card.
@@ -524,20 +764,24 @@ def node_card_upsert_child_by_title(session: Session, state: dict, params: dict)
             project_id = int(scope.get("project_id"))
         target_parent_id = None
     else:
-        p = _get_card_by_id(session, int(parent_spec))
+        p = _load_card(session, state, int(parent_spec))
         if not p:
             raise ValueError(f"Parent card not found: {parent_spec}")
         target_parent_id = p.id
         project_id = p.project_id
 
     # Check existing same parent, same type, same title (avoid misjudging different type same name cards)
-    existing = session.exec(
-        select(Card).where(
-            Card.project_id == project_id,
-            Card.parent_id == target_parent_id,
-            Card.card_type_id == ct.id,
-        )
-    ).all()
+    uow = state.get(UNIT_OF_WORK_KEY)
+    if uow is not None:
+        existing = uow.children(session, project_id, target_parent_id, ct.id)
+    else:
+        existing = session.exec(
+            select(Card).where(
+                Card.project_id == project_id,
+                Card.parent_id == target_parent_id,
+                Card.card_type_id == ct.id,
+            )
+        ).all()
     target = next((c for c in existing if str(c.title) == str(title)), None)
 
     use_item = bool(params.get("useItemAsContent"))
@@ -562,11 +806,7 @@ def node_card_upsert_child_by_title(session: Session, state: dict, params: dict)
             content = {**base, **(cm or {})}
 
     if target:
-        target.content = content
-        session.add(target)
-        session.commit()
-        session.refresh(target)
-        result = target
+        result = _save_card(session, state, target, content=content)
         logger.info(f"[Node] Child card updated parent_id={target_parent_id} title={title} card_id={target.id}")
     else:
         new_card = Card(
@@ -581,10 +821,7 @@ def node_card_upsert_child_by_title(session: Session, state: dict, params: dict)
             display_order=len(existing),
             ai_context_template=ct.default_ai_context_template,
         )
-        session.add(new_card)
-        session.commit()
-        session.refresh(new_card)
-        result = new_card
+        result = _insert_card(session, state, new_card)
         logger.info(f"[Node] Child card created parent_id={target_parent_id} title={title} card_id={new_card.id}")
 
     state["last_child"] = result
@@ -600,6 +837,106 @@ def node_card_upsert_child_by_title(session: Session, state: dict, params: dict)
     return {"card": result}
 
 
+def _loop_concurrency(params: dict) -> int:
+    try:
+        n = int(params.get("concurrency") or 1)
+    except (TypeError, ValueError):
+        n = 1
+    return max(1, min(n, WORKFLOW_LOOP_MAX_CONCURRENCY))
+
+
+def _run_iterations(label: str, session: Session, state: dict, params: dict, items: List[dict],
+                    run_body: Callable[[dict, Session], None]) -> None:
+    """
+    Run a loop body once per item.
+
+    With concurrency 1 (default) iterations run in order on the loop's state and session.
+    Otherwise up to `concurrency` iterations run at once, each in its own thread and session
+    on a shallow copy of the loop state (copy-on-write: nodes replace state keys, they do not
+    mutate shared values) with a private touched_card_ids set, and body nodes hold the
+    resources they write in the run's ResourceLocks (created here when the state has none).
+    Touched card ids of every finished iteration are merged into the loop state. With
+    ordered (default), the other state keys iterations set
+    are merged in item order once all have finished, so the loop leaves the same state as a
+    sequential run, and the error raised is the one of the first failed item; unordered
+    merges in completion order and fails at the first error. After a failure no further
+    iteration starts. Writes of several iterations to one card still reach the database in
+    completion order; keep such merges out of concurrent bodies when their order matters.
+
+    Args:
+        label: Loop node type (logs).
+        session: Loop session.
+        state: Loop state.
+        params: Loop params ("concurrency", "ordered").
+        items: state["item"] of each iteration.
+        run_body: Executes the body nodes on (iteration state, iteration session).
+    """
+    concurrency = min(_loop_concurrency(params), len(items))
+    if concurrency <= 1:
+        for item in items:
+            state["item"] = item
+            logger.info(f"[Node] {label} index={item['index']} (Total {len(items)})")
+            run_body(state, session)
+        return
+
+    ordered = params.get("ordered", True) is not False
+    state.setdefault(RESOURCE_LOCKS_KEY, ResourceLocks())
+    touched: set = state.setdefault("touched_card_ids", set())  # type: ignore[assignment]
+    merge_lock = threading.Lock()
+    stop = threading.Event()
+    bind = session.get_bind()
+    # index in items -> state keys the iteration set
+    results: Dict[int, Dict[str, Any]] = {}
+    errors: Dict[int, BaseException] = {}
+
+    def iteration(pos: int) -> None:
+        if stop.is_set():
+            return
+        item = items[pos]
+        scope = dict(state)
+        scope["item"] = item
+        scope["touched_card_ids"] = set()
+        _iteration.concurrent = True
+        try:
+            with Session(bind) as iter_session:
+                attach_state_cards(iter_session, scope)
+                logger.info(f"[Node] {label} index={item['index']} (Total {len(items)}, concurrency {concurrency})")
+                try:
+                    run_body(scope, iter_session)
+                finally:
+                    with merge_lock:
+                        touched.update(scope["touched_card_ids"])
+                changed = {k: v for k, v in scope.items() if k != "touched_card_ids" and state.get(k) is not v}
+                with merge_lock:
+                    if ordered:
+                        results[pos] = changed
+                    else:
+                        state.update(changed)
+        except BaseException as e:
+            with merge_lock:
+                errors[pos] = e
+            stop.set()
+            raise
+        finally:
+            _iteration.concurrent = False
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="workflow-loop") as pool:
+        futures: List[Future] = [pool.submit(iteration, pos) for pos in range(len(items))]
+        wait(futures, return_when=FIRST_EXCEPTION)
+        if stop.is_set():
+            for f in futures:
+                f.cancel()
+    if ordered:
+        for pos in sorted(results):
+            if errors and pos > min(errors):
+                break
+            state.update(results[pos])
+    # Cards merged from iterations are bound to their closed sessions
+    attach_state_cards(session, state)
+    if errors:
+        raise errors[min(errors)] if ordered else next(iter(errors.values()))
+
+
 @register_node("List.ForEach")
 def node_list_foreach(session: Session, state: dict, params: dict, run_body):
     """
@@ -607,6 +944,8 @@ def node_list_foreach(session: Session, state: dict, params: dict, run_body):
     params:
       - listPath: string e.g., "$.content.character_cards"
       - list: Any (Compatibility: string path or direct array)
+      - concurrency: int default 1 (iterations running at the same time, see _run_iterations)
+      - ordered: bool default true
     """
     list_path = params.get("listPath")
     seq: Any = None
@@ -633,10 +972,8 @@ def node_list_foreach(session: Session, state: dict, params: dict, run_body):
         logger.warning(f"[Node] List.ForEach value not list path={list_path}")
         return
     logger.info(f"[Node] List.ForEach parsed, length={len(seq)}")
-    for idx, it in enumerate(seq, start=1):
-        state["item"] = {"index": idx, **(it if isinstance(it, dict) else {"value": it})}
-        logger.info(f"[Node] List.ForEach index={idx}")
-        run_body()
+    items = [{"index": idx, **(it if isinstance(it, dict) else {"value": it})} for idx, it in enumerate(seq, start=1)]
+    _run_iterations("List.ForEach", session, state, params, items, run_body)
 
 
 @register_node("List.ForEachRange")
@@ -646,6 +983,8 @@ def node_list_foreach_range(session: Session, state: dict, params: dict, run_bod
     params:
       - countPath: string e.g., "$.content.stage_count"
       - start: int default 1
+      - concurrency: int default 1 (iterations running at the same time, see _run_iterations)
+      - ordered: bool default true
     """
     count_path = params.get("countPath")
     if not isinstance(count_path, str):
@@ -664,13 +1003,11 @@ def node_list_foreach_range(session: Session, state: dict, params: dict, run_bod
         return
     
     start = int(params.get("start", 1) or 1)
-    for i in range(start, start + n):
-        state["item"] = {"index": i}
-        logger.info(f"[Node] List.ForEachRange index={i} (Total {n})")
-        run_body()
+    items = [{"index": i} for i in range(start, start + n)]
+    _run_iterations("List.ForEachRange", session, state, params, items, run_body)
 
 
-@register_node("Card.ClearFields")
+@register_node("Card.ClearFields", access=_access_card_clear_fields)
 def node_card_clear_fields(session: Session, state: Dict[str, Any], params: Dict[str, Any]) -> None:
     """
     Card.ClearFields: Clear specified fields of a card
@@ -690,7 +1027,7 @@ def node_card_clear_fields(session: Session, state: Dict[str, Any], params: Dict
         logger.warning(f"[Card.ClearFields] Invalid target card: {target}")
         return
         
-    card = _get_card_by_id(session, target_id)
+    card = _load_card(session, state, target_id)
     if not card:
         logger.warning(f"[Card.ClearFields] Card not found: {target_id}")
         return
@@ -707,16 +1044,14 @@ def node_card_clear_fields(session: Session, state: Dict[str, Any], params: Dict
         if isinstance(field_path, str) and field_path.startswith("$."):
             _set_by_path({"$": content}, field_path, None)
     
-    card.content = content
-    session.add(card)
-    session.commit()
+    _save_card(session, state, card, content=content)
     
     # Record affected card
     if "touched_card_ids" in state:
         state["touched_card_ids"].add(target_id)
 
 
-@register_node("Card.ReplaceFieldText")
+@register_node("Card.ReplaceFieldText", access=_access_card_replace_field_text)
 def node_card_replace_field_text(session: Session, state: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
     """
     Card.ReplaceFieldText: Replace specified text fragment in card field
@@ -749,7 +1084,7 @@ def node_card_replace_field_text(session: Session, state: Dict[str, Any], params
         return {"success": False, "error": "Missing old_text parameter"}
     
     # Get card
-    card = _get_card_by_id(session, int(card_id))
+    card = _load_card(session, state, int(card_id))
     if not card:
         return {"success": False, "error": f"Card {card_id} not found"}
     
@@ -875,10 +1210,7 @@ def node_card_replace_field_text(session: Session, state: Dict[str, Any], params
     # Set final field value
     current_dict[field_parts[-1]] = updated_value
     
-    card.content = content
-    session.add(card)
-    session.commit()
-    session.refresh(card)
+    card = _save_card(session, state, card, content=content)
     
     # Record affected card
     if "touched_card_ids" in state:
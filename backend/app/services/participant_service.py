@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from loguru import logger
+from sqlmodel import Session, select
+
+from app.db.models import Card, CardType
+from app.services.context_cache import revision_snapshot
+from app.services.kg_provider import KnowledgeGraphProvider, get_provider
+from app.services.name_matcher import NameMatcher
+
+
+# Card types whose titles are entity names (current English names and legacy Chinese ones)
+ENTITY_CARD_TYPES = ("CharacterCard", "角色卡", "OrganizationCard", "组织卡", "SceneCard", "场景卡")
+DEFAULT_MAX_PARTICIPANTS = 12
+
+# project_id -> (revision key, matcher)
+_matchers: Dict[int, Tuple[Tuple[Hashable, ...], NameMatcher]] = {}
+_lock = threading.Lock()
+
+
+def _revision_key(session: Session, project_id: int, graph: KnowledgeGraphProvider) -> Tuple[Tuple[int, ...], Tuple[Hashable, ...]]:
+    type_ids = tuple(sorted(session.exec(select(CardType.id).where(CardType.name.in_(ENTITY_CARD_TYPES))).all()))
+    gen = getattr(graph, "generation", None)
+    snap = revision_snapshot(project_id, gen(project_id) if callable(gen) else -1)
+    return type_ids, (snap["graph"],) + tuple(snap.get(tid, 0) for tid in type_ids)
+
+
+def get_entity_matcher(session: Session, project_id: int, graph: Optional[KnowledgeGraphProvider] = None) -> NameMatcher:
+    """
+    Compiled matcher over a project's entity cards and graph aliases.
+
+    Covers character, organization and scene card titles (and content names) plus every
+    alias recorded in the graph. Rebuilt only when a card of those types commits or the
+    project's graph generation changes; otherwise the compiled automaton is reused.
+
+    Args:
+        session: Database session.
+        project_id: Project ID.
+        graph: Provider to read aliases from (defaults to the active provider).
+
+    Returns:
+        NameMatcher mapping titles, names and aliases to canonical names.
+    """
+    graph = graph or get_provider()
+    type_ids, rev = _revision_key(session, project_id, graph)
+    cached = _matchers.get(project_id)
+    if cached is not None and cached[0] == rev and rev[0] >= 0:
+        return cached[1]
+
+    try:
+        aliases = graph.get_alias_table(project_id)
+    except Exception as e:
+        logger.warning(f"Failed to load alias table for project {project_id}: {e}")
+        aliases = {}
+    mapping: Dict[str, str] = dict(aliases)
+    cards = session.exec(select(Card).where(Card.project_id == project_id, Card.card_type_id.in_(type_ids))).all() if type_ids else []
+    for card in cards:
+        content = card.content if isinstance(card.content, dict) else {}
+        name = str(content.get("name") or card.title or "").strip()
+        if not name:
+            continue
+        canonical = aliases.get(name, name)
+        for surface in (card.title, name):
+            if surface:
+                mapping.setdefault(surface.strip(), canonical)
+    matcher = NameMatcher.from_aliases([], mapping)
+    with _lock:
+        _matchers[project_id] = (rev, matcher)
+    return matcher
+
+
+def rank_mentions(matcher: NameMatcher, text: str, limit: int = DEFAULT_MAX_PARTICIPANTS) -> List[str]:
+    """
+    Entities mentioned in text, ranked by mention frequency weighted towards the end.
+
+    A mention counts between 0.5 (start of the text) and 1.0 (end of the text), so an
+    entity named often and recently ranks first; ties go to the latest mention.
+
+    Args:
+        matcher: Compiled entity matcher.
+        text: Text to scan.
+        limit: Maximum number of entities returned.
+
+    Returns:
+        Canonical names, best first.
+    """
+    n = len(text or "")
+    if not n:
+        return []
+    scores: Dict[str, float] = {}
+    last: Dict[str, int] = {}
+    for _, end, canonical in matcher.find_all(text):
+        scores[canonical] = scores.get(canonical, 0.0) + 0.5 + 0.5 * end / n
+        last[canonical] = end
+    ranked = sorted(scores, key=lambda name: (scores[name], last[name]), reverse=True)
+    return ranked[: max(0, limit)]
+
+
+def detect_participants(session: Session, project_id: int, text: str, limit: int = DEFAULT_MAX_PARTICIPANTS) -> List[str]:
+    """
+    Detect the entities a text is about (see rank_mentions).
+
+    Args:
+        session: Database session.
+        project_id: Project ID.
+        text: Draft or chapter text.
+        limit: Maximum number of entities returned.
+
+    Returns:
+        Canonical entity names, best first.
+    """
+    if not text or not project_id:
+        return []
+    return rank_mentions(get_entity_matcher(session, project_id), text, limit)
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from app.db.models import Card, CardType
+from app.services.kg_provider import chapter_key
+
+
+# Card type names of chapter bodies (current English name and legacy Chinese one)
+CHAPTER_CARD_TYPES = ("Chapter", "章节正文")
+# Passages shorter than this are merged with the next paragraph; longer ones are split
+MIN_PASSAGE_CHARS = 80
+MAX_PASSAGE_CHARS = 600
+# Only the most selective query terms are scored; common bigrams add cost, not ranking
+MAX_QUERY_TERMS = 48
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_CJK = "\u3400-\u4DBF\u4E00-\u9FFF\uF900-\uFAFF"
+_TOKEN_RE = re.compile(f"([{_CJK}]+)|([A-Za-z0-9]+)")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenize mixed CJK / Latin text for lexical retrieval.
+
+    CJK runs become overlapping character bigrams (a lone character stays a unigram);
+    Latin words and numbers are lowercased whole words.
+    """
+    tokens: List[str] = []
+    for m in _TOKEN_RE.finditer(text or ""):
+        cjk, word = m.groups()
+        if word:
+            tokens.append(word.lower())
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+def split_passages(text: str) -> List[str]:
+    """Split chapter text into passages of roughly MIN..MAX_PASSAGE_CHARS along paragraphs."""
+    passages: List[str] = []
+    buf = ""
+    for para in (p.strip() for p in (text or "").split("\n")):
+        if not para:
+            continue
+        while len(para) > MAX_PASSAGE_CHARS:
+            if buf:
+                passages.append(buf)
+                buf = ""
+            passages.append(para[:MAX_PASSAGE_CHARS])
+            para = para[MAX_PASSAGE_CHARS:]
+        buf = f"{buf}\n{para}" if buf else para
+        if len(buf) >= MIN_PASSAGE_CHARS:
+            passages.append(buf)
+            buf = ""
+    if buf:
+        passages.append(buf)
+    return passages
+
+
+@dataclass
+class Passage:
+    """
+    Indexed piece of a chapter.
+
+    Attributes:
+        card_id: Chapter card ID.
+        title: Chapter title.
+        ordinal: Chapter ordinal (chapter_key), None if the chapter has no number.
+        position: Index of the passage within the chapter.
+        text: Passage text.
+        length: Number of tokens.
+    """
+    card_id: int
+    title: str
+    ordinal: Optional[int]
+    position: int
+    text: str
+    length: int
+
+
+class PassageIndex:
+    """
+    In-memory BM25 inverted index over the passages of a project's chapters.
+
+    Chapters are added and removed as units, so a saved chapter only re-indexes itself.
+    """
+    def __init__(self) -> None:
+        self.passages: Dict[int, Passage] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.by_card: Dict[int, List[int]] = {}
+        self.total_length = 0
+        self._next_id = 0
+        # passage id -> BM25 length normalization, recomputed after changes
+        self._norms: Optional[Dict[int, float]] = None
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def add_chapter(self, card_id: int, title: str, ordinal: Optional[int], text: str) -> None:
+        """(Re)index a chapter."""
+        self.remove_chapter(card_id)
+        ids: List[int] = []
+        for position, chunk in enumerate(split_passages(text)):
+            counts = Counter(tokenize(chunk))
+            if not counts:
+                continue
+            pid = self._next_id
+            self._next_id += 1
+            length = sum(counts.values())
+            self.passages[pid] = Passage(card_id, title, ordinal, position, chunk, length)
+            self.total_length += length
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[pid] = tf
+            ids.append(pid)
+        if ids:
+            self.by_card[card_id] = ids
+        self._norms = None
+
+    def remove_chapter(self, card_id: int) -> None:
+        """Drop a chapter's passages."""
+        ids = self.by_card.pop(card_id, None)
+        if not ids:
+            return
+        for pid in ids:
+            passage = self.passages.pop(pid)
+            self.total_length -= passage.length
+            for term in set(tokenize(passage.text)):
+                plist = self.postings.get(term)
+                if plist is not None:
+                    plist.pop(pid, None)
+                    if not plist:
+                        del self.postings[term]
+        self._norms = None
+
+    def _length_norms(self) -> Dict[int, float]:
+        if self._norms is None:
+            avg = (self.total_length / len(self.passages)) if self.passages else 1.0
+            self._norms = {
+                pid: BM25_K1 * (1 - BM25_B + BM25_B * p.length / avg) for pid, p in self.passages.items()
+            }
+        return self._norms
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        before_ordinal: Optional[int] = None,
+        exclude_cards: Iterable[int] = (),
+    ) -> List[Tuple[float, Passage]]:
+        """
+        BM25 top-k passages for a query.
+
+        Args:
+            query: Query text.
+            top_k: Number of passages returned.
+            before_ordinal: Only chapters with a smaller ordinal (earlier chapters).
+            exclude_cards: Chapter card IDs to leave out.
+
+        Returns:
+            (score, passage) pairs, best first.
+        """
+        n = len(self.passages)
+        if not n or top_k <= 0:
+            return []
+        terms: List[Tuple[float, Dict[int, int]]] = []
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if plist:
+                df = len(plist)
+                terms.append((math.log(1 + (n - df + 0.5) / (df + 0.5)), plist))
+        terms = heapq.nlargest(MAX_QUERY_TERMS, terms, key=lambda t: t[0])
+        norms = self._length_norms()
+        scores: Dict[int, float] = {}
+        for idf, plist in terms:
+            for pid, tf in plist.items():
+                scores[pid] = scores.get(pid, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norms[pid])
+        excluded: Set[int] = set(exclude_cards)
+
+        def allowed(pid: int) -> bool:
+            p = self.passages[pid]
+            if p.card_id in excluded:
+                return False
+            return before_ordinal is None or (p.ordinal is not None and p.ordinal < before_ordinal)
+
+        best = heapq.nlargest(top_k, (pid for pid in scores if allowed(pid)), key=scores.__getitem__)
+        return [(scores[pid], self.passages[pid]) for pid in best]
+
+
+# ---- per-project registry ----
+_indexes: Dict[int, PassageIndex] = {}
+# project_id -> card ids committed since the index was last refreshed (present while tracked)
+_dirty: Dict[int, Set[int]] = {}
+_lock = threading.Lock()
+# project_id -> lock serializing that project's index build, refreshes and searches (indexes
+# are plain dicts); other projects are not held up
+_index_locks: Dict[int, threading.Lock] = {}
+_PENDING_KEY = "passage_index.pending"
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_changes(session, flush_context) -> None:
+    pending = session.info.setdefault(_PENDING_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Card) and obj.project_id is not None and obj.id is not None:
+            pending.add((obj.project_id, obj.id))
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _mark_dirty(session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        mark_dirty(pending)
+
+
+def mark_dirty(changes: Iterable[Tuple[int, int]]) -> None:
+    """Queue committed cards for re-indexing (also those committed by worker processes)."""
+    with _lock:
+        for project_id, card_id in changes:
+            if project_id in _dirty:
+                _dirty[project_id].add(card_id)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _drop_pending(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _index_lock(project_id: int) -> threading.Lock:
+    with _lock:
+        lock = _index_locks.get(project_id)
+        if lock is None:
+            lock = _index_locks[project_id] = threading.Lock()
+        return lock
+
+
+def _chapter_type_ids(session: Session) -> List[int]:
+    return list(session.exec(select(CardType.id).where(CardType.name.in_(CHAPTER_CARD_TYPES))).all())
+
+
+def _index_card(index: PassageIndex, card: Card) -> None:
+    content = card.content if isinstance(card.content, dict) else {}
+    index.add_chapter(
+        card.id,
+        card.title,
+        chapter_key(content.get("volume_number"), content.get("chapter_number")),
+        str(content.get("content") or ""),
+    )
+
+
+def _refresh(session: Session, project_id: int) -> PassageIndex:
+    # Caller holds _index_lock(project_id)
+    index = _indexes.get(project_id)
+    if index is None:
+        # Track commits from now on, so chapters saved during the build are re-indexed after it
+        with _lock:
+            _dirty[project_id] = set()
+        index = PassageIndex()
+        type_ids = _chapter_type_ids(session)
+        cards = session.exec(select(Card).where(Card.project_id == project_id, Card.card_type_id.in_(type_ids))).all() if type_ids else []
+        for card in cards:
+            _index_card(index, card)
+        _indexes[project_id] = index
+        logger.info(f"[PassageIndex] project={project_id} chapters={len(index.by_card)} passages={len(index)}")
+    with _lock:
+        dirty = _dirty.get(project_id) or set()
+        _dirty[project_id] = set()
+    if dirty:
+        type_ids = set(_chapter_type_ids(session))
+        for card_id in dirty:
+            card = session.get(Card, card_id)
+            if card is None or card.project_id != project_id or card.card_type_id not in type_ids:
+                index.remove_chapter(card_id)
+            else:
+                _index_card(index, card)
+    return index
+
+
+def get_passage_index(session: Session, project_id: int) -> PassageIndex:
+    """
+    BM25 index of a project's chapters.
+
+    Built on first use; afterwards only chapters committed since the last call are
+    re-indexed.
+
+    Args:
+        session: Database session.
+        project_id: Project ID.
+
+    Returns:
+        PassageIndex of the project.
+    """
+    with _index_lock(project_id):
+        return _refresh(session, project_id)
+
+
+def drop_passage_index(project_id: int) -> None:
+    """Forget a project's index (rebuilt on next use)."""
+    with _index_lock(project_id), _lock:
+        _indexes.pop(project_id, None)
+        _dirty.pop(project_id, None)
+
+
+def search_passages(
+    session: Session,
+    project_id: int,
+    query: str,
+    top_k: int = 5,
+    before_ordinal: Optional[int] = None,
+    exclude_cards: Iterable[int] = (),
+) -> List[Dict[str, object]]:
+    """
+    Retrieve the chapter passages most relevant to a query (see PassageIndex.search).
+
+    Returns:
+        List of {card_id, title, ordinal, position, score, text}, best first.
+    """
+    if not project_id or not (query or "").strip():
+        return []
+    with _index_lock(project_id):
+        hits = _refresh(session, project_id).search(query, top_k, before_ordinal, exclude_cards)
+    return [
+        {
+            "card_id": p.card_id,
+            "title": p.title,
+            "ordinal": p.ordinal,
+            "position": p.position,
+            "score": round(score, 4),
+            "text": p.text,
+        }
+        for score, p in hits
+    ]
@@ -1,12 +1,15 @@
 
 from typing import List, Optional
 from sqlmodel import Session, select
+from loguru import logger
 
 from app.db.models import Project, Workflow
 from app.services import workflow_triggers
 from app.schemas.project import ProjectCreate, ProjectUpdate
 from app.services.card_service import CardService
-from app.services.kg_provider import get_provider
+from app.services.graph_delete_jobs import schedule_project_graph_delete
+from app.services.context_cache import context_cache
+from app.services import passage_index
 
 
 FREE_PROJECT_NAME = "__free__"
@@ -149,11 +152,12 @@ def delete_project(session: Session, project_id: int) -> bool:
     # Delete project record from DB first
     session.delete(project)
     session.commit()
-    # Then clean up all entities and relations of this project in Graph DB
+    context_cache.invalidate(project_id)
+    passage_index.drop_passage_index(project_id)
+    # Then clean up all entities and relations of this project in Graph DB, in the background
     try:
-        kg = get_provider()
-        kg.delete_project_graph(project_id)
-    except Exception:
+        schedule_project_graph_delete(session, project_id)
+    except Exception as e:
         # Avoid affecting main flow when Graph DB is unavailable
-        pass
+        logger.warning(f"Failed to schedule graph deletion for project {project_id}: {e}")
     return True
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+
+_TOKEN_REGEX = re.compile(
+    r"""
+    ([A-Za-z]+)               # English word (consecutive letters count as 1)
+    |([0-9])                 # 1 digit counts as 1
+    |([\u4E00-\u9FFF])       # Single Chinese char counts as 1
+    |(\S)                     # Other non-whitespace symbol/punctuation counts as 1
+    """,
+    re.VERBOSE,
+)
+
+TokenCounter = Callable[[str], int]
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate tokens by rule:
+    - 1 Chinese char = 1
+    - 1 English word = 1
+    - 1 digit = 1
+    - 1 symbol = 1
+    Whitespace ignored.
+    """
+    if not text:
+        return 0
+    try:
+        return sum(1 for _ in _TOKEN_REGEX.finditer(text))
+    except Exception:
+        # Fallback: Count non-whitespace chars
+        return sum(1 for ch in (text or "") if not ch.isspace())
+
+
+# Encodings loaded at startup (warm_up): cl100k_base for unknown models, o200k_base for gpt-4o and later
+WARM_ENCODINGS = ("cl100k_base", "o200k_base")
+
+_enc_lock = threading.Lock()
+_encodings: Dict[str, Any] = {}
+_loading: Set[str] = set()
+_unavailable: Set[str] = set()
+
+
+def _load_encodings(names: List[str]) -> None:
+    import tiktoken  # type: ignore
+
+    for name in names:
+        try:
+            enc = tiktoken.get_encoding(name)
+        except Exception as e:
+            # Encodings are downloaded on first use (cached in TIKTOKEN_CACHE_DIR); offline
+            # installs without a cache keep estimating
+            logger.warning(f"tiktoken encoding {name} unavailable, estimating tokens: {e}")
+            enc = None
+        with _enc_lock:
+            _loading.discard(name)
+            if enc is None:
+                _unavailable.add(name)
+            else:
+                _encodings[name] = enc
+
+
+def load_encodings_async(names: Iterable[str]) -> None:
+    """Load tiktoken encodings in a background thread (skips loaded, loading and failed ones)."""
+    with _enc_lock:
+        todo = [n for n in dict.fromkeys(names) if n not in _encodings and n not in _loading and n not in _unavailable]
+        _loading.update(todo)
+    if todo:
+        threading.Thread(target=_load_encodings, args=(todo,), name="tiktoken-load", daemon=True).start()
+
+
+def warm_up() -> None:
+    """Start loading the common encodings off the request path (call at startup)."""
+    try:
+        import tiktoken  # type: ignore  # noqa: F401
+    except ImportError:
+        return
+    load_encodings_async(WARM_ENCODINGS)
+
+
+@lru_cache(maxsize=256)
+def _encoding_name(model_name: Optional[str]) -> Optional[str]:
+    try:
+        import tiktoken  # type: ignore
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_name_for_model(model_name or "")
+    except KeyError:
+        return "cl100k_base"
+
+
+def _tiktoken_encoding(model_name: Optional[str]):
+    """
+    tiktoken encoding for a model (cl100k_base for unknown models), or None if unavailable.
+
+    Never loads on the calling thread: an encoding that is not loaded yet is queued for the
+    background loader and None (estimate) is returned until it is ready.
+    """
+    name = _encoding_name(model_name)
+    if name is None:
+        return None
+    enc = _encodings.get(name)
+    if enc is None:
+        load_encodings_async([name])
+    return enc
+
+
+def get_token_counter(model_name: Optional[str] = None) -> Tuple[TokenCounter, str]:
+    """
+    Token counter for a model.
+
+    Uses the model's tiktoken encoding when tiktoken is installed (cl100k_base for models
+    tiktoken does not know), otherwise estimate_tokens; also while the encoding is still
+    loading in the background.
+
+    Args:
+        model_name: LLM model name (LLMConfig.model_name).
+
+    Returns:
+        (counter, tokenizer name).
+    """
+    enc = _tiktoken_encoding(model_name)
+    if enc is None:
+        return estimate_tokens, "estimate"
+    return (lambda text: len(enc.encode(text or "", disallowed_special=())) if text else 0), enc.name
+
+
+def truncate_to_tokens(text: str, max_tokens: int, count: TokenCounter, marker: str = "…") -> str:
+    """
+    Longest prefix of text (plus marker) that fits in max_tokens.
+
+    Binary search over the prefix length, so it is exact for any counter.
+
+    Returns:
+        Truncated text, or "" if not even the marker fits.
+    """
+    if count(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count(text[:mid] + marker) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    if lo == 0:
+        return ""
+    return text[:lo].rstrip() + marker
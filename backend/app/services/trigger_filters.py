@@ -0,0 +1,215 @@
+"""
+Workflow trigger filters (WorkflowTrigger.filter_json).
+
+A filter is a JSON object whose entries must all hold:
+
+    {"content.stage_number": 2}                          path equals value
+    {"content.status": {"in": ["draft", "review"]}}      path operator(s)
+    {"title": {"regex": "^Chapter"}}
+    {"changed": ["content.chapter_outline_list", "title"]}  any of these fields changed in this save
+    {"any": [{...}, {...}]}, {"all": [...]}, {"not": {...}}
+
+Paths are dotted (a leading "$." is accepted) into the saved card: title, content, parent_id,
+project_id, card_type (name); list items are addressed by index ("content.items.0.name").
+Operators: eq, ne, in, nin, gt, gte, lt, lte, exists, contains, regex.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+_MISSING = object()
+_OPERATORS = ("eq", "ne", "in", "nin", "gt", "gte", "lt", "lte", "exists", "contains", "regex")
+
+# (card view, lazily computed changed paths or None when unknown) -> matched
+Predicate = Callable[[Dict[str, Any], Callable[[], Optional[Set[str]]]], bool]
+
+
+@dataclass(frozen=True)
+class CompiledFilter:
+    """
+    Compiled trigger filter.
+
+    Attributes:
+        match: Predicate over (card view, changed paths getter).
+        uses_changes: Whether the filter reads the changed fields of the save.
+    """
+    match: Predicate
+    uses_changes: bool
+
+
+def _split_path(path: str) -> Tuple[str, ...]:
+    p = path.strip()
+    if p.startswith("$."):
+        p = p[2:]
+    parts = tuple(x for x in p.split(".") if x)
+    if not parts:
+        raise ValueError(f"empty filter path: {path!r}")
+    return parts
+
+
+def _getter(parts: Tuple[str, ...]) -> Callable[[Dict[str, Any]], Any]:
+    def get(view: Dict[str, Any]) -> Any:
+        cur: Any = view
+        for part in parts:
+            if isinstance(cur, dict):
+                cur = cur.get(part, _MISSING)
+            elif isinstance(cur, list) and part.lstrip("-").isdigit():
+                i = int(part)
+                cur = cur[i] if -len(cur) <= i < len(cur) else _MISSING
+            else:
+                return _MISSING
+            if cur is _MISSING:
+                return _MISSING
+        return cur
+    return get
+
+
+def _compare(op: str, expected: Any) -> Callable[[Any], bool]:
+    if op == "eq":
+        return lambda v: v is not _MISSING and v == expected
+    if op == "ne":
+        return lambda v: v is _MISSING or v != expected
+    if op in ("in", "nin"):
+        if not isinstance(expected, list):
+            raise ValueError(f"'{op}' expects a list")
+        options = list(expected)
+        if op == "in":
+            return lambda v: v is not _MISSING and v in options
+        return lambda v: v is _MISSING or v not in options
+    if op in ("gt", "gte", "lt", "lte"):
+        cmp = {
+            "gt": lambda a, b: a > b,
+            "gte": lambda a, b: a >= b,
+            "lt": lambda a, b: a < b,
+            "lte": lambda a, b: a <= b,
+        }[op]
+
+        def ordered(v: Any) -> bool:
+            try:
+                return v is not _MISSING and v is not None and cmp(v, expected)
+            except TypeError:
+                return False
+        return ordered
+    if op == "exists":
+        want = bool(expected)
+        return lambda v: (v is not _MISSING and v is not None) == want
+    if op == "contains":
+        def contains(v: Any) -> bool:
+            if isinstance(v, str):
+                return isinstance(expected, str) and expected in v
+            if isinstance(v, (list, dict)):
+                return expected in v
+            return False
+        return contains
+    if op == "regex":
+        if not isinstance(expected, str):
+            raise ValueError("'regex' expects a string")
+        pattern = re.compile(expected)
+        return lambda v: isinstance(v, str) and pattern.search(v) is not None
+    raise ValueError(f"unknown filter operator: {op!r} (expected one of {', '.join(_OPERATORS)})")
+
+
+def _path_changed(wanted: Tuple[str, ...], changed: Set[str]) -> bool:
+    for path in changed:
+        got = tuple(path.split("."))
+        n = min(len(got), len(wanted))
+        # Same field, a field under it, or a parent replaced as a whole
+        if got[:n] == wanted[:n]:
+            return True
+    return False
+
+
+def _compile(spec: Any, uses: List[bool]) -> Predicate:
+    if not isinstance(spec, dict):
+        raise ValueError(f"filter must be an object, got {type(spec).__name__}")
+    checks: List[Predicate] = []
+    for key, value in spec.items():
+        if key in ("any", "all"):
+            if not isinstance(value, list):
+                raise ValueError(f"'{key}' expects a list of filters")
+            subs = [_compile(v, uses) for v in value]
+            if key == "any":
+                checks.append(lambda view, changes, subs=subs: any(s(view, changes) for s in subs))
+            else:
+                checks.append(lambda view, changes, subs=subs: all(s(view, changes) for s in subs))
+        elif key == "not":
+            sub = _compile(value, uses)
+            checks.append(lambda view, changes, sub=sub: not sub(view, changes))
+        elif key == "changed":
+            paths = [value] if isinstance(value, str) else value
+            if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+                raise ValueError("'changed' expects a field path or a list of them")
+            wanted = [_split_path(p) for p in paths]
+            uses[0] = True
+
+            def changed_any(view: Dict[str, Any], changes: Callable[[], Optional[Set[str]]], wanted=wanted) -> bool:
+                got = changes()
+                # Unknown (new card, or caller without the previous state): everything changed
+                return got is None or any(_path_changed(w, got) for w in wanted)
+            checks.append(changed_any)
+        else:
+            get = _getter(_split_path(key))
+            if isinstance(value, dict) and value and all(k in _OPERATORS for k in value):
+                tests = [_compare(op, arg) for op, arg in value.items()]
+            else:
+                tests = [_compare("eq", value)]
+            checks.append(lambda view, changes, get=get, tests=tests: all(t(get(view)) for t in tests))
+    if len(checks) == 1:
+        return checks[0]
+    return lambda view, changes: all(c(view, changes) for c in checks)
+
+
+def compile_filter(spec: Optional[dict]) -> Optional[CompiledFilter]:
+    """
+    Compile a trigger's filter_json.
+
+    Args:
+        spec: filter_json (None or {} matches every save).
+
+    Returns:
+        CompiledFilter, or None for an empty filter.
+
+    Raises:
+        ValueError: The filter is malformed.
+    """
+    if not spec:
+        return None
+    uses = [False]
+    return CompiledFilter(match=_compile(spec, uses), uses_changes=uses[0])
+
+
+def changed_paths(before: Any, after: Any, prefix: str = "") -> Set[str]:
+    """
+    Dotted paths that differ between two card states (objects are compared key by key).
+
+    Args:
+        before: Previous value.
+        after: New value.
+        prefix: Path of the values.
+
+    Returns:
+        Changed paths ("title", "content.stage_number", ...).
+    """
+    if isinstance(before, dict) and isinstance(after, dict):
+        out: Set[str] = set()
+        for key in set(before) | set(after):
+            path = f"{prefix}.{key}" if prefix else str(key)
+            out |= changed_paths(before.get(key, _MISSING), after.get(key, _MISSING), path)
+        return out
+    if before is _MISSING and after is _MISSING:
+        return set()
+    return set() if before == after else ({prefix} if prefix else {""})
+
+
+def card_view(card: Any, card_type_name: Optional[str]) -> Dict[str, Any]:
+    """Fields of a card that filter paths address."""
+    return {
+        "title": getattr(card, "title", None),
+        "content": getattr(card, "content", None) or {},
+        "parent_id": getattr(card, "parent_id", None),
+        "project_id": getattr(card, "project_id", None),
+        "card_type": card_type_name,
+    }
+
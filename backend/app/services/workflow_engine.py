@@ -1,63 +1,123 @@
 import asyncio
-from typing import AsyncIterator, Dict, Optional, Any, List, Callable
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Optional, Any, List, Callable, Set, Tuple
 from datetime import datetime
 from sqlmodel import Session, select
 
 from app.db.models import Workflow, WorkflowRun
+from app.db.session import engine as db_engine
+from app.services import card_changes
 from app.services import nodes as builtin_nodes
+from app.services import workflow_queue
+from app.services.workflow_plans import PlanNode, WorkflowPlan, plan_cache
+from app.services.workflow_events import broker, event_log
+from app.services.workflow_uow import UNIT_OF_WORK_KEY, CardUnitOfWork
 from loguru import logger
 
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Worker threads executing node bodies (shared by all runs; database work never blocks the event loop)
+WORKFLOW_NODE_THREADS = _env_int("WORKFLOW_NODE_THREADS", 8)
+# Run statuses that still produce events (a "scheduled" trigger run starts after its quiet period)
+_PENDING_STATUSES = ("scheduled", "queued", "running")
+
+
+def _conflicts(a: Tuple[Set[str], Set[str]], b: Tuple[Set[str], Set[str]]) -> bool:
+    """Whether two (reads, writes) accesses must not overlap (write/write or read/write)."""
+    def hit(x: Set[str], y: Set[str]) -> bool:
+        return bool(x and y) and (builtin_nodes.ALL_RESOURCES in x or builtin_nodes.ALL_RESOURCES in y or not x.isdisjoint(y))
+    return hit(a[1], b[0] | b[1]) or hit(b[1], a[0])
+
+
 class LocalAsyncEngine:
     """
     Minimal Local Executor (MVP)
-    - Linearly execute nodes; support List.ForEach/List.ForEachRange (body must exist)
-    - Events: step_started/step_succeeded/step_failed/run_completed
+    - Standard format (nodes+edges): DAG scheduler running independent nodes concurrently
+    - Legacy format: Linearly execute nodes; support List.ForEach/List.ForEachRange (body must exist)
+    - Events: step_started/step_succeeded/step_failed/step_skipped/run_completed; bounded replayable per-run logs,
+      or the database event broker when runs execute in worker processes (WORKFLOW_WORKER_MODE=external)
     - Normalization: Rewrites DSL for compatibility before execution (ForEach without body -> fold next node as body)
     """
 
     def __init__(self) -> None:
         self._run_tasks: Dict[int, asyncio.Task] = {}
-        self._event_queues: Dict[int, "asyncio.Queue[str]"] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Events go through the broker (set in worker processes and in the API process they serve)
+        self.broker_events = workflow_queue.WORKFLOW_WORKER_MODE == "external"
+
+    # ---------------- worker threads ----------------
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, WORKFLOW_NODE_THREADS), thread_name_prefix="workflow-node")
+        return self._executor
+
+    async def _offload(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run blocking work (node bodies, run bookkeeping) in the node thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+
+    def _publish_threadsafe(self, loop: asyncio.AbstractEventLoop, run_id: int, event: str) -> None:
+        """Publish from a worker thread; events stay ordered as they are queued on the loop."""
+        asyncio.run_coroutine_threadsafe(self._publish(run_id, event), loop)
+
+    def shutdown(self) -> None:
+        """Stop the node thread pool (running node bodies finish, queued ones are dropped)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
     # ---------------- background & events ----------------
     async def _publish(self, run_id: int, event: str) -> None:
-        """Publish an event to the run's event queue."""
-        # Fallback: Create queue if not exists, avoid missing events if frontend subscribes late
-        queue = self._event_queues.get(run_id)
-        if queue is None:
-            logger.info(f"[Workflow] _publish queue not found, created fallback run_id={run_id}")
-            queue = asyncio.Queue()
-            self._event_queues[run_id] = queue
-        await queue.put(event)
-
-    async def _close_queue(self, run_id: int) -> None:
-        """Close the event queue for a run."""
-        queue = self._event_queues.get(run_id)
-        if queue is not None:
-            await queue.put("__CLOSE__")
-
-    def _ensure_queue(self, run_id: int) -> asyncio.Queue:
-        """Ensure an event queue exists for a run."""
-        q = self._event_queues.get(run_id)
-        if q is None:
-            q = asyncio.Queue()
-            self._event_queues[run_id] = q
-            logger.info(f"[Workflow] Event queue created run_id={run_id}")
-        return q
-
-    def subscribe_events(self, run_id: int) -> AsyncIterator[str]:
-        """Subscribe to events for a specific run."""
-        queue = self._ensure_queue(run_id)
+        """Publish an event to the run's event log."""
+        if self.broker_events:
+            broker.publish(run_id, event)
+            return
+        event_log.publish(run_id, event)
+
+    async def _close_events(self, run_id: int) -> None:
+        """End the run's event stream (its log stays replayable until the TTL)."""
+        if self.broker_events:
+            # Worker process: the API's caches learn of the run's card writes from the broker
+            card_changes.publish_run_changes(run_id)
+            broker.close(run_id)
+            return
+        event_log.close(run_id)
+
+    def subscribe_events(self, run_id: int, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Subscribe to events for a specific run.
+
+        Args:
+            run_id: Workflow run ID.
+            last_event_id: Last event id the subscriber received (SSE Last-Event-ID); None replays from the start.
+        """
+        if self.broker_events:
+            return broker.follow(run_id, last_event_id or 0)
 
         async def _gen() -> AsyncIterator[str]:
-            while True:
-                item = await queue.get()
-                if item == "__CLOSE__":
-                    break
-                yield item
+            if not event_log.known(run_id):
+                # Finished before this process started, or longer ago than the log TTL
+                run = await asyncio.to_thread(self._load_run, run_id)
+                if run is not None and run.status not in _PENDING_STATUSES:
+                    payload = {"status": run.status, "affected_card_ids": (run.summary_json or {}).get("affected_card_ids", [])}
+                    yield f"event: run_completed\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                    return
+            async for frame in event_log.subscribe(run_id, last_event_id or 0):
+                yield frame
         return _gen()
 
+    @staticmethod
+    def _load_run(run_id: int) -> Optional[WorkflowRun]:
+        with Session(db_engine) as session:
+            return session.get(WorkflowRun, run_id)
+
     def _background_run(self, coro_factory: Callable[[], asyncio.Future], run_id: int) -> Optional[asyncio.Task]:
         """Run a coroutine in the background."""
         try:
@@ -66,20 +126,21 @@ class LocalAsyncEngine:
         except RuntimeError:
             try:
                 import anyio  # type: ignore
-                logger.info(f"[Workflow] No event loop; submitting run_id={run_id} via anyio.from_thread.run")
-                return anyio.from_thread.run(asyncio.create_task, coro_factory())
+                logger.info(f"[Workflow] No event loop; submitting run_id={run_id} via anyio.from_thread.run_sync")
+                # run_sync: schedule the task on the loop and return at once (run() would await it)
+                return anyio.from_thread.run_sync(asyncio.create_task, coro_factory())
             except Exception:
                 logger.warning(f"[Workflow] anyio failed; running synchronously run_id={run_id}")
                 asyncio.run(coro_factory())
                 return None
 
     # ---------------- create run ----------------
-    def create_run(self, session: Session, workflow: Workflow, scope_json: Optional[dict], params_json: Optional[dict], idempotency_key: Optional[str]) -> WorkflowRun:
-        """Create a new workflow run."""
+    def create_run(self, session: Session, workflow: Workflow, scope_json: Optional[dict], params_json: Optional[dict], idempotency_key: Optional[str], status: str = "queued") -> WorkflowRun:
+        """Create a new workflow run (status "scheduled" for a debounced trigger run started later)."""
         run = WorkflowRun(
             workflow_id=workflow.id,
             definition_version=workflow.version,
-            status="queued",
+            status=status,
             scope_json=scope_json,
             params_json=params_json,
             idempotency_key=idempotency_key,
@@ -87,324 +148,370 @@ class LocalAsyncEngine:
         session.add(run)
         session.commit()
         session.refresh(run)
-        # Create event queue in advance, ensuring no first batch events are lost even if frontend subscribes later
-        self._ensure_queue(run.id)
-        logger.info(f"[Workflow] Run created and event queue initialized run_id={run.id} workflow_id={workflow.id}")
+        # No event queue needed in advance: subscribers replay the run's log from its first event
+        logger.info(f"[Workflow] Run created run_id={run.id} workflow_id={workflow.id}")
         return run
 
-    # ---------------- nodes ----------------
-    def _resolve_node_fn(self, type_name: str):
-        """Get node function from node registry"""
-        registry = builtin_nodes.get_registered_nodes()
-        fn = registry.get(type_name)
-        if not fn:
-            raise ValueError(f"Unknown node type: {type_name}, registered nodes: {list(registry.keys())}")
-        return fn
+    # ---------------- execute ----------------
+    async def _execute_dsl(self, session: Session, workflow: Workflow, run: WorkflowRun) -> Dict[str, str]:
+        """Execute the workflow DSL; returns node id -> error of nodes that failed without stopping the run."""
+        # Compiled once per workflow version and shared by its runs
+        plan = plan_cache.get(workflow)
+        state: Dict[str, Any] = {
+            "scope": run.scope_json or {},
+            "touched_card_ids": set(),
+            # Write locks of concurrent loop iterations, private to this run
+            builtin_nodes.RESOURCE_LOCKS_KEY: builtin_nodes.ResourceLocks(),
+        }
+        uow: Optional[CardUnitOfWork] = None
+        if plan.unit_of_work != "off":
+            # Card writes of all nodes are buffered and flushed in bulk (see workflow_uow)
+            uow = CardUnitOfWork(session.get_bind(), plan.unit_of_work)
+            state[UNIT_OF_WORK_KEY] = uow
+        failed: Dict[str, str] = {}
+        try:
+            if plan.legacy:
+                await self._execute_legacy_format(session, workflow, run, plan, state)
+            else:
+                failed = await self._execute_standard_format(session, workflow, run, plan, state)
+            if uow is not None:
+                if failed and uow.mode == "atomic":
+                    raise RuntimeError(f"{len(failed)} node(s) failed or skipped, atomic run discarded: {failed}")
+                await self._offload(uow.finish, True)
+        except BaseException:
+            if uow is not None:
+                await self._offload(uow.finish, False)
+            raise
+        finally:
+            # Save results (also after a failure, so affected cards are reported)
+            await self._save_execution_result(session, run, state)
+        return failed
+
+    async def _execute_standard_format(self, session: Session, workflow: Workflow, run: WorkflowRun, plan: WorkflowPlan, state: dict) -> Dict[str, str]:
+        """Execute standard format workflow (based on nodes+edges)"""
+        logger.info(f"[Workflow] Start execution run_id={run.id} workflow_id={workflow.id} version={plan.version} nodes={len(plan.nodes)} stages={len(plan.stages)} unit_of_work={plan.unit_of_work}")
+        return await self._execute_graph(plan, session, state, run.id)
 
-    # ---------------- canonicalize ----------------
-    @staticmethod
-    def _canonicalize(nodes: List[dict]) -> List[dict]:
-        """Normalize DSL:
-        - ForEach/ForEachRange without body -> Fold next node as body, skip separate execution.
+    async def _execute_graph(self, plan: WorkflowPlan, session: Session, state: dict, run_id: int) -> Dict[str, str]:
         """
-        out: List[dict] = []
-        i = 0
-        while i < len(nodes):
-            n = nodes[i]
-            ntype = n.get("type")
-            if ntype in ("List.ForEach", "List.ForEachRange") and not n.get("body") and i + 1 < len(nodes):
-                compat = dict(n)
-                compat["body"] = [nodes[i + 1]]
-                out.append(compat)
-                logger.warning("[Workflow] Compatibility rewrite: ForEach/Range missing body, folded next node as body")
-                i += 2
-                continue
-            out.append(n)
-            i += 1
-        return out
+        Execute a compiled workflow graph with a ready-queue scheduler.
 
-    # ---------------- execute ----------------
-    async def _execute_dsl(self, session: Session, workflow: Workflow, run: WorkflowRun) -> None:
-        """Execute the workflow DSL."""
-        dsl: Dict[str, Any] = workflow.definition_json or {}
-        raw_nodes: List[dict] = list(dsl.get("nodes") or [])
-        
-        # Check if standard format (contains edges)
-        is_standard_format = "edges" in dsl and isinstance(dsl["edges"], list)
-        
-        if is_standard_format:
-            # Standard format: Execute based on edges
-            await self._execute_standard_format(session, workflow, run, dsl)
-        else:
-            # Legacy format: Keep original logic
-            await self._execute_legacy_format(session, workflow, run, raw_nodes)
+        A node becomes ready once all its predecessors succeeded; ready nodes start as
+        long as fewer than plan.max_concurrency run and their card reads/writes (see
+        nodes.get_node_access) do not conflict with a running node. Each node runs in a
+        worker thread with its own session, on a copy of the merged states of its
+        predecessors, so parallel branches never see each other's current card.
+        Loop bodies run inside their loop node.
 
-    async def _execute_standard_format(self, session: Session, workflow: Workflow, run: WorkflowRun, dsl: dict) -> None:
-        """Execute standard format workflow (based on nodes+edges)"""
-        nodes: List[dict] = list(dsl.get("nodes") or [])
-        edges: List[dict] = list(dsl.get("edges") or [])
-        state: Dict[str, Any] = {"scope": run.scope_json or {}, "touched_card_ids": set()}
-        
-        logger.info(f"[Workflow] Start execution run_id={run.id} workflow_id={workflow.id} nodes={len(nodes)} edges={len(edges)}")
-        
-        # Build execution graph
-        graph = self._build_execution_graph(nodes, edges)
-        
-        # Execute workflow
-        await self._execute_graph(graph, session, state, run.id)
-        
-        # Save results
-        await self._save_execution_result(session, run, state)
-    
-    def _build_execution_graph(self, nodes: List[dict], edges: List[dict]) -> dict:
-        """Build execution graph: node mapping, dependencies, successors"""
-        node_map = {n["id"]: n for n in nodes}
-        dependencies = {}  # node_id -> [predecessor_ids]
-        successors = {}    # node_id -> {"body": [...], "next": [...]}
-        
-        # Build dependencies and successors
-        for edge in edges:
-            source, target = edge["source"], edge["target"]
-            handle = edge.get("sourceHandle", "r")
-            
-            # Record dependency
-            dependencies.setdefault(target, []).append(source)
-            
-            # Record successor (distinguish body and next)
-            succ_type = "body" if handle == "b" else "next"
-            successors.setdefault(source, {"body": [], "next": []})[succ_type].append(target)
-        
-        # Find start nodes
-        start_nodes = [n["id"] for n in nodes if n["id"] not in dependencies]
-        if not start_nodes and nodes:
-            logger.warning("[Workflow] No start node, using first node")
-            start_nodes = [nodes[0]["id"]]
-        
-        return {
-            "node_map": node_map,
-            "dependencies": dependencies,
-            "successors": successors,
-            "start_nodes": start_nodes
-        }
-    
-    async def _execute_graph(self, graph: dict, session: Session, state: dict, run_id: int) -> None:
-        """Execute workflow graph"""
-        node_map = graph["node_map"]
-        dependencies = graph["dependencies"]
-        successors = graph["successors"]
-        executed = set()
-        
-        async def execute_node(node_id: str) -> None:
-            if node_id in executed or node_id not in node_map:
-                return
-            
-            node = node_map[node_id]
-            ntype = node.get("type")
-            params = node.get("params") or {}
-            
-            logger.info(f"[Workflow] Executing node id={node_id} type={ntype}")
-            await self._publish(run_id, f"event: step_started\ndata: {ntype}\n\n")
-            
-            try:
-                # Execute node
-                await self._execute_single_node(node, session, state, run_id, successors.get(node_id, {}), node_map)
-                
-                # Mark as executed
-                executed.add(node_id)
-                
-                # If loop node, mark body nodes as executed too
-                if ntype in ("List.ForEach", "List.ForEachRange"):
-                    executed.update(successors.get(node_id, {}).get("body", []))
-                
-                logger.info(f"[Workflow] Node succeeded id={node_id} type={ntype}")
-                await self._publish(run_id, f"event: step_succeeded\ndata: {ntype}\n\n")
-                
-                # Execute successor nodes
-                await self._execute_successors(node_id, successors, dependencies, executed, execute_node)
-                
-            except Exception as e:
-                logger.exception(f"[Workflow] Node failed id={node_id} type={ntype} err={e}")
-                await self._publish(run_id, f"event: step_failed\ndata: {ntype}: {e}\n\n")
-                raise
-        
-        # Execute all start nodes
-        for start_id in graph["start_nodes"]:
-            await execute_node(start_id)
-    
-    async def _execute_single_node(self, node: dict, session: Session, state: dict, run_id: int, 
-                                   node_successors: dict, node_map: dict) -> None:
-        """Execute single node"""
-        ntype = node.get("type")
-        params = node.get("params") or {}
-        
-        # Special handling for loop nodes
-        if ntype in ("List.ForEach", "List.ForEachRange"):
-            body_node_ids = node_successors.get("body", [])
-            body_nodes = [node_map[bid] for bid in body_node_ids if bid in node_map]
-            body_executor = lambda: self._execute_body_nodes(body_nodes, session, state, run_id)
-            
-            if ntype == "List.ForEach":
-                builtin_nodes.node_list_foreach(session, state, params, body_executor)
-            else:
-                builtin_nodes.node_list_foreach_range(session, state, params, body_executor)
+        Args:
+            plan: Compiled plan of the workflow (see workflow_plans).
+            session: Run session (provides the database bind).
+            state: Initial state (scope, touched_card_ids shared by all nodes).
+            run_id: Run ID (events).
+
+        Returns:
+            node id -> error for nodes that failed under plan.on_error == "continue".
+        """
+        nodes = plan.nodes
+        preds = plan.preds
+        children = plan.children
+        max_concurrency = plan.max_concurrency
+        on_error = plan.on_error
+
+        uow: Optional[CardUnitOfWork] = state.get(UNIT_OF_WORK_KEY)
+        remaining = {nid: len(p) for nid, p in preds.items()}
+        ready: List[str] = list(plan.start_nodes)
+
+        outputs: Dict[str, dict] = {}
+        failed: Dict[str, str] = {}
+        done: Set[str] = set()
+        running: Dict[asyncio.Task, Tuple[str, Tuple[Set[str], Set[str]]]] = {}
+        first_error: Optional[BaseException] = None
+
+        def input_state(nid: str) -> dict:
+            merged = dict(state)
+            for dep in preds[nid]:
+                merged.update(outputs.get(dep) or {})
+            return merged
+
+        async def skip(nid: str) -> None:
+            # Descendants of a failed node never run
+            stack = [nid]
+            while stack:
+                cur = stack.pop()
+                if cur in done:
+                    continue
+                done.add(cur)
+                failed.setdefault(cur, "skipped: upstream node failed")
+                await self._publish(run_id, f"event: step_skipped\ndata: {nodes[cur].type}\n\n")
+                stack.extend(children.get(cur, ()))
+
+        try:
+            while ready or running:
+                if first_error is None:
+                    # Start every ready node that fits the limit and conflicts with nothing running
+                    for nid in list(ready):
+                        if len(running) >= max_concurrency:
+                            break
+                        node = nodes[nid]
+                        node_state = input_state(nid)
+                        access = builtin_nodes.get_node_access(node.type, node_state, node.params)
+                        if any(_conflicts(access, other) for _, other in running.values()):
+                            continue
+                        ready.remove(nid)
+                        logger.info(f"[Workflow] Executing node id={nid} type={node.type}")
+                        await self._publish(run_id, f"event: step_started\ndata: {node.type}\n\n")
+                        task = asyncio.create_task(self._run_node(node, session, node_state))
+                        running[task] = (nid, access)
+                        outputs[nid] = node_state
+                if not running:
+                    break
+                finished, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    nid, _ = running.pop(task)
+                    ntype = nodes[nid].type
+                    exc = task.exception()
+                    if exc is not None:
+                        logger.opt(exception=exc).error(f"[Workflow] Node failed id={nid} type={ntype} err={exc}")
+                        await self._publish(run_id, f"event: step_failed\ndata: {ntype}: {exc}\n\n")
+                        outputs.pop(nid, None)
+                        done.add(nid)
+                        failed[nid] = str(exc)
+                        if on_error == "fail_fast":
+                            if first_error is None:
+                                first_error = exc
+                        else:
+                            for child in children.get(nid, ()):
+                                await skip(child)
+                        continue
+                    done.add(nid)
+                    logger.info(f"[Workflow] Node succeeded id={nid} type={ntype}")
+                    if uow is not None and uow.mode == "batch":
+                        # Checkpoint: writes of finished nodes reach the database together
+                        await self._offload(uow.flush)
+                    await self._publish(run_id, f"event: step_succeeded\ndata: {ntype}\n\n")
+                    for child in children.get(nid, ()):
+                        if child in done:
+                            continue
+                        remaining[child] -= 1
+                        if remaining[child] == 0:
+                            ready.append(child)
+        except asyncio.CancelledError:
+            for task in running:
+                task.cancel()
+            raise
+        if first_error is not None:
+            raise first_error
+        stalled = [nid for nid in nodes if nid not in done]
+        if stalled:
+            logger.warning(f"[Workflow] Nodes never became ready (cycle or failed dependency) run_id={run_id} nodes={stalled}")
+        return failed
+
+    async def _run_node(self, node: PlanNode, session: Session, state: dict) -> None:
+        """Run one node in the node thread pool with its own session."""
+        bind = session.get_bind()
+
+        def _call() -> None:
+            with Session(bind) as node_session:
+                builtin_nodes.attach_state_cards(node_session, state)
+                self._execute_single_node(node, node_session, state)
+
+        await self._offload(_call)
+
+    def _execute_single_node(self, node: PlanNode, session: Session, state: dict) -> None:
+        """Execute single node (loop nodes run their body for every iteration)"""
+        if node.is_loop:
+            node.fn(session, state, node.params, lambda it_state, it_session: self._execute_body_nodes(node.body, it_session, it_state))
+        elif builtin_nodes.in_concurrent_iteration():
+            # Other iterations of a concurrent loop run the same nodes
+            _, writes = builtin_nodes.get_node_access(node.type, state, node.params)
+            with state[builtin_nodes.RESOURCE_LOCKS_KEY].hold(writes):
+                node.fn(session, state, node.params)
         else:
-            # Normal node
-            fn = self._resolve_node_fn(ntype)
-            fn(session, state, params)
-    
-    async def _execute_successors(self, node_id: str, successors: dict, dependencies: dict, 
-                                  executed: set, execute_node) -> None:
-        """Execute successor nodes"""
-        # Get 'next' type successors (loop body nodes executed inside loop)
-        next_nodes = successors.get(node_id, {}).get("next", [])
-        
-        for next_id in next_nodes:
-            if next_id not in executed:
-                # Check if all dependencies are satisfied
-                deps = dependencies.get(next_id, [])
-                if all(dep in executed for dep in deps):
-                    await execute_node(next_id)
-
-    def _execute_body_nodes(self, body_nodes: List[dict], session, state, run_id: int):
+            node.fn(session, state, node.params)
+
+    def _execute_body_nodes(self, body_nodes: Tuple[PlanNode, ...], session: Session, state: dict) -> None:
         """Execute body nodes synchronously (for ForEach callback)"""
         for bn in body_nodes:
-            ntype = bn.get("type")
-            params = bn.get("params") or {}
-            logger.info(f"[Workflow] ForEach body node type={ntype}")
+            logger.info(f"[Workflow] ForEach body node type={bn.type}")
             try:
-                fn = self._resolve_node_fn(ntype)
-                fn(session, state, params)
+                self._execute_single_node(bn, session, state)
             except Exception as e:  # noqa: BLE001
-                logger.exception(f"[Workflow] ForEach body node failed type={ntype} err={e}")
+                logger.exception(f"[Workflow] ForEach body node failed type={bn.type} err={e}")
                 raise
 
-    async def _execute_legacy_format(self, session: Session, workflow: Workflow, run: WorkflowRun, raw_nodes: List[dict]) -> None:
+    async def _execute_legacy_format(self, session: Session, workflow: Workflow, run: WorkflowRun, plan: WorkflowPlan, state: dict) -> None:
         """Execute legacy format workflow (Backward compatibility)"""
-        nodes: List[dict] = self._canonicalize(raw_nodes)
-        state: Dict[str, Any] = {"scope": run.scope_json or {}, "touched_card_ids": set()}
-        logger.info(f"[Workflow] Start execution legacy format run_id={run.id} workflow_id={workflow.id} nodes={len(nodes)}")
+        uow: Optional[CardUnitOfWork] = state.get(UNIT_OF_WORK_KEY)
+        logger.info(f"[Workflow] Start execution legacy format run_id={run.id} workflow_id={workflow.id} nodes={len(plan.roots)}")
+        loop = asyncio.get_running_loop()
+        run_id = run.id
 
-        def run_body(body_nodes: List[dict]):
+        def run_body(body_nodes: Tuple[PlanNode, ...], node_session: Session, node_state: dict):
             for bn in body_nodes:
-                ntype = bn.get("type")
-                params = bn.get("params") or {}
+                ntype = bn.type
                 logger.info(f"[Workflow] Legacy node start type={ntype}")
-                if ntype == "List.ForEach":
-                    body = list((bn.get("body") or []))
-                    builtin_nodes.node_list_foreach(session, state, params, lambda: run_body(body))
-                    logger.info("[Workflow] Legacy node end List.ForEach")
+                if bn.is_loop:
+                    bn.fn(node_session, node_state, bn.params, lambda it_state, it_session, body=bn.body: run_body(body, it_session, it_state))
+                    logger.info(f"[Workflow] Legacy node end {ntype}")
                     continue
-                if ntype == "List.ForEachRange":
-                    body = list((bn.get("body") or []))
-                    builtin_nodes.node_list_foreach_range(session, state, params, lambda: run_body(body))
-                    logger.info("[Workflow] Legacy node end List.ForEachRange")
-                    continue
-                fn = self._resolve_node_fn(ntype)
-                asyncio.get_event_loop().create_task(self._publish(run.id, f"event: step_started\ndata: {ntype}\n\n"))
+                self._publish_threadsafe(loop, run_id, f"event: step_started\ndata: {ntype}\n\n")
                 try:
-                    fn(session, state, params)
+                    self._execute_single_node(bn, node_session, node_state)
                     logger.info(f"[Workflow] Legacy node success type={ntype}")
-                    asyncio.get_event_loop().create_task(self._publish(run.id, f"event: step_succeeded\ndata: {ntype}\n\n"))
+                    self._publish_threadsafe(loop, run_id, f"event: step_succeeded\ndata: {ntype}\n\n")
                 except Exception as e:  # noqa: BLE001
                     logger.exception(f"[Workflow] Legacy node failed type={ntype} err={e}")
-                    asyncio.get_event_loop().create_task(self._publish(run.id, f"event: step_failed\ndata: {ntype}: {e}\n\n"))
+                    self._publish_threadsafe(loop, run_id, f"event: step_failed\ndata: {ntype}: {e}\n\n")
                     raise
 
-        run_body(nodes)
-        await self._save_execution_result(session, run, state)
+        def _call() -> None:
+            # The whole run executes in one pool thread with its own session
+            with Session(session.get_bind()) as run_session:
+                for root in plan.roots:
+                    run_body((root,), run_session, state)
+                    if uow is not None and uow.mode == "batch":
+                        # Checkpoint after each top-level node
+                        uow.flush()
+
+        await self._offload(_call)
 
     async def _save_execution_result(self, session: Session, run: WorkflowRun, state: dict) -> None:
         """Save execution result"""
         logger.info(f"[Workflow] Execution finished run_id={run.id}")
-        try:
-            touched = list(sorted({int(x) for x in (state.get("touched_card_ids") or set())}))
+        touched = list(sorted({int(x) for x in (state.get("touched_card_ids") or set())}))
+        uow: Optional[CardUnitOfWork] = state.get(UNIT_OF_WORK_KEY)
+        if uow is not None:
+            # Temporary ids of inserted cards -> their rows; nothing after a discarded atomic run
+            touched = uow.resolve_ids(touched)
+
+        def _save() -> None:
             run.summary_json = {**(run.summary_json or {}), "affected_card_ids": touched}
             session.add(run)
             session.commit()
+
+        try:
+            await self._offload(_save)
         except Exception:
             logger.exception("[Workflow] Failed to summarize affected card IDs")
 
     # ---------------- run ----------------
-    def run(self, session: Session, run: WorkflowRun) -> None:
-        """Run the workflow."""
-        if run.id in self._run_tasks:
-            return
+    @staticmethod
+    def _set_run_status(session: Session, run_id: int, status: str, error_json: Optional[dict] = None) -> WorkflowRun:
+        """Persist a run status transition (runs in the node thread pool)."""
+        run_db: WorkflowRun = session.exec(select(WorkflowRun).where(WorkflowRun.id == run_id)).one()
+        run_db.status = status
+        if status == "running":
+            run_db.started_at = datetime.utcnow()
+        else:
+            run_db.finished_at = datetime.utcnow()
+        if error_json is not None:
+            run_db.error_json = error_json
+        session.add(run_db)
+        session.commit()
+        session.refresh(run_db)
+        return run_db
 
-        async def _runner():
-            run_id = run.id
-            # Ensure event queue exists
-            self._ensure_queue(run_id)
-            await self._publish(run_id, "event: step_started\n\n")
-            try:
-                run_db: WorkflowRun = session.exec(select(WorkflowRun).where(WorkflowRun.id == run_id)).one()
-                run_db.status = "running"
-                run_db.started_at = datetime.utcnow()
-                session.add(run_db)
-                session.commit()
+    async def execute(self, run_id: int) -> None:
+        """
+        Execute a queued run to completion (called by the run dispatcher, or directly without one).
 
-                workflow = session.exec(select(Workflow).where(Workflow.id == run.workflow_id)).one()
-                await self._publish(run_id, "event: log\ndata: Executing DSL...\n\n")
-                logger.info(f"[Workflow] run started run_id={run_id} workflow_id={workflow.id}")
-                await self._execute_dsl(session, workflow, run)
+        Args:
+            run_id: Workflow run ID.
+        """
+        task = asyncio.current_task()
+        if task is not None:
+            self._run_tasks[run_id] = task
+        await self._publish(run_id, "event: step_started\n\n")
+        # Per-run session: the caller's (request) session is closed once the request returns
+        run_session = Session(db_engine)
+        try:
+            run_db = await self._offload(self._set_run_status, run_session, run_id, "running")
 
-                run_db = session.exec(select(WorkflowRun).where(WorkflowRun.id == run_id)).one()
-                run_db.status = "succeeded"
-                run_db.finished_at = datetime.utcnow()
-                session.add(run_db)
-                session.commit()
-                # Publish completion event with affected card IDs
+            workflow = await self._offload(lambda: run_session.exec(select(Workflow).where(Workflow.id == run_db.workflow_id)).one())
+            await self._publish(run_id, "event: log\ndata: Executing DSL...\n\n")
+            logger.info(f"[Workflow] run started run_id={run_id} workflow_id={workflow.id}")
+            failed_nodes = await self._execute_dsl(run_session, workflow, run_db)
+
+            # Under on_error=continue, failed nodes leave the run partially applied
+            error_json = {"message": f"{len(failed_nodes)} node(s) failed or skipped", "failed_nodes": failed_nodes} if failed_nodes else None
+            run_db = await self._offload(self._set_run_status, run_session, run_id, "partial" if failed_nodes else "succeeded", error_json)
+            # Publish completion event with affected card IDs
+            try:
+                affected = []
                 try:
-                    affected = []
-                    try:
-                        affected = list(sorted({int(x) for x in (run_db.summary_json or {}).get("affected_card_ids", [])}))
-                    except Exception:
-                        affected = []
-                    payload = {"status": "succeeded", "affected_card_ids": affected}
-                    import json as _json
-                    await self._publish(run_id, f"event: run_completed\ndata: {_json.dumps(payload, ensure_ascii=False)}\n\n")
+                    affected = list(sorted({int(x) for x in (run_db.summary_json or {}).get("affected_card_ids", [])}))
                 except Exception:
-                    await self._publish(run_id, "event: run_completed\ndata: {\"status\":\"succeeded\"}\n\n")
-            except asyncio.CancelledError:
-                run_db = session.exec(select(WorkflowRun).where(WorkflowRun.id == run_id)).one()
-                run_db.status = "cancelled"
-                run_db.finished_at = datetime.utcnow()
-                session.add(run_db)
-                session.commit()
-                await self._publish(run_id, "event: run_completed\ndata: {\"status\":\"cancelled\"}\n\n")
-                raise
-            except Exception as e:  # noqa: BLE001
-                logger.exception(f"[Workflow] run failed run_id={run_id} err={e}")
-                run_db = session.exec(select(WorkflowRun).where(WorkflowRun.id == run_id)).one()
-                run_db.status = "failed"
-                run_db.finished_at = datetime.utcnow()
-                run_db.error_json = {"message": str(e)}
-                session.add(run_db)
-                session.commit()
-                # Failure should also carry affected cards to allow frontend selective refresh
-                try:
                     affected = []
-                    try:
-                        affected = list(sorted({int(x) for x in (run_db.summary_json or {}).get("affected_card_ids", [])}))
-                    except Exception:
-                        affected = []
-                    payload = {"status": "failed", "affected_card_ids": affected, "error": str(e)}
-                    import json as _json
-                    await self._publish(run_id, f"event: run_completed\ndata: {_json.dumps(payload, ensure_ascii=False)}\n\n")
+                payload = {"status": run_db.status, "affected_card_ids": affected}
+                if failed_nodes:
+                    payload["failed_nodes"] = failed_nodes
+                import json as _json
+                await self._publish(run_id, f"event: run_completed\ndata: {_json.dumps(payload, ensure_ascii=False)}\n\n")
+            except Exception:
+                await self._publish(run_id, "event: run_completed\ndata: {\"status\":\"succeeded\"}\n\n")
+        except asyncio.CancelledError:
+            await self._offload(self._set_run_status, run_session, run_id, "cancelled")
+            await self._publish(run_id, "event: run_completed\ndata: {\"status\":\"cancelled\"}\n\n")
+            raise
+        except Exception as e:  # noqa: BLE001
+            logger.exception(f"[Workflow] run failed run_id={run_id} err={e}")
+            run_session.rollback()
+            run_db = await self._offload(self._set_run_status, run_session, run_id, "failed", {"message": str(e)})
+            # Failure should also carry affected cards to allow frontend selective refresh
+            try:
+                affected = []
+                try:
+                    affected = list(sorted({int(x) for x in (run_db.summary_json or {}).get("affected_card_ids", [])}))
                 except Exception:
-                    await self._publish(run_id, "event: run_completed\ndata: {\"status\":\"failed\"}\n\n")
-            finally:
-                await self._close_queue(run_id)
+                    affected = []
+                payload = {"status": "failed", "affected_card_ids": affected, "error": str(e)}
+                import json as _json
+                await self._publish(run_id, f"event: run_completed\ndata: {_json.dumps(payload, ensure_ascii=False)}\n\n")
+            except Exception:
+                await self._publish(run_id, "event: run_completed\ndata: {\"status\":\"failed\"}\n\n")
+        finally:
+            run_session.close()
+            self._run_tasks.pop(run_id, None)
+            await self._close_events(run_id)
 
-        task = self._background_run(lambda: _runner(), run.id)
+    def run(self, session: Session, run: WorkflowRun) -> None:
+        """Queue the run (durably, when the run dispatcher is up) or start it right away."""
+        if run.id in self._run_tasks:
+            return
+        if workflow_queue.queue_enabled():
+            workflow = session.get(Workflow, run.workflow_id)
+            if workflow is not None:
+                workflow_queue.enqueue_run(session, workflow, run)
+                return
+        run_id = run.id
+        task = self._background_run(lambda: self.execute(run_id), run_id)
         if task is not None:
-            self._run_tasks[run.id] = task
+            self._run_tasks[run_id] = task
 
     def cancel(self, run_id: int) -> bool:
-        """Cancel a running workflow."""
+        """Cancel a running workflow, or a scheduled/queued one that has not started yet."""
         task = self._run_tasks.get(run_id)
         if task and not task.done():
             task.cancel()
             return True
+        with Session(db_engine) as session:
+            run = session.get(WorkflowRun, run_id)
+            if run is not None and run.status == "scheduled":
+                # Debounced trigger run not started yet
+                run.status = "cancelled"
+                run.finished_at = datetime.utcnow()
+                session.add(run)
+                session.commit()
+                return True
+            if workflow_queue.cancel_pending(session, run_id):
+                logger.info(f"[Workflow] queued run cancelled run_id={run_id}")
+                return True
+            if self.broker_events:
+                # Executing in a worker process
+                if run is not None and run.status == "running":
+                    broker.request_cancel(run_id)
+                    return True
         return False
 
 
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+from sqlmodel import Session, select, delete, func
+
+from app.db.models import WorkflowRun, WorkflowRunEvent
+from app.db.session import engine
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Milliseconds between broker writes of a worker (events of that window share one transaction)
+WORKFLOW_EVENT_FLUSH_MS = _env_int("WORKFLOW_EVENT_FLUSH_MS", 50)
+# Milliseconds between broker reads of an event stream subscriber
+WORKFLOW_EVENT_POLL_MS = _env_int("WORKFLOW_EVENT_POLL_MS", 200)
+# Minutes broker messages are kept (late subscribers replay the run from its first event)
+WORKFLOW_EVENT_RETENTION_MINUTES = _env_int("WORKFLOW_EVENT_RETENTION_MINUTES", 60)
+
+# Events kept per run for replay (Last-Event-ID); older ones are dropped
+WORKFLOW_EVENT_BUFFER = _env_int("WORKFLOW_EVENT_BUFFER", 256)
+# Seconds a finished run's events stay replayable
+WORKFLOW_EVENT_TTL_SECONDS = _env_int("WORKFLOW_EVENT_TTL_SECONDS", 300)
+# Finished runs kept in memory at most (the oldest are dropped first, even within their TTL)
+WORKFLOW_EVENT_MAX_RUNS = _env_int("WORKFLOW_EVENT_MAX_RUNS", 1000)
+
+_TERMINAL = ("succeeded", "failed", "cancelled", "partial")
+# Empty polls between run status checks of a subscriber (ends streams whose worker died before closing them)
+_STATUS_CHECK_POLLS = 25
+
+
+class EventBroker:
+    """
+    Workflow event broker on the SQLite database shared by the API and its worker processes.
+
+    Workers append SSE frames to the WorkflowRunEvent table from a writer thread that batches
+    everything published within WORKFLOW_EVENT_FLUSH_MS into one transaction, so node threads
+    never wait for the database. Subscribers in the API process follow a run's rows by id. The
+    same table carries cancel requests from the API to the worker executing a run, and the
+    card changes of finished runs from the workers to the API (see card_changes).
+    """
+    def __init__(self) -> None:
+        self._buffer: List[Tuple[int, str, Optional[str]]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------- worker side ----------------
+    def start(self) -> None:
+        """Start the writer thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="workflow-event-broker", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write what is buffered and stop the writer thread."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._flush()
+
+    def publish(self, run_id: int, frame: str) -> None:
+        """Queue an SSE frame of a run for its subscribers (any thread)."""
+        self._append(run_id, "event", frame)
+
+    def close(self, run_id: int) -> None:
+        """End the run's event stream."""
+        self._append(run_id, "close", None)
+        self._wake.set()
+
+    def changed(self, run_id: int, changes: str) -> None:
+        """Announce the card changes a run committed (JSON, see card_changes) to the API process."""
+        self._append(run_id, "changed", changes)
+
+    def _append(self, run_id: int, kind: str, data: Optional[str]) -> None:
+        with self._lock:
+            self._buffer.append((run_id, kind, data))
+        if self._thread is None:
+            # Writer not started (tests, scripts): write through
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        try:
+            with Session(engine) as session:
+                session.add_all([WorkflowRunEvent(run_id=rid, kind=kind, data=data) for rid, kind, data in batch])
+                session.commit()
+        except Exception as e:  # noqa: BLE001
+            logger.error(f"[WorkflowEvents] dropped {len(batch)} broker messages: {e}")
+
+    def _run(self) -> None:
+        interval = max(0.01, WORKFLOW_EVENT_FLUSH_MS / 1000.0)
+        last_prune = datetime.utcnow()
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            self._flush()
+            if datetime.utcnow() - last_prune > timedelta(minutes=10):
+                last_prune = datetime.utcnow()
+                try:
+                    prune_events()
+                except Exception as e:  # noqa: BLE001
+                    logger.warning(f"[WorkflowEvents] prune failed: {e}")
+
+    def cancel_requests(self, run_ids: Iterable[int], after_id: int = 0) -> Tuple[Set[int], int]:
+        """
+        Runs among run_ids with a cancel request newer than after_id.
+
+        Returns:
+            (run IDs to cancel, highest message id seen).
+        """
+        ids = list(run_ids)
+        if not ids:
+            return set(), after_id
+        with Session(engine) as session:
+            rows = session.exec(
+                select(WorkflowRunEvent.id, WorkflowRunEvent.run_id).where(
+                    WorkflowRunEvent.kind == "cancel",
+                    WorkflowRunEvent.id > after_id,
+                    WorkflowRunEvent.run_id.in_(ids),  # type: ignore[union-attr]
+                )
+            ).all()
+        return {rid for _, rid in rows}, max([after_id] + [mid for mid, _ in rows])
+
+    # ---------------- API side ----------------
+    def request_cancel(self, run_id: int) -> None:
+        """Ask the worker executing a run to cancel it."""
+        with Session(engine) as session:
+            session.add(WorkflowRunEvent(run_id=run_id, kind="cancel"))
+            session.commit()
+
+    def _read(self, run_id: int, after_id: int) -> List[WorkflowRunEvent]:
+        with Session(engine) as session:
+            return list(session.exec(
+                select(WorkflowRunEvent)
+                .where(WorkflowRunEvent.run_id == run_id, WorkflowRunEvent.id > after_id, WorkflowRunEvent.kind.in_(("event", "close")))  # type: ignore[attr-defined]
+                .order_by(WorkflowRunEvent.id)
+            ).all())
+
+    def read_changes(self, after_id: int) -> List[WorkflowRunEvent]:
+        """Change announcements of worker processes newer than after_id, oldest first."""
+        with Session(engine) as session:
+            return list(session.exec(
+                select(WorkflowRunEvent)
+                .where(WorkflowRunEvent.kind == "changed", WorkflowRunEvent.id > after_id)
+                .order_by(WorkflowRunEvent.id)
+            ).all())
+
+    def last_id(self) -> int:
+        """Id of the newest broker message (0 when there is none)."""
+        with Session(engine) as session:
+            return int(session.exec(select(func.max(WorkflowRunEvent.id))).one() or 0)
+
+    def _finished(self, run_id: int) -> bool:
+        with Session(engine) as session:
+            run = session.get(WorkflowRun, run_id)
+            return run is None or run.status in _TERMINAL
+
+    async def follow(self, run_id: int, after_id: int = 0) -> AsyncIterator[str]:
+        """
+        Stream a run's SSE frames until the run's stream is closed.
+
+        Args:
+            run_id: Workflow run ID.
+            after_id: Last message id the subscriber received (SSE Last-Event-ID); 0 replays from the first event.
+        """
+        idle = 0
+        interval = max(0.02, WORKFLOW_EVENT_POLL_MS / 1000.0)
+        while True:
+            rows = await asyncio.to_thread(self._read, run_id, after_id)
+            for row in rows:
+                after_id = row.id
+                if row.kind == "close":
+                    return
+                if row.data:
+                    yield f"id: {row.id}\n{row.data}"
+            if rows:
+                idle = 0
+            else:
+                idle += 1
+                if idle % _STATUS_CHECK_POLLS == 0 and await asyncio.to_thread(self._finished, run_id):
+                    # Writer died before the close message; give it one more read
+                    for row in await asyncio.to_thread(self._read, run_id, after_id):
+                        if row.kind == "event" and row.data:
+                            yield f"id: {row.id}\n{row.data}"
+                    return
+            await asyncio.sleep(interval)
+
+
+class _RunLog:
+    __slots__ = ("events", "next_seq", "closed_at", "touched_at", "subscribers", "changed")
+
+    def __init__(self, size: int) -> None:
+        # (sequence number, SSE frame)
+        self.events: Deque[Tuple[int, str]] = deque(maxlen=size)
+        self.next_seq = 1
+        self.closed_at: Optional[float] = None
+        self.touched_at = time.monotonic()
+        self.subscribers = 0
+        # Replaced on every append; subscribers wait on the one they saw
+        self.changed = asyncio.Event()
+
+    def wake(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class RunEventLog:
+    """
+    Bounded, replayable event log of the runs executing in this process.
+
+    Each run keeps its last WORKFLOW_EVENT_BUFFER events numbered from 1; subscribers read
+    without consuming, so any number of them (and reconnecting browsers, via SSE Last-Event-ID)
+    see the same stream. A finished run's log is dropped WORKFLOW_EVENT_TTL_SECONDS after
+    run_completed, and at most WORKFLOW_EVENT_MAX_RUNS finished logs are kept, so memory stays
+    bounded by the runs in flight. Used from the event loop only.
+    """
+    def __init__(self, buffer_size: Optional[int] = None, ttl_seconds: Optional[int] = None, max_runs: Optional[int] = None) -> None:
+        self.buffer_size = max(1, WORKFLOW_EVENT_BUFFER if buffer_size is None else buffer_size)
+        self.ttl_seconds = WORKFLOW_EVENT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_runs = max(1, WORKFLOW_EVENT_MAX_RUNS if max_runs is None else max_runs)
+        self._logs: Dict[int, _RunLog] = {}
+        self._last_sweep = 0.0
+
+    def _log(self, run_id: int) -> _RunLog:
+        log = self._logs.get(run_id)
+        if log is None:
+            log = self._logs[run_id] = _RunLog(self.buffer_size)
+        log.touched_at = time.monotonic()
+        return log
+
+    def known(self, run_id: int) -> bool:
+        """Whether the run has a log here (it executes here, or finished here within the TTL)."""
+        return run_id in self._logs
+
+    def publish(self, run_id: int, frame: str) -> int:
+        """
+        Append an SSE frame to a run's log and wake its subscribers.
+
+        Returns:
+            Sequence number of the event.
+        """
+        log = self._log(run_id)
+        seq = log.next_seq
+        log.next_seq += 1
+        log.events.append((seq, frame))
+        log.wake()
+        self._sweep()
+        return seq
+
+    def close(self, run_id: int) -> None:
+        """Mark the run's stream finished; its log expires after the TTL."""
+        log = self._log(run_id)
+        log.closed_at = time.monotonic()
+        log.wake()
+        self._sweep()
+
+    async def subscribe(self, run_id: int, after: int = 0) -> AsyncIterator[str]:
+        """
+        Stream a run's events (with SSE id fields) until the run's stream is closed.
+
+        Args:
+            run_id: Workflow run ID.
+            after: Last sequence number the subscriber received; 0 replays everything still buffered.
+        """
+        self._sweep()
+        log = self._log(run_id)
+        log.subscribers += 1
+        try:
+            while True:
+                changed = log.changed
+                for seq, frame in list(log.events):
+                    if seq > after:
+                        after = seq
+                        yield f"id: {seq}\n{frame}"
+                if log.closed_at is not None:
+                    return
+                await changed.wait()
+        finally:
+            log.subscribers -= 1
+            log.touched_at = time.monotonic()
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        if now - self._last_sweep < 1.0:
+            return
+        self._last_sweep = now
+        for run_id, log in list(self._logs.items()):
+            if log.subscribers:
+                continue
+            if log.closed_at is not None and now - log.closed_at > self.ttl_seconds:
+                del self._logs[run_id]
+            elif log.closed_at is None and not log.events and now - log.touched_at > self.ttl_seconds:
+                # Subscribed to a run that never started here
+                del self._logs[run_id]
+        closed = sorted((log.closed_at, run_id) for run_id, log in self._logs.items() if log.closed_at is not None and not log.subscribers)
+        for _, run_id in closed[:max(0, len(closed) - self.max_runs)]:
+            del self._logs[run_id]
+
+    def stats(self) -> Dict[str, int]:
+        """Run logs held, finished logs among them, and buffered events."""
+        return {
+            "runs": len(self._logs),
+            "finished": sum(1 for log in self._logs.values() if log.closed_at is not None),
+            "events": sum(len(log.events) for log in self._logs.values()),
+        }
+
+
+def prune_events() -> int:
+    """Delete broker messages older than WORKFLOW_EVENT_RETENTION_MINUTES."""
+    cutoff = datetime.utcnow() - timedelta(minutes=WORKFLOW_EVENT_RETENTION_MINUTES)
+    with Session(engine) as session:
+        res = session.exec(delete(WorkflowRunEvent).where(WorkflowRunEvent.created_at < cutoff))
+        session.commit()
+        return res.rowcount or 0
+
+
+broker = EventBroker()
+event_log = RunEventLog()
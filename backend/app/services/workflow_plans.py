@@ -0,0 +1,317 @@
+"""
+Compiled workflow execution plans.
+
+A plan is everything a run of one workflow version needs that does not depend on the run:
+canonicalized nodes bound to their registered callables, loop bodies resolved to nodes,
+dependency edges folded onto loops, a topological staging of the graph, and parsed
+parameter templates. Plans are immutable and shared by concurrent runs; PlanCache keeps the
+recently used ones keyed by (workflow id, version, updated_at).
+"""
+from __future__ import annotations
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from app.db.models import Workflow
+from app.services import nodes as builtin_nodes
+from app.services.workflow_uow import resolve_mode
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Compiled workflow plans kept in memory (least recently used are dropped first)
+WORKFLOW_PLAN_CACHE_SIZE = _env_int("WORKFLOW_PLAN_CACHE_SIZE", 64)
+# Nodes of one standard-format run executing at the same time (DSL "max_concurrency" overrides)
+WORKFLOW_MAX_CONCURRENCY = _env_int("WORKFLOW_MAX_CONCURRENCY", 4)
+# DSL "on_error": stop scheduling at the first failed node, or skip only its descendants
+ON_ERROR_POLICIES = ("fail_fast", "continue")
+LOOP_TYPES = ("List.ForEach", "List.ForEachRange")
+
+
+@dataclass(frozen=True)
+class PlanNode:
+    """
+    A node bound to its implementation.
+
+    Attributes:
+        id: Node id ("" for legacy nodes without one).
+        type: Node type.
+        params: Node params (a private copy of the DSL's; nodes must not mutate them).
+        fn: Registered node callable; loop nodes take an extra run_body callback.
+        body: Loop body nodes, executed in order for every iteration.
+    """
+    id: str
+    type: str
+    params: Dict[str, Any]
+    fn: Callable[..., Any]
+    body: Tuple["PlanNode", ...] = ()
+
+    @property
+    def is_loop(self) -> bool:
+        return self.type in LOOP_TYPES
+
+
+@dataclass(frozen=True)
+class WorkflowPlan:
+    """
+    Immutable execution plan of one workflow version.
+
+    Attributes:
+        workflow_id: Workflow ID.
+        version: Workflow version the plan was compiled from.
+        legacy: Legacy format (a node list) rather than nodes + edges.
+        roots: Legacy format: top-level nodes in execution order.
+        nodes: Standard format: node id -> node, for every node the scheduler runs.
+        preds: Scheduled node id -> predecessor ids (dependencies on body nodes moved to their loop).
+        children: Scheduled node id -> ids of the nodes depending on it.
+        stages: Scheduled node ids in topological levels; nodes of one level are independent.
+        start_nodes: Nodes the scheduler starts from.
+        stalled: Nodes on a dependency cycle (never scheduled).
+        max_concurrency: Nodes of a run executing at the same time.
+        on_error: One of ON_ERROR_POLICIES.
+        unit_of_work: Card write mode of runs (see workflow_uow.UNIT_OF_WORK_MODES).
+    """
+    workflow_id: Optional[int]
+    version: int
+    legacy: bool
+    roots: Tuple[PlanNode, ...] = ()
+    nodes: Dict[str, PlanNode] = field(default_factory=dict)
+    preds: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    children: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    stages: Tuple[Tuple[str, ...], ...] = ()
+    start_nodes: Tuple[str, ...] = ()
+    stalled: Tuple[str, ...] = ()
+    max_concurrency: int = WORKFLOW_MAX_CONCURRENCY
+    on_error: str = "fail_fast"
+    unit_of_work: str = "atomic"
+
+
+def canonicalize(nodes: List[dict]) -> List[dict]:
+    """Normalize DSL:
+    - ForEach/ForEachRange without body -> Fold next node as body, skip separate execution.
+    """
+    out: List[dict] = []
+    i = 0
+    while i < len(nodes):
+        n = nodes[i]
+        ntype = n.get("type")
+        if ntype in LOOP_TYPES and not n.get("body") and i + 1 < len(nodes):
+            compat = dict(n)
+            compat["body"] = [nodes[i + 1]]
+            out.append(compat)
+            logger.warning("[Workflow] Compatibility rewrite: ForEach/Range missing body, folded next node as body")
+            i += 2
+            continue
+        out.append(n)
+        i += 1
+    return out
+
+
+def _bind(type_name: Any) -> Callable[..., Any]:
+    """Registered callable of a node type (unknown types fail when the node runs, as before)."""
+    fn = builtin_nodes.get_registered_nodes().get(type_name)
+    if fn is not None:
+        return fn
+    registered = builtin_nodes.get_node_types()
+
+    def unknown(*_args: Any, **_kwargs: Any) -> None:
+        raise ValueError(f"Unknown node type: {type_name}, registered nodes: {registered}")
+    return unknown
+
+
+def _params(node: dict) -> Dict[str, Any]:
+    params = copy.deepcopy(node.get("params") or {})
+    builtin_nodes.precompile_templates(params)
+    return params
+
+
+def _compile_legacy(nodes: List[dict]) -> Tuple[PlanNode, ...]:
+    out: List[PlanNode] = []
+    for n in canonicalize(nodes):
+        ntype = n.get("type")
+        body = _compile_legacy(list(n.get("body") or [])) if ntype in LOOP_TYPES else ()
+        out.append(PlanNode(id=str(n.get("id") or ""), type=ntype, params=_params(n), fn=_bind(ntype), body=body))
+    return tuple(out)
+
+
+def _topological_stages(scheduled: List[str], preds: Dict[str, Tuple[str, ...]],
+                        children: Dict[str, Tuple[str, ...]]) -> Tuple[Tuple[Tuple[str, ...], ...], Tuple[str, ...]]:
+    """Kahn levels of the scheduled nodes, and the nodes left on cycles."""
+    remaining = {nid: len(preds[nid]) for nid in scheduled}
+    level = [nid for nid in scheduled if remaining[nid] == 0]
+    stages: List[Tuple[str, ...]] = []
+    placed: Set[str] = set()
+    while level:
+        stages.append(tuple(level))
+        placed.update(level)
+        nxt: List[str] = []
+        for nid in level:
+            for child in children.get(nid, ()):
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    nxt.append(child)
+        level = nxt
+    return tuple(stages), tuple(nid for nid in scheduled if nid not in placed)
+
+
+def _compile_standard(workflow_id: Optional[int], dsl: dict) -> Dict[str, Any]:
+    raw_nodes: List[dict] = list(dsl.get("nodes") or [])
+    edges: List[dict] = list(dsl.get("edges") or [])
+    node_map = {n["id"]: n for n in raw_nodes}
+    dependencies: Dict[str, List[str]] = {}  # node_id -> [predecessor_ids]
+    body_edges: Dict[str, List[str]] = {}    # loop node_id -> [body node ids]
+    for edge in edges:
+        source, target = edge["source"], edge["target"]
+        dependencies.setdefault(target, []).append(source)
+        if edge.get("sourceHandle", "r") == "b":
+            body_edges.setdefault(source, []).append(target)
+
+    # Body nodes belong to their loop; a dependency on one is a dependency on the loop
+    owner: Dict[str, str] = {}
+    for loop_id, body_ids in body_edges.items():
+        if node_map.get(loop_id, {}).get("type") in LOOP_TYPES:
+            for body_id in body_ids:
+                owner.setdefault(body_id, loop_id)
+
+    bound: Dict[str, PlanNode] = {}
+
+    def plan_node(nid: str, path: Tuple[str, ...] = ()) -> PlanNode:
+        if nid in bound:
+            return bound[nid]
+        n = node_map[nid]
+        ntype = n.get("type")
+        body: Tuple[PlanNode, ...] = ()
+        if ntype in LOOP_TYPES:
+            body = tuple(
+                plan_node(bid, path + (nid,))
+                for bid in body_edges.get(nid, [])
+                if bid in node_map and bid not in path and bid != nid
+            )
+        pn = PlanNode(id=nid, type=ntype, params=_params(n), fn=_bind(ntype), body=body)
+        bound[nid] = pn
+        return pn
+
+    scheduled = [nid for nid in node_map if nid not in owner]
+    preds: Dict[str, Tuple[str, ...]] = {}
+    children: Dict[str, List[str]] = {}
+    for nid in scheduled:
+        seen: List[str] = []
+        for dep in dependencies.get(nid, []):
+            dep = owner.get(dep, dep)
+            if dep != nid and dep in node_map and dep not in seen:
+                seen.append(dep)
+        preds[nid] = tuple(seen)
+        for dep in seen:
+            children.setdefault(dep, []).append(nid)
+    frozen_children = {k: tuple(v) for k, v in children.items()}
+    stages, stalled = _topological_stages(scheduled, preds, frozen_children)
+    if stalled:
+        logger.warning(f"[Workflow] Nodes on a dependency cycle will never run workflow_id={workflow_id} nodes={list(stalled)}")
+
+    start_nodes = [nid for nid in scheduled if not preds[nid]]
+    if not start_nodes and raw_nodes:
+        logger.warning("[Workflow] No start node, using first node")
+        start_nodes = [raw_nodes[0]["id"]] if raw_nodes[0]["id"] in preds else []
+
+    try:
+        max_concurrency = int(dsl.get("max_concurrency") or WORKFLOW_MAX_CONCURRENCY)
+    except (TypeError, ValueError):
+        max_concurrency = WORKFLOW_MAX_CONCURRENCY
+    return {
+        "nodes": {nid: plan_node(nid) for nid in scheduled},
+        "preds": preds,
+        "children": frozen_children,
+        "stages": stages,
+        "start_nodes": tuple(start_nodes),
+        "stalled": stalled,
+        "max_concurrency": max(1, max_concurrency),
+        "on_error": dsl.get("on_error") if dsl.get("on_error") in ON_ERROR_POLICIES else "fail_fast",
+    }
+
+
+def compile_plan(workflow: Workflow) -> WorkflowPlan:
+    """
+    Compile a workflow's definition into an execution plan.
+
+    Args:
+        workflow: Workflow to compile.
+
+    Returns:
+        WorkflowPlan of the workflow's current version.
+    """
+    dsl: Dict[str, Any] = workflow.definition_json or {}
+    version = workflow.version or 1
+    unit_of_work = resolve_mode(dsl.get("unit_of_work"), dsl.get("on_error"))
+    if "edges" in dsl and isinstance(dsl["edges"], list):
+        return WorkflowPlan(workflow_id=workflow.id, version=version, legacy=False, unit_of_work=unit_of_work,
+                            **_compile_standard(workflow.id, dsl))
+    return WorkflowPlan(
+        workflow_id=workflow.id, version=version, legacy=True, unit_of_work=unit_of_work,
+        roots=_compile_legacy(list(dsl.get("nodes") or [])),
+    )
+
+
+class PlanCache:
+    """
+    LRU cache of compiled plans keyed by (workflow id, version, updated_at), so an edit that
+    bumps either compiles a fresh plan even in worker processes that never saw it. The API
+    also invalidates a workflow's plans when it is updated or deleted. Thread-safe.
+    """
+    def __init__(self, size: Optional[int] = None) -> None:
+        self.size = max(1, WORKFLOW_PLAN_CACHE_SIZE if size is None else size)
+        self._plans: "OrderedDict[Tuple[Optional[int], int, Optional[datetime]], WorkflowPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, workflow: Workflow) -> WorkflowPlan:
+        """Plan of the workflow's current version, compiled on first use."""
+        key = (workflow.id, workflow.version or 1, workflow.updated_at)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+        plan = compile_plan(workflow)
+        if workflow.id is None:
+            return plan
+        with self._lock:
+            # Older versions of the workflow are unreachable now
+            for stale in [k for k in self._plans if k[0] == workflow.id and k != key]:
+                del self._plans[stale]
+            self._plans[key] = plan
+            while len(self._plans) > self.size:
+                self._plans.popitem(last=False)
+        logger.debug(f"[Workflow] Plan compiled workflow_id={workflow.id} version={plan.version}")
+        return plan
+
+    def invalidate(self, workflow_id: Optional[int] = None) -> None:
+        """Drop a workflow's plans (all plans without an id)."""
+        with self._lock:
+            if workflow_id is None:
+                self._plans.clear()
+                return
+            for key in [k for k in self._plans if k[0] == workflow_id]:
+                del self._plans[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Plans held, cache hits and misses."""
+        with self._lock:
+            return {"plans": len(self._plans), "hits": self.hits, "misses": self.misses}
+
+
+plan_cache = PlanCache()
@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import update
+from sqlmodel import Session, select, func
+
+from app.db.models import Workflow, WorkflowJob, WorkflowRun
+from app.db.session import engine
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Runs executing at the same time in this process
+WORKFLOW_MAX_RUNS = _env_int("WORKFLOW_MAX_RUNS", 4)
+# Runs sharing a concurrency key executing at the same time (DSL "concurrency_limit" overrides)
+WORKFLOW_KEY_CONCURRENCY = _env_int("WORKFLOW_KEY_CONCURRENCY", 1)
+# A lease not renewed for this long marks its run as orphaned (worker crashed or was killed)
+WORKFLOW_LEASE_SECONDS = _env_int("WORKFLOW_LEASE_SECONDS", 60)
+WORKFLOW_HEARTBEAT_SECONDS = _env_int("WORKFLOW_HEARTBEAT_SECONDS", 15)
+# Starts of one run (first start plus retries after orphaning) before it is marked failed
+WORKFLOW_JOB_MAX_ATTEMPTS = _env_int("WORKFLOW_JOB_MAX_ATTEMPTS", 3)
+# Finished jobs are kept this long
+WORKFLOW_JOB_RETENTION_HOURS = _env_int("WORKFLOW_JOB_RETENTION_HOURS", 24)
+
+# Milliseconds between queue polls of an idle dispatcher (dispatchers in other processes are not woken)
+WORKFLOW_QUEUE_POLL_MS = _env_int("WORKFLOW_QUEUE_POLL_MS", 1000)
+# inline: the API process executes queued runs; external: only `python -m app.workers` processes do
+WORKFLOW_WORKER_MODE = "external" if os.getenv("WORKFLOW_WORKER_MODE", "inline").strip().lower() == "external" else "inline"
+
+# DSL "concurrency_key": what runs of a workflow queue behind each other by
+CONCURRENCY_SCOPES = ("workflow", "project", "card")
+
+# Lease owner identity of this process
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def queue_enabled() -> bool:
+    """Whether runs go through the durable queue (a dispatcher runs here, or worker processes execute them)."""
+    return WORKFLOW_WORKER_MODE == "external" or dispatcher.running()
+
+
+def concurrency_for(workflow: Workflow, scope: Optional[dict]) -> Tuple[str, int]:
+    """
+    Concurrency key and limit of a run.
+
+    By default all runs of a workflow share one key, so a burst of onsave triggers runs
+    one after another; DSL "concurrency_key" = "project" / "card" narrows the key to the
+    run's project or card, "concurrency_limit" raises the number of runs per key.
+
+    Returns:
+        (key, limit).
+    """
+    dsl = workflow.definition_json or {}
+    kind = dsl.get("concurrency_key") if dsl.get("concurrency_key") in CONCURRENCY_SCOPES else "workflow"
+    scope = scope or {}
+    key = f"workflow:{workflow.id}"
+    if kind == "project" and scope.get("project_id"):
+        key += f"|project:{scope['project_id']}"
+    elif kind == "card" and scope.get("card_id"):
+        key += f"|card:{scope['card_id']}"
+    try:
+        limit = int(dsl.get("concurrency_limit") or WORKFLOW_KEY_CONCURRENCY)
+    except (TypeError, ValueError):
+        limit = WORKFLOW_KEY_CONCURRENCY
+    return key, max(1, limit)
+
+
+def enqueue_run(session: Session, workflow: Workflow, run: WorkflowRun) -> WorkflowJob:
+    """
+    Durably queue a run for the dispatcher.
+
+    Args:
+        session: Database session (committed here).
+        workflow: Workflow of the run.
+        run: Queued WorkflowRun.
+
+    Returns:
+        The committed WorkflowJob.
+    """
+    key, limit = concurrency_for(workflow, run.scope_json)
+    job = WorkflowJob(run_id=run.id, workflow_id=workflow.id, concurrency_key=key, concurrency_limit=limit)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    dispatcher.notify()
+    return job
+
+
+def claim_jobs(session: Session, owner: str, slots: int) -> List[WorkflowJob]:
+    """
+    Lease up to slots due jobs, oldest first, keeping every key within its limit.
+
+    Each claim is a single conditional UPDATE (still pending, key below its limit), so
+    workers in other processes never lease the same job or overrun a key.
+
+    Returns:
+        Leased jobs.
+    """
+    if slots <= 0:
+        return []
+    now = datetime.utcnow()
+    candidates = session.exec(
+        select(WorkflowJob)
+        .where(WorkflowJob.status == "pending", WorkflowJob.available_at <= now)
+        .order_by(WorkflowJob.id)
+        .limit(max(32, slots * 8))
+    ).all()
+    blocked = set()
+    claimed: List[int] = []
+    for job in candidates:
+        if len(claimed) >= slots:
+            break
+        if job.concurrency_key in blocked:
+            continue
+        leased = (
+            select(func.count()).select_from(WorkflowJob)
+            .where(WorkflowJob.concurrency_key == job.concurrency_key, WorkflowJob.status == "leased")
+            .scalar_subquery()
+        )
+        res = session.exec(
+            update(WorkflowJob)
+            .where(WorkflowJob.id == job.id, WorkflowJob.status == "pending", leased < WorkflowJob.concurrency_limit)
+            .values(
+                status="leased",
+                lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=WORKFLOW_LEASE_SECONDS),
+                heartbeat_at=now,
+                attempts=WorkflowJob.attempts + 1,
+            )
+        )
+        if res.rowcount:
+            claimed.append(job.id)
+        else:
+            # Key full (or taken by another worker): keep younger jobs of the key waiting too
+            blocked.add(job.concurrency_key)
+    session.commit()
+    return [j for j in (session.get(WorkflowJob, jid) for jid in claimed) if j is not None]
+
+
+def heartbeat(session: Session, owner: str, job_ids: List[int]) -> None:
+    """Extend the leases of the owner's running jobs."""
+    if not job_ids:
+        return
+    now = datetime.utcnow()
+    session.exec(
+        update(WorkflowJob)
+        .where(WorkflowJob.id.in_(job_ids), WorkflowJob.lease_owner == owner, WorkflowJob.status == "leased")
+        .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=WORKFLOW_LEASE_SECONDS))
+    )
+    session.commit()
+
+
+def finish_job(session: Session, job_id: int, error: Optional[str] = None) -> None:
+    """Mark a leased job done (the run's own status records how it ended)."""
+    job = session.get(WorkflowJob, job_id)
+    if job is None:
+        return
+    job.status = "done"
+    job.finished_at = datetime.utcnow()
+    job.lease_expires_at = None
+    job.last_error = error[:2000] if error else None
+    session.add(job)
+    session.commit()
+
+
+def release_job(session: Session, job_id: int) -> None:
+    """Put an interrupted job back in the queue (shutdown); the start is not counted."""
+    job = session.get(WorkflowJob, job_id)
+    if job is None or job.status != "leased":
+        return
+    job.status = "pending"
+    job.attempts = max(0, job.attempts - 1)
+    job.lease_owner = None
+    job.lease_expires_at = None
+    session.add(job)
+    run = session.get(WorkflowRun, job.run_id)
+    if run is not None and run.status in ("running", "cancelled"):
+        run.status = "queued"
+        run.finished_at = None
+        session.add(run)
+    session.commit()
+
+
+def cancel_pending(session: Session, run_id: int) -> bool:
+    """
+    Cancel a run that has not started yet.
+
+    Returns:
+        True if a pending job was cancelled.
+    """
+    job = session.exec(select(WorkflowJob).where(WorkflowJob.run_id == run_id, WorkflowJob.status == "pending")).first()
+    if job is None:
+        return False
+    now = datetime.utcnow()
+    job.status = "done"
+    job.finished_at = now
+    job.last_error = "cancelled"
+    session.add(job)
+    run = session.get(WorkflowRun, run_id)
+    if run is not None:
+        run.status = "cancelled"
+        run.finished_at = now
+        session.add(run)
+    session.commit()
+    return True
+
+
+def recover_orphans(session: Session) -> int:
+    """
+    Re-queue runs whose worker died.
+
+    Jobs with an expired lease go back to pending (or fail after WORKFLOW_JOB_MAX_ATTEMPTS
+    starts); queued/running runs without a job (created before the queue existed) get one.
+
+    Returns:
+        Number of recovered runs.
+    """
+    now = datetime.utcnow()
+    recovered = 0
+    orphans = session.exec(
+        select(WorkflowJob).where(WorkflowJob.status == "leased", WorkflowJob.lease_expires_at < now)
+    ).all()
+    for job in orphans:
+        run = session.get(WorkflowRun, job.run_id)
+        job.lease_owner = None
+        job.lease_expires_at = None
+        if run is None or job.attempts >= WORKFLOW_JOB_MAX_ATTEMPTS:
+            job.status = "failed"
+            job.finished_at = now
+            job.last_error = f"interrupted {job.attempts} time(s)"
+            if run is not None:
+                run.status = "failed"
+                run.finished_at = now
+                run.error_json = {"message": f"Run interrupted {job.attempts} time(s) (worker stopped), giving up"}
+        else:
+            job.status = "pending"
+            job.available_at = now
+            job.last_error = "lease expired, re-queued"
+            run.status = "queued"
+            recovered += 1
+        session.add(job)
+        if run is not None:
+            session.add(run)
+    jobless = session.exec(
+        select(WorkflowRun).where(
+            WorkflowRun.status.in_(["queued", "running"]),  # type: ignore[arg-type]
+            ~WorkflowRun.id.in_(select(WorkflowJob.run_id)),  # type: ignore[union-attr]
+        )
+    ).all()
+    for run in jobless:
+        workflow = session.get(Workflow, run.workflow_id)
+        if workflow is None:
+            run.status = "failed"
+            run.finished_at = now
+            run.error_json = {"message": "Workflow deleted"}
+            session.add(run)
+            continue
+        key, limit = concurrency_for(workflow, run.scope_json)
+        attempts = 1 if run.status == "running" else 0
+        run.status = "queued"
+        session.add(run)
+        session.add(WorkflowJob(run_id=run.id, workflow_id=workflow.id, concurrency_key=key, concurrency_limit=limit, attempts=attempts))
+        recovered += 1
+    session.commit()
+    if recovered or orphans:
+        logger.info(f"[WorkflowQueue] recovered {recovered} orphaned runs ({len(orphans)} expired leases)")
+    return recovered
+
+
+def prune_jobs(session: Session) -> int:
+    """Delete finished jobs older than WORKFLOW_JOB_RETENTION_HOURS."""
+    cutoff = datetime.utcnow() - timedelta(hours=WORKFLOW_JOB_RETENTION_HOURS)
+    old = session.exec(
+        select(WorkflowJob).where(WorkflowJob.status.in_(["done", "failed"]), WorkflowJob.finished_at < cutoff)  # type: ignore[arg-type]
+    ).all()
+    for job in old:
+        session.delete(job)
+    session.commit()
+    return len(old)
+
+
+def queue_stats(session: Session) -> Dict[str, int]:
+    """Job counts by status."""
+    rows = session.exec(select(WorkflowJob.status, func.count()).group_by(WorkflowJob.status)).all()
+    return {status: int(n) for status, n in rows}
+
+
+def _with_session(fn, *args):
+    with Session(engine) as session:
+        return fn(session, *args)
+
+
+class WorkflowDispatcher:
+    """
+    Event-loop task executing queued workflow runs.
+
+    Claims due jobs while fewer than max_runs execute here, renews their leases every
+    WORKFLOW_HEARTBEAT_SECONDS and re-queues runs whose lease expired (a crashed worker)
+    on start and then periodically. On shutdown the runs still executing are cancelled and
+    put back in the queue, so the next start resumes them.
+    """
+    def __init__(self, owner: str = WORKER_ID, max_runs: Optional[int] = None, remote_cancel: bool = False) -> None:
+        self.owner = owner
+        self.max_runs = max(1, WORKFLOW_MAX_RUNS if max_runs is None else max_runs)
+        # Worker process: cancel requests arrive through the event broker
+        self.remote_cancel = remote_cancel
+        self._cancel_seen = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # job id -> task executing its run, job id -> run id
+        self._active: Dict[int, asyncio.Task] = {}
+        self._runs: Dict[int, int] = {}
+        self._stopping = False
+
+    def running(self) -> bool:
+        """Whether the dispatcher task is alive."""
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the dispatcher on the running event loop (idempotent)."""
+        if self.running():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = self._loop.create_task(self._main())
+
+    async def stop(self) -> None:
+        """Stop claiming, cancel executing runs and put them back in the queue."""
+        self._stopping = True
+        if self._task is not None:
+            self.notify()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        active = list(self._active.values())
+        for task in active:
+            task.cancel()
+        await asyncio.gather(*active, return_exceptions=True)
+
+    def notify(self) -> None:
+        """Wake the dispatcher (job queued or finished); callable from any thread."""
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            pass
+
+    async def _main(self) -> None:
+        await asyncio.to_thread(_with_session, recover_orphans)
+        last_heartbeat = last_recover = last_prune = time.monotonic()
+        # asyncio.wait_for (Python < 3.12) can swallow a cancel that races its timeout
+        while not self._stopping:
+            now = time.monotonic()
+            try:
+                if self._active and now - last_heartbeat >= WORKFLOW_HEARTBEAT_SECONDS:
+                    await asyncio.to_thread(_with_session, heartbeat, self.owner, list(self._active))
+                    last_heartbeat = now
+                if now - last_recover >= WORKFLOW_LEASE_SECONDS:
+                    await asyncio.to_thread(_with_session, recover_orphans)
+                    last_recover = now
+                if now - last_prune >= 600:
+                    await asyncio.to_thread(_with_session, prune_jobs)
+                    last_prune = now
+                if self.remote_cancel and self._active:
+                    await self._apply_cancel_requests()
+                jobs = await asyncio.to_thread(_with_session, claim_jobs, self.owner, self.max_runs - len(self._active))
+                for job in jobs:
+                    self._launch(job.id, job.run_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"[WorkflowQueue] dispatcher round failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=min(max(0.05, WORKFLOW_QUEUE_POLL_MS / 1000.0), WORKFLOW_HEARTBEAT_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _launch(self, job_id: int, run_id: int) -> None:
+        task = asyncio.get_running_loop().create_task(self._execute(job_id, run_id))
+        self._active[job_id] = task
+        self._runs[job_id] = run_id
+
+        def _done(_t: asyncio.Task, jid: int = job_id) -> None:
+            self._active.pop(jid, None)
+            self._runs.pop(jid, None)
+            if self._wake is not None:
+                self._wake.set()
+
+        task.add_done_callback(_done)
+
+    async def _apply_cancel_requests(self) -> None:
+        from app.services.workflow_events import broker
+
+        wanted, self._cancel_seen = await asyncio.to_thread(broker.cancel_requests, list(self._runs.values()), self._cancel_seen)
+        for job_id, run_id in list(self._runs.items()):
+            task = self._active.get(job_id)
+            if run_id in wanted and task is not None and not task.done():
+                logger.info(f"[WorkflowQueue] cancel requested run_id={run_id}")
+                task.cancel()
+
+    async def _execute(self, job_id: int, run_id: int) -> None:
+        from app.services.workflow_engine import engine as wf_engine
+
+        logger.info(f"[WorkflowQueue] starting run_id={run_id} job_id={job_id}")
+        try:
+            await wf_engine.execute(run_id)
+        except asyncio.CancelledError:
+            if self._stopping:
+                await asyncio.to_thread(_with_session, release_job, job_id)
+                raise
+            await asyncio.to_thread(_with_session, finish_job, job_id, "cancelled")
+            return
+        except Exception as e:  # noqa: BLE001
+            logger.exception(f"[WorkflowQueue] run_id={run_id} crashed: {e}")
+            await asyncio.to_thread(_with_session, finish_job, job_id, str(e))
+            return
+        await asyncio.to_thread(_with_session, finish_job, job_id)
+
+
+dispatcher = WorkflowDispatcher()
+
+
+def start_dispatcher() -> None:
+    """Start executing queued workflow runs (call from the app's event loop)."""
+    dispatcher.start()
+
+
+async def stop_dispatcher() -> None:
+    """Stop the dispatcher; executing runs are re-queued for the next start."""
+    await dispatcher.stop()
@@ -1,30 +1,158 @@
-from typing import List, Dict
+import asyncio
+import heapq
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Dict, Optional, Set, Tuple
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
 from sqlmodel import Session, select
 from time import monotonic
 
-from app.db.models import WorkflowTrigger, Card, Workflow, WorkflowRun
+from app.db.models import WorkflowTrigger, Card, CardType, Workflow, WorkflowRun
+from app.db.session import engine as db_engine
+from app.services import workflow_queue
+from app.services.trigger_filters import CompiledFilter, card_view, changed_paths, compile_filter
 from app.services.workflow_engine import engine as wf_engine
 
 
-def _match_triggers_for_card(session: Session, event: str, card: Card) -> List[WorkflowTrigger]:
-    """Helper to find matching triggers for a card event."""
-    q = select(WorkflowTrigger).where(
-        WorkflowTrigger.trigger_on == event,
-        WorkflowTrigger.is_active == True,  # noqa: E712
-    )
-    triggers = session.exec(q).all()
-    matched: List[WorkflowTrigger] = []
-    for t in triggers:
-        # Filter card_type
-        if t.card_type_name and card.card_type and card.card_type.name != t.card_type_name:
-            continue
-        # filter_json reserved: Complex matching not implemented yet
-        matched.append(t)
-    return matched
+@dataclass(frozen=True)
+class IndexedTrigger:
+    """
+    Active trigger of an active workflow, as held by the trigger index.
+
+    Attributes:
+        trigger_id: Trigger ID.
+        workflow_id: Workflow ID.
+        card_type_name: Card type the trigger is limited to (None: any).
+        filter: Compiled filter_json (None: no filter).
+    """
+    trigger_id: int
+    workflow_id: int
+    card_type_name: Optional[str]
+    filter: Optional[CompiledFilter]
+
+
+class TriggerIndex:
+    """
+    In-memory index of active triggers by (event, card type name).
+
+    Rebuilt lazily after a commit touches a trigger, a workflow or a card type, so a card
+    save looks up its triggers without a query; filter_json is compiled once per rebuild.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._built = -1
+        self._by_key: Dict[Tuple[str, Optional[str]], Tuple[IndexedTrigger, ...]] = {}
+        self._by_event: Dict[str, Tuple[IndexedTrigger, ...]] = {}
+        self._type_names: Dict[int, str] = {}
+
+    def invalidate(self) -> None:
+        """Rebuild on the next lookup."""
+        with self._lock:
+            self._generation += 1
+
+    def _ensure(self, session: Session) -> None:
+        with self._lock:
+            if self._built == self._generation:
+                return
+            generation = self._generation
+        rows = session.exec(
+            select(WorkflowTrigger)
+            .join(Workflow, Workflow.id == WorkflowTrigger.workflow_id)  # type: ignore[arg-type]
+            .where(WorkflowTrigger.is_active == True, Workflow.is_active == True)  # noqa: E712
+            .order_by(WorkflowTrigger.id)
+        ).all()
+        type_names = {int(tid): name for tid, name in session.exec(select(CardType.id, CardType.name)).all()}
+        by_key: Dict[Tuple[str, Optional[str]], List[IndexedTrigger]] = {}
+        by_event: Dict[str, List[IndexedTrigger]] = {}
+        for t in rows:
+            try:
+                compiled = compile_filter(t.filter_json)
+            except ValueError as e:
+                logger.warning(f"[Triggers] trigger {t.id} ignored, invalid filter_json: {e}")
+                continue
+            item = IndexedTrigger(trigger_id=int(t.id), workflow_id=int(t.workflow_id), card_type_name=t.card_type_name or None, filter=compiled)
+            by_key.setdefault((t.trigger_on, item.card_type_name), []).append(item)
+            by_event.setdefault(t.trigger_on, []).append(item)
+        with self._lock:
+            self._by_key = {k: tuple(v) for k, v in by_key.items()}
+            self._by_event = {k: tuple(v) for k, v in by_event.items()}
+            self._type_names = type_names
+            # A commit during the rebuild leaves the index stale, so the next lookup rebuilds again
+            self._built = generation
+
+    def lookup(self, session: Session, event_name: str, card_type_id: Optional[int] = None, any_type: bool = False) -> Tuple[Optional[str], List[IndexedTrigger]]:
+        """
+        Triggers of an event for a card type.
+
+        Args:
+            session: Database session (used only to rebuild a stale index).
+            event_name: Trigger event (onsave | ongenfinish | onprojectcreate).
+            card_type_id: Card type of the card the event is about.
+            any_type: Return the event's triggers of every card type (event without a card).
+
+        Returns:
+            (card type name, matching triggers in trigger ID order).
+        """
+        self._ensure(session)
+        with self._lock:
+            if any_type:
+                return None, list(self._by_event.get(event_name, ()))
+            name = self._type_names.get(card_type_id) if card_type_id is not None else None
+            matched = list(self._by_key.get((event_name, None), ()))
+            if name is not None:
+                matched += self._by_key.get((event_name, name), ())
+        matched.sort(key=lambda t: t.trigger_id)
+        return name, matched
+
+
+trigger_index = TriggerIndex()
+_DIRTY_KEY = "workflow_triggers.dirty"
 
 
-_recent_keys: Dict[str, float] = {}
-_DEBOUNCE_MS = 1500  # Same key won't trigger again within this window
+@event.listens_for(OrmSession, "after_flush")
+def _collect_trigger_changes(session, flush_context) -> None:
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (WorkflowTrigger, Workflow, CardType)):
+            session.info[_DIRTY_KEY] = True
+            return
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _invalidate_trigger_index(session) -> None:
+    if session.info.pop(_DIRTY_KEY, None):
+        trigger_index.invalidate()
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _drop_trigger_changes(session) -> None:
+    session.info.pop(_DIRTY_KEY, None)
+
+
+def _filtered(triggers: List[IndexedTrigger], card: Card | None, card_type_name: Optional[str], previous: Optional[Dict[str, Any]] = None) -> List[IndexedTrigger]:
+    """Triggers whose filter_json holds for the card (filters need a card; without one they are skipped)."""
+    if card is None or not any(t.filter for t in triggers):
+        return triggers
+    view = card_view(card, card_type_name)
+    memo: Dict[str, Optional[Set[str]]] = {}
+
+    def changes() -> Optional[Set[str]]:
+        if "v" not in memo:
+            memo["v"] = changed_paths(previous, view) if previous is not None else None
+        return memo["v"]
+
+    out: List[IndexedTrigger] = []
+    for t in triggers:
+        try:
+            if t.filter is None or t.filter.match(view, changes):
+                out.append(t)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"[Triggers] filter of trigger {t.trigger_id} failed: {e}")
+    return out
 
 
 def _make_idempotency_key(event: str, workflow_id: int, card: Card | None, project_id: int | None) -> str:
@@ -34,70 +162,272 @@ def _make_idempotency_key(event: str, workflow_id: int, card: Card | None, proje
     return f"evt:{event}|wf:{workflow_id}|card:{card_id}|proj:{proj_id}"
 
 
-def _should_suppress(session: Session, key: str, workflow_id: int) -> bool:
-    """Check if trigger should be suppressed (debouncing/duplication check)."""
-    # 1) In-process debounce
-    now = monotonic()
-    last = _recent_keys.get(key)
-    if last is not None and (now - last) * 1000 < _DEBOUNCE_MS:
-        return True
-    # Clean up expired items to avoid leaks
+def _env_int(name: str, default: int) -> int:
     try:
-        for k, v in list(_recent_keys.items()):
-            if (now - v) * 1000 > 60000:
-                _recent_keys.pop(k, None)
-    except Exception:
-        pass
-    # 2) Persistence layer "No secondary trigger in same run cycle": Check for running task with same idempotency key
-    existing = session.exec(
-        select(WorkflowRun).where(
-            WorkflowRun.workflow_id == workflow_id,
-            WorkflowRun.idempotency_key == key,
-            WorkflowRun.status.in_(["queued", "running"]),  # type: ignore[arg-type]
-        )
-    ).first()
-    if existing:
-        return True
-    # Mark current
-    _recent_keys[key] = now
-    return False
-
-
-def trigger_on_card_save(session: Session, card: Card) -> List[int]:
-    """Trigger OnSave workflows after card save/update, return run_id list."""
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Quiet period after the last trigger of a key before its run starts
+WORKFLOW_TRIGGER_QUIET_MS = _env_int("WORKFLOW_TRIGGER_QUIET_MS", 1500)
+# Scheduled (debounced) run not started yet
+SCHEDULED = "scheduled"
+
+
+@dataclass
+class _Pending:
+    run_id: int
+    due: float
+    # Run of the same key that was queued/running when this one was scheduled; this one waits for it
+    after_run_id: Optional[int]
+
+
+class TriggerCoalescer:
+    """
+    Trailing-edge debounce of triggered runs, per idempotency key (event, workflow, card/project).
+
+    The first trigger of a key creates a run in status "scheduled" (its ID goes back to the
+    caller, whose event stream replays from the start); further triggers of the key only push
+    its start WORKFLOW_TRIGGER_QUIET_MS past the latest one, so a burst of autosaves runs once,
+    on the last edit. Triggers arriving while a run of the key is queued or running schedule
+    exactly one follow-up run, started after the quiet period and once that run has finished.
+    Due times live in a heap with one entry per scheduled key (re-armed lazily when popped early),
+    so nothing is scanned. Scheduled runs survive restarts and are re-armed on start.
+    """
+    def __init__(self, quiet_ms: Optional[int] = None) -> None:
+        self.quiet = max(0, WORKFLOW_TRIGGER_QUIET_MS if quiet_ms is None else quiet_ms) / 1000.0
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _Pending] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def running(self) -> bool:
+        """Whether the scheduler task is alive."""
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the scheduler on the running event loop (idempotent)."""
+        if self.running():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = self._loop.create_task(self._main())
+
+    async def stop(self) -> None:
+        """Stop the scheduler; scheduled runs stay in the database and are re-armed on the next start."""
+        self._stopping = True
+        if self._task is not None:
+            self._notify()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        with self._lock:
+            self._pending.clear()
+            self._heap.clear()
+
+    def _notify(self) -> None:
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                pass
+
+    def submit(self, session: Session, key: str, workflow: Workflow, scope_json: dict) -> Optional[int]:
+        """
+        Trigger a run of workflow for key.
+
+        Args:
+            session: Database session.
+            key: Idempotency key of the trigger.
+            workflow: Workflow to run.
+            scope_json: Run scope.
+
+        Returns:
+            ID of the (possibly shared) run.
+        """
+        if not self.running():
+            # No scheduler (scripts, tests without the app lifespan): start right away
+            run = wf_engine.create_run(session, workflow, scope_json=scope_json, params_json={}, idempotency_key=key)
+            wf_engine.run(session, run)
+            return run.id
+        shared = self._extend(key)
+        if shared is not None:
+            return shared
+        # Database work outside the lock: saves of other keys must not wait for it
+        active = session.exec(
+            select(WorkflowRun.id)
+            .where(WorkflowRun.idempotency_key == key, WorkflowRun.status.in_(["queued", "running"]))  # type: ignore[arg-type]
+            .order_by(WorkflowRun.id.desc())  # type: ignore[union-attr]
+        ).first()
+        run = wf_engine.create_run(session, workflow, scope_json=scope_json, params_json={}, idempotency_key=key, status=SCHEDULED)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                due = monotonic() + self.quiet
+                self._pending[key] = _Pending(run_id=int(run.id), due=due, after_run_id=active)
+                heapq.heappush(self._heap, (due, key))
+            else:
+                pending.due = monotonic() + self.quiet
+        if pending is not None:
+            # A concurrent save of the same key scheduled a run first: share it, drop ours
+            session.delete(run)
+            session.commit()
+            return pending.run_id
+        self._notify()
+        return run.id
+
+    def _extend(self, key: str) -> Optional[int]:
+        """Push back the run scheduled for key, if any; returns its ID."""
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                return None
+            # The heap entry is re-armed when it pops before the new due time
+            pending.due = monotonic() + self.quiet
+            return pending.run_id
+
+    def _take_due(self) -> List[Tuple[str, _Pending]]:
+        now = monotonic()
+        ready: List[Tuple[str, _Pending]] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, key = heapq.heappop(self._heap)
+                pending = self._pending.get(key)
+                if pending is None:
+                    continue
+                if pending.due > now:
+                    heapq.heappush(self._heap, (pending.due, key))
+                    continue
+                ready.append((key, pending))
+        return ready
+
+    def _next_delay(self) -> Optional[float]:
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - monotonic())
+
+    @staticmethod
+    def _is_active(run_id: int) -> bool:
+        with Session(db_engine) as session:
+            run = session.get(WorkflowRun, run_id)
+            return run is not None and run.status in ("queued", "running")
+
+    @staticmethod
+    def _release(run_id: int) -> Optional[WorkflowRun]:
+        """Move a scheduled run to queued; returns it if it still has to be started here."""
+        with Session(db_engine) as session:
+            run = session.get(WorkflowRun, run_id)
+            if run is None or run.status != SCHEDULED:
+                # Cancelled while scheduled
+                return None
+            run.status = "queued"
+            session.add(run)
+            session.commit()
+            session.refresh(run)
+            if workflow_queue.queue_enabled():
+                wf_engine.run(session, run)
+                return None
+            return run
+
+    async def _fire(self, key: str, pending: _Pending) -> None:
+        if pending.after_run_id is not None and await asyncio.to_thread(self._is_active, pending.after_run_id):
+            with self._lock:
+                pending.due = monotonic() + self.quiet
+                heapq.heappush(self._heap, (pending.due, key))
+            return
+        with self._lock:
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+        run = await asyncio.to_thread(self._release, pending.run_id)
+        if run is not None:
+            with Session(db_engine) as session:
+                wf_engine.run(session, run)
+        logger.info(f"[Triggers] scheduled run started run_id={pending.run_id} key={key}")
+
+    def _resume(self) -> None:
+        """Re-arm runs scheduled before the last shutdown."""
+        with Session(db_engine) as session:
+            runs = session.exec(select(WorkflowRun).where(WorkflowRun.status == SCHEDULED).order_by(WorkflowRun.id)).all()
+            due = monotonic() + self.quiet
+            with self._lock:
+                for run in runs:
+                    key = run.idempotency_key or f"run:{run.id}"
+                    if key in self._pending:
+                        run.status = "cancelled"
+                        run.finished_at = datetime.utcnow()
+                        session.add(run)
+                        continue
+                    self._pending[key] = _Pending(run_id=int(run.id), due=due, after_run_id=None)
+                    heapq.heappush(self._heap, (due, key))
+            session.commit()
+
+    async def _main(self) -> None:
+        await asyncio.to_thread(self._resume)
+        # asyncio.wait_for (Python < 3.12) can swallow a cancel that races its timeout
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._next_delay())
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            for key, pending in self._take_due():
+                try:
+                    await self._fire(key, pending)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:  # noqa: BLE001
+                    logger.error(f"[Triggers] failed to start scheduled run_id={pending.run_id}: {e}")
+
+
+coalescer = TriggerCoalescer()
+
+
+def start_coalescer() -> None:
+    """Start the debounce scheduler (call from the app's event loop)."""
+    coalescer.start()
+
+
+async def stop_coalescer() -> None:
+    """Stop the debounce scheduler."""
+    await coalescer.stop()
+
+
+def trigger_on_card_save(session: Session, card: Card, previous: Optional[Dict[str, Any]] = None) -> List[int]:
+    """
+    Trigger OnSave workflows after card save/update, return run_id list.
+
+    Args:
+        session: Database session.
+        card: Saved card.
+        previous: card_view of the card before the save, for "changed" filters (None: new card or unknown).
+    """
     run_ids: List[int] = []
-    triggers = _match_triggers_for_card(session, "onsave", card)
-    for t in triggers:
+    type_name, triggers = trigger_index.lookup(session, "onsave", card.card_type_id)
+    if not triggers:
+        return run_ids
+    for t in _filtered(triggers, card, type_name, previous):
         wf = session.get(Workflow, t.workflow_id)
         if not wf or not wf.is_active:
             continue
         idem_key = _make_idempotency_key("onsave", int(t.workflow_id), card, card.project_id)
-        if _should_suppress(session, idem_key, int(t.workflow_id)):
-            continue
-        run = wf_engine.create_run(
-            session=session,
-            workflow=wf,
-            scope_json={"card_id": card.id, "project_id": card.project_id},
-            params_json={},
-            idempotency_key=idem_key,
-        )
-        wf_engine.run(session, run)
-        if run.id:
-            run_ids.append(int(run.id))
+        run_id = coalescer.submit(session, idem_key, wf, {"card_id": card.id, "project_id": card.project_id})
+        if run_id:
+            run_ids.append(int(run_id))
     return run_ids
 
 
 def trigger_on_generate_finish(session: Session, card: Card | None, project_id: int | None) -> List[int]:
     """Trigger OnGenerateFinish workflows after generation/continuation, return run_id list."""
     run_ids: List[int] = []
-    q = select(WorkflowTrigger).where(
-        WorkflowTrigger.trigger_on == "ongenfinish",
-        WorkflowTrigger.is_active == True,  # noqa: E712
-    )
-    triggers = session.exec(q).all()
-    for t in triggers:
-        if card and t.card_type_name and card.card_type and card.card_type.name != t.card_type_name:
-            continue
+    type_name, triggers = trigger_index.lookup(session, "ongenfinish", card.card_type_id if card else None, any_type=card is None)
+    for t in _filtered(triggers, card, type_name):
         wf = session.get(Workflow, t.workflow_id)
         if not wf or not wf.is_active:
             continue
@@ -105,12 +435,9 @@ def trigger_on_generate_finish(session: Session, card: Card | None, project_id:
         if card and card.id:
             scope["card_id"] = card.id
         idem_key = _make_idempotency_key("ongenfinish", int(t.workflow_id), card, project_id)
-        if _should_suppress(session, idem_key, int(t.workflow_id)):
-            continue
-        run = wf_engine.create_run(session, wf, scope_json=scope, params_json={}, idempotency_key=idem_key)
-        wf_engine.run(session, run)
-        if run.id:
-            run_ids.append(int(run.id))
+        run_id = coalescer.submit(session, idem_key, wf, scope)
+        if run_id:
+            run_ids.append(int(run_id))
     return run_ids
 
 
@@ -120,27 +447,13 @@ def trigger_on_project_create(session: Session, project_id: int) -> List[int]:
     Scope contains only project_id, no card_id.
     """
     run_ids: List[int] = []
-    triggers = session.exec(
-        select(WorkflowTrigger).where(
-            WorkflowTrigger.trigger_on == "onprojectcreate",
-            WorkflowTrigger.is_active == True,
-        )
-    ).all()
+    _, triggers = trigger_index.lookup(session, "onprojectcreate", any_type=True)
     for t in triggers:
         wf = session.get(Workflow, t.workflow_id)
         if not wf or not wf.is_active:
             continue
         idem_key = _make_idempotency_key("onprojectcreate", int(t.workflow_id), None, project_id)
-        if _should_suppress(session, idem_key, int(t.workflow_id)):
-            continue
-        run = wf_engine.create_run(
-            session=session,
-            workflow=wf,
-            scope_json={"project_id": project_id},
-            params_json={},
-            idempotency_key=idem_key,
-        )
-        wf_engine.run(session, run)
-        if run.id:
-            run_ids.append(int(run.id))
+        run_id = coalescer.submit(session, idem_key, wf, {"project_id": project_id})
+        if run_id:
+            run_ids.append(int(run_id))
     return run_ids
@@ -0,0 +1,265 @@
+"""
+Run-level unit of work for the card writes of workflow nodes.
+
+Instead of committing every write, nodes of a run record them here (see nodes._save_card /
+nodes._insert_card): updates of one card merge into its pending field values, new cards get
+a temporary negative id until they are inserted, and reads through the unit of work see the
+pending values. Everything pending is written in one transaction per flush.
+
+Modes (DSL "unit_of_work", default WORKFLOW_UNIT_OF_WORK):
+    atomic  (default) flush once when the run succeeds; a failed or cancelled run writes nothing
+            (workflows with on_error "continue" default to batch)
+    batch   checkpoints: flush after each succeeded top-level node and whenever
+            WORKFLOW_UOW_MAX_PENDING cards are pending. Not failure-safe: a failed run keeps
+            the checkpoints already flushed (its unflushed tail is discarded)
+    off     every write commits right away
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from loguru import logger
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, select
+
+from app.db.models import Card
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+UNIT_OF_WORK_MODES = ("off", "batch", "atomic")
+# Default unit of work of workflow runs whose DSL sets no "unit_of_work"
+WORKFLOW_UNIT_OF_WORK = os.getenv("WORKFLOW_UNIT_OF_WORK", "atomic")
+if WORKFLOW_UNIT_OF_WORK not in UNIT_OF_WORK_MODES:
+    WORKFLOW_UNIT_OF_WORK = "atomic"
+# Cards pending in a batch unit of work before it flushes on its own
+WORKFLOW_UOW_MAX_PENDING = _env_int("WORKFLOW_UOW_MAX_PENDING", 500)
+
+# State key holding the run's unit of work (shared by every node and loop iteration of the run)
+UNIT_OF_WORK_KEY = "unit_of_work"
+
+_CARD_COLUMNS = [c.name for c in Card.__table__.columns if c.name != "id"]  # type: ignore[attr-defined]
+
+
+def resolve_mode(value: Any, on_error: Any = None) -> str:
+    """
+    Unit of work mode of a DSL value (the default for missing or unknown ones).
+
+    A workflow with on_error "continue" and no mode of its own asks to keep what succeeded,
+    which an atomic unit of work would discard, so it gets batch checkpoints instead.
+    """
+    if value in UNIT_OF_WORK_MODES:
+        return value
+    if on_error == "continue" and WORKFLOW_UNIT_OF_WORK == "atomic":
+        return "batch"
+    return WORKFLOW_UNIT_OF_WORK
+
+
+class CardUnitOfWork:
+    """
+    Pending card writes of one workflow run. Thread-safe: parallel nodes and concurrent loop
+    iterations of the run share it.
+    """
+    def __init__(self, bind: Any, mode: str = "atomic", max_pending: Optional[int] = None) -> None:
+        self.bind = bind
+        self.mode = mode
+        self.max_pending = max(1, WORKFLOW_UOW_MAX_PENDING if max_pending is None else max_pending)
+        self._lock = threading.RLock()
+        # card id -> field -> latest value
+        self._updates: Dict[int, Dict[str, Any]] = {}
+        # temporary id -> new card (insertion order; parents before their children)
+        self._inserts: Dict[int, Card] = {}
+        self._next_temp = -1
+        # temporary id -> id of the inserted row
+        self.id_map: Dict[int, int] = {}
+        self.written: Set[int] = set()
+        self.discarded = False
+        self.writes = 0
+        self.ignored = 0
+        self.merged = 0
+        self.flushes = 0
+
+    # ---------------- reads ----------------
+    def overlay(self, card: Card) -> Card:
+        """Apply the pending field values of a loaded card (without marking it dirty)."""
+        with self._lock:
+            fields = self._updates.get(card.id) if card.id is not None else None
+            if fields:
+                for key, value in fields.items():
+                    set_committed_value(card, key, value)
+        return card
+
+    def load(self, session: Session, card_id: int) -> Optional[Card]:
+        """A card as the run sees it: pending new cards, and stored cards with pending values."""
+        card_id = int(card_id)
+        with self._lock:
+            if card_id < 0:
+                if card_id in self._inserts:
+                    return self._inserts[card_id]
+                card_id = self.id_map.get(card_id, card_id)
+                if card_id < 0:
+                    return None
+        card = session.get(Card, card_id)
+        return self.overlay(card) if card is not None else None
+
+    def children(self, session: Session, project_id: int, parent_id: Optional[int], card_type_id: int) -> List[Card]:
+        """Stored and pending children of a parent with the given type."""
+        out: List[Card] = []
+        if parent_id is None or parent_id > 0:
+            out = [self.overlay(c) for c in session.exec(
+                select(Card).where(
+                    Card.project_id == project_id,
+                    Card.parent_id == parent_id,
+                    Card.card_type_id == card_type_id,
+                )
+            ).all()]
+        with self._lock:
+            out.extend(
+                c for c in self._inserts.values()
+                if c.project_id == project_id and c.parent_id == parent_id and c.card_type_id == card_type_id
+            )
+        return out
+
+    # ---------------- writes ----------------
+    def update(self, card: Card, changes: Dict[str, Any]) -> Card:
+        """Record field changes of a card (merged with earlier pending changes of the same card)."""
+        with self._lock:
+            if self._ignore_write():
+                return card
+            self.writes += 1
+            if card.id is not None and card.id < 0:
+                # Not inserted yet: the pending insert carries the values
+                for key, value in changes.items():
+                    setattr(card, key, value)
+                return card
+            pending = self._updates.setdefault(int(card.id), {})
+            if pending:
+                self.merged += 1
+            pending.update(changes)
+            persistent = sa_inspect(card).identity is not None
+            for key, value in changes.items():
+                if persistent:
+                    set_committed_value(card, key, value)
+                else:
+                    setattr(card, key, value)
+        self._maybe_flush()
+        return card
+
+    def insert(self, card: Card) -> Card:
+        """Record a new card; it carries a temporary negative id until flushed."""
+        with self._lock:
+            temp_id = self._next_temp
+            self._next_temp -= 1
+            card.id = temp_id
+            if self._ignore_write():
+                return card
+            self.writes += 1
+            self._inserts[temp_id] = card
+        self._maybe_flush()
+        return card
+
+    def pending(self) -> int:
+        """Cards with pending writes."""
+        with self._lock:
+            return len(self._updates) + len(self._inserts)
+
+    def _ignore_write(self) -> bool:
+        # Node threads of a failed or cancelled run may still be running after finish(False)
+        if not self.discarded:
+            return False
+        self.ignored += 1
+        if self.ignored == 1:
+            logger.info("[Workflow] Unit of work discarded: ignoring writes of nodes still running")
+        return True
+
+    def _maybe_flush(self) -> None:
+        if self.mode == "batch" and self.pending() >= self.max_pending:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write everything pending in one transaction.
+
+        Returns:
+            Cards written.
+        """
+        with self._lock:
+            if self.discarded or (not self._updates and not self._inserts):
+                return 0
+            ids: Dict[int, int] = {}
+            with Session(self.bind) as session:
+                try:
+                    for card_id, fields in self._updates.items():
+                        row = session.get(Card, card_id)
+                        if row is None:
+                            logger.warning(f"[Workflow] Unit of work: card {card_id} was deleted, dropping its changes")
+                            continue
+                        for key, value in fields.items():
+                            setattr(row, key, value)
+                        session.add(row)
+                    for temp_id, card in self._inserts.items():
+                        values = {name: getattr(card, name) for name in _CARD_COLUMNS}
+                        if values.get("parent_id") is not None and values["parent_id"] < 0:
+                            values["parent_id"] = ids.get(values["parent_id"], self.id_map.get(values["parent_id"]))
+                        row = Card(**values)
+                        session.add(row)
+                        session.flush()
+                        ids[temp_id] = int(row.id)
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    raise
+            written = len(self._updates) + len(self._inserts)
+            self.written.update(self._updates)
+            self.written.update(ids.values())
+            for temp_id, card in self._inserts.items():
+                # Cards held in node states now name their row
+                card.id = ids[temp_id]
+                if card.parent_id is not None and card.parent_id < 0:
+                    card.parent_id = ids.get(card.parent_id, self.id_map.get(card.parent_id))
+            self.id_map.update(ids)
+            self._updates.clear()
+            self._inserts.clear()
+            self.flushes += 1
+            logger.info(f"[Workflow] Unit of work flushed cards={written} inserted={len(ids)} writes={self.writes} merged={self.merged}")
+            return written
+
+    def discard(self) -> None:
+        """Drop everything pending; later writes are ignored and nothing is flushed any more."""
+        with self._lock:
+            dropped = len(self._updates) + len(self._inserts)
+            self._updates.clear()
+            self._inserts.clear()
+            self.discarded = True
+            if dropped:
+                logger.info(f"[Workflow] Unit of work discarded cards={dropped}")
+
+    def finish(self, succeeded: bool) -> None:
+        """End of run: flush what is pending when the run succeeded, discard it otherwise."""
+        if succeeded:
+            self.flush()
+        else:
+            self.discard()
+
+    def resolve_ids(self, card_ids: Iterable[int]) -> List[int]:
+        """
+        Affected card ids with temporary ids replaced. After a discard only cards written
+        by earlier batch checkpoints remain.
+        """
+        out: Set[int] = set()
+        with self._lock:
+            for cid in card_ids:
+                cid = self.id_map.get(int(cid), int(cid))
+                if self.discarded and cid not in self.written:
+                    continue
+                if cid > 0:
+                    out.add(cid)
+        return sorted(out)
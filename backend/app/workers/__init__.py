@@ -0,0 +1,7 @@
+"""
+Out-of-process workflow workers.
+
+Run `python -m app.workers` next to an API started with WORKFLOW_WORKER_MODE=external: the
+worker processes claim queued runs from the database and publish their events through the
+database event broker (app.services.workflow_events).
+"""
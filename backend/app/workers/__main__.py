@@ -0,0 +1,14 @@
+"""
+Workflow worker processes.
+
+Each process runs a run dispatcher claiming queued workflow runs from the shared database;
+step events reach the API's /workflows/runs/{id}/events subscribers through the event broker.
+A worker that exits is restarted; runs it held are re-queued once their leases expire.
+
+Usage (from backend/):
+    python -m app.workers --processes 3 --runs 4
+"""
+from app.workers.runner import main
+
+if __name__ == "__main__":
+    main()
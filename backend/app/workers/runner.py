@@ -0,0 +1,101 @@
+"""
+Worker process entry points (module-level so spawned processes can import them).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+
+def _load_env() -> None:
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    for p in (os.path.join(backend_dir, ".env"), os.path.join(os.getcwd(), ".env")):
+        if os.path.isfile(p):
+            load_dotenv(p, override=False)
+
+
+async def _serve(max_runs: Optional[int]) -> None:
+    from loguru import logger
+    from app.services import card_changes, workflow_queue
+    from app.services.workflow_engine import engine as wf_engine
+    from app.services.workflow_events import broker
+
+    wf_engine.broker_events = True
+    broker.start()
+    # Card writes reach the API's caches as changed messages when a run finishes
+    card_changes.track()
+    workflow_queue.dispatcher.remote_cancel = True
+    if max_runs:
+        workflow_queue.dispatcher.max_runs = max(1, max_runs)
+    workflow_queue.start_dispatcher()
+    logger.info(f"[Worker] {workflow_queue.WORKER_ID} executing up to {workflow_queue.dispatcher.max_runs} runs")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(stop.set))
+    await stop.wait()
+    logger.info(f"[Worker] {workflow_queue.WORKER_ID} stopping")
+    # Executing runs go back to the queue
+    await workflow_queue.stop_dispatcher()
+    broker.stop()
+    wf_engine.shutdown()
+
+
+def _worker(max_runs: Optional[int]) -> None:
+    _load_env()
+    from app.db import models
+    from app.db.session import engine
+
+    models.SQLModel.metadata.create_all(engine)
+    asyncio.run(_serve(max_runs))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(prog="python -m app.workers")
+    ap.add_argument("--processes", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                    help="worker processes (default: one per core, minus one for the API)")
+    ap.add_argument("--runs", type=int, default=None, help="runs executing at once per process (default: WORKFLOW_MAX_RUNS)")
+    args = ap.parse_args()
+
+    if args.processes <= 1:
+        _worker(args.runs)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    procs: List[multiprocessing.process.BaseProcess] = []
+    stopping = False
+
+    def _stop(*_: object) -> None:
+        nonlocal stopping
+        stopping = True
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+    for _ in range(args.processes):
+        p = ctx.Process(target=_worker, args=(args.runs,), daemon=False)
+        p.start()
+        procs.append(p)
+    while not stopping:
+        time.sleep(1.0)
+        for i, p in enumerate(procs):
+            if not p.is_alive() and not stopping:
+                print(f"[Worker] process {p.pid} exited ({p.exitcode}), restarting", file=sys.stderr)
+                procs[i] = ctx.Process(target=_worker, args=(args.runs,), daemon=False)
+                procs[i].start()
+    for p in procs:
+        p.join(timeout=30)
@@ -0,0 +1,120 @@
+"""
+Knowledge graph provider benchmark.
+
+Ingests a synthetic relation graph and measures ingest throughput and query_subgraph
+latency for the embedded SQLite provider (and Neo4j when reachable). Each provider first
+runs check_alias_fold, a correctness check of folding alias nodes into canonical entities.
+
+Usage (from backend/):
+    python -m benchmarks.kg_provider_bench --edges 100000 --queries 500
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.kg_provider import Neo4jKGProvider, SqliteKGProvider  # noqa: E402
+
+KINDS = ["family", "friend", "enemy", "ally", "mentor", "colleague"]
+
+
+def make_triples(n_edges: int, n_entities: int, seed: int = 7) -> List[Tuple[str, str, str, Dict[str, Any]]]:
+    """Generate n_edges random directed relations over n_entities names."""
+    rnd = random.Random(seed)
+    seen = set()
+    triples: List[Tuple[str, str, str, Dict[str, Any]]] = []
+    while len(triples) < n_edges:
+        a = f"E{rnd.randrange(n_entities)}"
+        b = f"E{rnd.randrange(n_entities)}"
+        if a == b or (a, b) in seen:
+            continue
+        seen.add((a, b))
+        triples.append((a, rnd.choice(KINDS), b, {"recent_dialogues": [f"{a} -> {b}"]}))
+    return triples
+
+
+def check_alias_fold(name: str, provider: Any, project_id: int) -> None:
+    """
+    Fold an alias node with a self-loop and an edge to another entity into its canonical
+    entity: the fold must complete, drop the self-loop and move the other edge.
+    """
+    provider.delete_project_graph(project_id)
+    provider.ingest_triples_with_attributes(project_id, [
+        ("小明", "friend", "小明", {}),
+        ("小明", "ally", "小红", {}),
+    ])
+    provider.ingest_aliases(project_id, {"王明": ["小明"]})
+    edges = {(e["source"], e["target"]) for e in provider.query_subgraph(project_id, participants=["王明", "小红"], top_k=50)["edges"]}
+    assert provider.get_alias_table(project_id).get("小明") == "王明", f"[{name}] alias not recorded"
+    assert edges == {("王明", "小红")}, f"[{name}] unexpected edges after alias fold: {sorted(edges)}"
+    provider.delete_project_graph(project_id)
+    print(f"[{name}] alias fold check passed")
+
+
+def bench(name: str, provider: Any, project_id: int, triples, queries: int, participants: int, seed: int = 11) -> None:
+    """Run ingest + query timing against one provider."""
+    batch = 500
+    t0 = time.perf_counter()
+    for i in range(0, len(triples), batch):
+        provider.ingest_triples_with_attributes(project_id, triples[i:i + batch])
+    ingest_s = time.perf_counter() - t0
+
+    names = sorted({t[0] for t in triples} | {t[2] for t in triples})
+    rnd = random.Random(seed)
+    lat: List[float] = []
+    for _ in range(queries):
+        parts = rnd.sample(names, min(participants, len(names)))
+        q0 = time.perf_counter()
+        provider.query_subgraph(project_id, participants=parts, top_k=200)
+        lat.append((time.perf_counter() - q0) * 1000)
+    lat.sort()
+    p95 = lat[int(len(lat) * 0.95) - 1] if lat else 0.0
+    print(
+        f"[{name}] ingest {len(triples)} edges: {ingest_s:.2f}s ({len(triples) / max(ingest_s, 1e-9):.0f} edges/s) | "
+        f"query x{queries}: median {statistics.median(lat):.2f}ms p95 {p95:.2f}ms"
+    )
+    provider.delete_project_graph(project_id)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--edges", type=int, default=100_000)
+    ap.add_argument("--entities", type=int, default=5_000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--participants", type=int, default=8)
+    ap.add_argument("--project-id", type=int, default=987654)
+    args = ap.parse_args()
+
+    triples = make_triples(args.edges, args.entities)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_provider = SqliteKGProvider(os.path.join(tmp, "kg_bench.db"))
+        try:
+            check_alias_fold("sqlite", sqlite_provider, args.project_id)
+            bench("sqlite", sqlite_provider, args.project_id, triples, args.queries, args.participants)
+        finally:
+            sqlite_provider.close()
+
+    try:
+        neo = Neo4jKGProvider()
+        neo._driver.verify_connectivity()
+    except Exception as e:
+        print(f"[neo4j] skipped: {e}")
+        return
+    try:
+        check_alias_fold("neo4j", neo, args.project_id)
+        bench("neo4j", neo, args.project_id, triples, args.queries, args.participants)
+    finally:
+        neo.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Graph schema benchmark: Neo4j ingest throughput vs. graph size, with and without the
+Entity(group_id, name) constraint/index created by app.services.kg_schema.
+
+Each round ingests one batch of new relations into a growing graph and reports the
+throughput of that batch, so the cost of MERGE lookups as the cast grows is visible.
+
+Usage (from backend/, Neo4j configured through NEO4J_URI / NEO4J_USER / NEO4J_PASSWORD):
+    python -m benchmarks.kg_schema_bench --rounds 8 --batch 2000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.kg_provider import Neo4jKGProvider  # noqa: E402
+from app.services.kg_schema import NEO4J_MIGRATIONS, NEO4J_SCHEMA_ID, NEO4J_SCHEMA_LABEL, ensure_neo4j_schema  # noqa: E402
+from benchmarks.kg_provider_bench import make_triples  # noqa: E402
+
+
+def drop_schema(driver) -> None:
+    """Remove the schema objects so MERGE falls back to label scans."""
+    with driver.session() as sess:
+        for m in NEO4J_MIGRATIONS:
+            for stmt in m.statements:
+                if not stmt.startswith("CREATE"):
+                    continue
+                name = stmt.split()[2]
+                kind = "CONSTRAINT" if stmt.startswith("CREATE CONSTRAINT") else "INDEX"
+                sess.run(f"DROP {kind} {name} IF EXISTS").consume()
+        sess.run(f"MATCH (v:{NEO4J_SCHEMA_LABEL} {{id: $id}}) DELETE v", id=NEO4J_SCHEMA_ID).consume()
+
+
+def run(provider: Neo4jKGProvider, project_id: int, rounds: int, batch: int, entities: int) -> List[float]:
+    """Ingest `rounds` batches and return edges/s per batch."""
+    triples = make_triples(rounds * batch, entities)
+    rates: List[float] = []
+    for i in range(rounds):
+        chunk = triples[i * batch:(i + 1) * batch]
+        t0 = time.perf_counter()
+        for j in range(0, len(chunk), 500):
+            provider.ingest_triples_with_attributes(project_id, chunk[j:j + 500])
+        rates.append(len(chunk) / max(time.perf_counter() - t0, 1e-9))
+    provider.delete_project_graph(project_id)
+    return rates
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=8)
+    ap.add_argument("--batch", type=int, default=2000)
+    ap.add_argument("--entities", type=int, default=20_000)
+    ap.add_argument("--project-id", type=int, default=987655)
+    args = ap.parse_args()
+
+    provider = Neo4jKGProvider()
+    try:
+        provider._driver.verify_connectivity()
+    except Exception as e:
+        print(f"[neo4j] unreachable, nothing to measure: {e}")
+        return
+    try:
+        drop_schema(provider._driver)
+        provider._schema_version = 0  # keep ingest from re-creating the schema
+        without = run(provider, args.project_id, args.rounds, args.batch, args.entities)
+
+        ensure_neo4j_schema(provider._driver)
+        with_idx = run(provider, args.project_id, args.rounds, args.batch, args.entities)
+
+        print(f"{'edges in graph':>15} {'no index (e/s)':>16} {'indexed (e/s)':>15}")
+        for i, (a, b) in enumerate(zip(without, with_idx)):
+            print(f"{(i + 1) * args.batch:>15} {a:>16.0f} {b:>15.0f}")
+    finally:
+        provider.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os, sys
+import asyncio
 from dotenv import load_dotenv
 
 def _load_env_from_nearby():
@@ -25,6 +26,7 @@ _load_env_from_nearby()
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import SQLModel, Session, select
+from loguru import logger
 
 from app.api.router import api_router
 from app.db.session import engine
@@ -34,6 +36,16 @@ from app.bootstrap.init_app import init_prompts, create_default_card_types
 from app.bootstrap.init_app import init_knowledge
 from app.bootstrap.init_app import init_reserved_project
 from app.bootstrap.init_app import init_workflows
+from app.services.kg_provider import get_provider as get_kg_provider
+from app.services.kg_async import close_async_providers
+from app.services import graph_ingest_queue
+from app.services import chapter_summary_service
+from app.services import workflow_queue
+from app.services import workflow_triggers
+from app.services import graph_delete_jobs
+from app.services import card_changes
+from app.services import token_counter
+from app.services.workflow_engine import engine as wf_engine
 
 def init_db():
     """Initialize the database by creating all tables."""
@@ -44,6 +56,18 @@ def init_db():
 
 from contextlib import asynccontextmanager
 
+
+# Seconds shutdown waits for a graph schema bootstrap that is still running
+GRAPH_SCHEMA_SHUTDOWN_WAIT = 5
+
+
+def _bootstrap_graph_schema() -> None:
+    """Create/verify knowledge graph constraints and indexes; retried on first write if this fails."""
+    try:
+        get_kg_provider().ensure_schema()
+    except Exception as e:
+        logger.warning(f"Knowledge graph schema bootstrap skipped: {e}")
+
 # Use lifespan event handler instead of on_event
 @asynccontextmanager
 async def lifespan(app):
@@ -63,7 +87,38 @@ async def lifespan(app):
         init_reserved_project(session)
         # Initialize built-in workflows
         init_workflows(session)
+    # Tokenizer encodings (may be downloaded on first load), off the startup and request paths
+    token_counter.warm_up()
+    # Knowledge graph constraints/indexes, off the startup path (graph database may be slow or offline)
+    graph_schema_task = asyncio.create_task(asyncio.to_thread(_bootstrap_graph_schema))
+    # Background relation ingestion (queued by the memory endpoints)
+    graph_ingest_queue.start_worker()
+    # Project graph deletions interrupted by the last shutdown
+    graph_delete_jobs.resume_pending_deletes()
+    # Chapter summaries / roll-ups, refreshed in the background when chapter text changes
+    chapter_summary_service.start_worker()
+    # Queued workflow runs, including those left over (orphaned) by the last shutdown or crash;
+    # with WORKFLOW_WORKER_MODE=external they are executed by `python -m app.workers` instead
+    if workflow_queue.WORKFLOW_WORKER_MODE == "inline":
+        workflow_queue.start_dispatcher()
+    else:
+        # Card changes committed by the worker processes, for this process's caches
+        card_changes.start_follower()
+    # Debounced trigger runs (bursts of saves coalesce into one run)
+    workflow_triggers.start_coalescer()
     yield
+    # A bootstrap still waiting on the graph database is abandoned (it is retried on first use)
+    if not graph_schema_task.done():
+        await asyncio.wait({graph_schema_task}, timeout=GRAPH_SCHEMA_SHUTDOWN_WAIT)
+        graph_schema_task.cancel()
+    await asyncio.gather(graph_schema_task, return_exceptions=True)
+    await workflow_triggers.stop_coalescer()
+    await workflow_queue.stop_dispatcher()
+    await card_changes.stop_follower()
+    chapter_summary_service.stop_worker()
+    graph_ingest_queue.stop_worker()
+    wf_engine.shutdown()
+    await close_async_providers()
     # Cleanup logic can be added on shutdown (if needed)
 
 # Create FastAPI app instance, register lifespan
@@ -1695,6 +1695,18 @@ export interface components {
         IngestRelationsFromPreviewResponse: {
             /** Written */
             written: number;
+            /**
+             * Queued
+             * @default false
+             */
+            queued: boolean;
+            /** Job Id */
+            job_id?: number | null;
+            /**
+             * Queued Rows
+             * @default 0
+             */
+            queued_rows: number;
         };
         /** IngestRelationsLLMRequest */
         IngestRelationsLLMRequest: {
@@ -1720,6 +1732,18 @@ export interface components {
         IngestRelationsLLMResponse: {
             /** Written */
             written: number;
+            /**
+             * Queued
+             * @default false
+             */
+            queued: boolean;
+            /** Job Id */
+            job_id?: number | null;
+            /**
+             * Queued Rows
+             * @default 0
+             */
+            queued_rows: number;
         };
         /** KnowledgeCreate */
         KnowledgeCreate: {